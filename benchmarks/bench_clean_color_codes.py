@@ -0,0 +1,82 @@
+"""
+clean_color_codes 基准测试
+
+对比旧版（逐条 re.sub，函数内编译 ANSI 正则）与当前单次扫描实现。
+默认使用内置的 MCDR.log / latest.log 样本语料，也可传入真实日志文件：
+
+    python benchmarks/bench_clean_color_codes.py [logs/MCDR.log server/logs/latest.log ...]
+"""
+
+import importlib.util
+import re
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULE_PATH = ROOT / "src" / "guguwebui" / "utils" / "log_format.py"
+
+
+def load_current():
+    # 直接按文件加载，避免导入 guguwebui 包时读取插件配置
+    spec = importlib.util.spec_from_file_location("guguwebui_log_format", MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.clean_color_codes
+
+
+def legacy_clean_color_codes(text):
+    text = re.sub(r"§[0-9a-fk-or]", "", text)
+    ansi_escape = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
+    text = ansi_escape.sub("", text)
+    text = re.sub(r"\[\d+m", "", text)
+    text = re.sub(r"\[\d+(?:;\d+)*m", "", text)
+    text = re.sub(r"\[0m", "", text)
+    return text
+
+
+SAMPLE_LINES = [
+    # MCDR.log
+    "[MCDR] [2024-05-01 12:00:01.123] [MainThread/INFO] [mcdreforged.mcdr_server]: Starting MCDReforged 2.13.1",
+    "[MCDR] [2024-05-01 12:00:01.456] [MainThread/INFO] [mcdreforged.plugin.plugin_manager]: Loaded plugin guguwebui@1.7.8",
+    "[MCDR] [2024-05-01 12:00:02.001] [TaskExecutor/INFO] [guguwebui]: \x1b[32mWebUI 已启动\x1b[0m",
+    "[MCDR] [2024-05-01 12:00:05.789] [TaskExecutor/WARNING] [mcdreforged.handler]: \x1b[33mPermission denied\x1b[0m",
+    "[MCDR] [2024-05-01 12:01:00.000] [TaskExecutor/INFO] [mcdreforged.command]: §6[WebUI] §a发现新版本 §b1.7.9",
+    # latest.log
+    "[12:00:03] [Server thread/INFO]: Starting minecraft server version 1.20.4",
+    "[12:00:03] [Server thread/INFO]: Loading properties",
+    "[12:00:04] [Server thread/INFO]: Preparing level \"world\"",
+    "[12:00:10] [Server thread/INFO]: Done (6.123s)! For help, type \"help\"",
+    "[12:05:42] [Server thread/INFO]: Steve joined the game",
+    "[12:05:43] [Server thread/INFO]: <Steve> hello world",
+    "[12:06:01] [Server thread/WARN]: Can't keep up! Is the server overloaded? Running 2034ms or 40 ticks behind",
+    "[12:07:15] [Server thread/INFO]: §e[Server] §fBackup completed",
+    # 控制台直接输出（丢失 ESC 的 SGR 残片）
+    "[37m[2m[12:08:00][0m [32mINFO[0m Saved the game",
+    "Stopping server",
+]
+
+
+def load_corpus(paths):
+    lines = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            lines.extend(line.rstrip("\n") for line in f)
+    return lines
+
+
+def main():
+    current = load_current()
+    corpus = load_corpus(sys.argv[1:]) if len(sys.argv) > 1 else SAMPLE_LINES * 2000
+
+    mismatches = sum(1 for line in corpus if legacy_clean_color_codes(line) != current(line))
+    print(f"lines: {len(corpus)}  output mismatches: {mismatches}")
+
+    for name, func in (("legacy", legacy_clean_color_codes), ("current", current)):
+        runs = timeit.repeat(lambda: [func(line) for line in corpus], number=1, repeat=5)
+        best = min(runs)
+        print(f"{name:>8}: {best * 1000:8.2f} ms  {best / len(corpus) * 1e9:8.1f} ns/line")
+
+
+if __name__ == "__main__":
+    main()
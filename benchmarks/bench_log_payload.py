@@ -0,0 +1,90 @@
+"""
+终端日志接口负载体积基准
+
+对比一页 500 行日志在逐条字典格式（/api/new_logs 默认格式）与 format=compact 列式格式下的
+JSON 字节数，以及两者经 gzip 压缩后的字节数：
+
+    python benchmarks/bench_log_payload.py [行数]
+"""
+
+import gzip
+import importlib.util
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULE_PATH = ROOT / "src" / "guguwebui" / "utils" / "log_format.py"
+
+
+def load_log_format():
+    # 直接按文件加载，避免导入 guguwebui 包时读取插件配置
+    spec = importlib.util.spec_from_file_location("guguwebui_log_format", MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+SAMPLES = [
+    ("mcdreforged.mcdr_server", "INFO", "Starting MCDReforged 2.13.1"),
+    ("mcdreforged.plugin.plugin_manager", "INFO", "Loaded plugin guguwebui@1.7.8"),
+    ("Server", "INFO", "Loading properties"),
+    ("Server", "INFO", "Preparing level \"world\""),
+    ("Server", "INFO", "Steve joined the game"),
+    ("Server", "INFO", "<Steve> hello world"),
+    ("Server", "WARN", "Can't keep up! Is the server overloaded? Running 2034ms or 40 ticks behind"),
+    ("Server", "INFO", "Saved the game"),
+    ("InfoSource.CONSOLE", "INFO", "!!MCDR status"),
+    ("guguwebui", "INFO", "WebUI 已启动，访问地址 http://127.0.0.1:8000"),
+]
+
+
+def to_api_entry(entry, line_number):
+    """与 LogWatcher._to_api_entry 相同的逐条结构"""
+    return {
+        "line_number": line_number,
+        "counter": entry.counter,
+        "timestamp": entry.time_str,
+        "content": entry.content,
+        "source": "all",
+        "is_command": entry.is_command,
+    }
+
+
+def dumps(data):
+    # 与 FastAPI JSONResponse 的序列化参数一致
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def main():
+    log_format = load_log_format()
+    lines = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    start = time.time() - lines * 0.2
+    entries = [
+        log_format.LogEntry(1000 + i, start + i * 0.2, level, source, message)
+        for i, (source, level, message) in enumerate(
+            SAMPLES[i % len(SAMPLES)] for i in range(lines)
+        )
+    ]
+
+    full = dumps({"logs": [to_api_entry(e, i + 1) for i, e in enumerate(entries)]})
+    compact = dumps({"logs": log_format.encode_compact(entries, 1)})
+
+    rows = [
+        ("full", len(full), len(gzip.compress(full))),
+        ("compact", len(compact), len(gzip.compress(compact))),
+    ]
+    print(f"lines: {lines}")
+    print(f"{'format':>8} {'json bytes':>12} {'gzip bytes':>12}")
+    for name, raw, packed in rows:
+        print(f"{name:>8} {raw:>12} {packed:>12}")
+    base = rows[0][1]
+    for name, raw, packed in rows:
+        print(
+            f"{name:>8}: json {raw / base:6.1%} of full, gzip {packed / base:6.1%} of full"
+        )
+
+
+if __name__ == "__main__":
+    main()
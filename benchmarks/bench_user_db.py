@@ -0,0 +1,125 @@
+"""
+用户数据库（db.json）写入基准
+
+模拟登录（新增 token）与聊天发送（更新会话 last_sent_ms）两类高频修改，每次修改后调用
+user_db.save()，对比三种写入方式的吞吐：
+
+- legacy：改动前的 Table.save，每次修改直接覆盖写整个 db.json（序列化方式与新实现相同）
+- sync：user_db_write_behind_ms 为 0，每次修改原子写入（临时文件 + 替换）
+- write-behind：user_db_write_behind_ms 为 1000，修改时在调用线程序列化快照，由定时器合并写入（含 fsync）
+
+    python benchmarks/bench_user_db.py [聊天用户数] [操作次数]
+
+utils/table.py 依赖 ruamel.yaml（插件本身的依赖），运行前需已安装。
+"""
+
+import importlib.util
+import json
+import shutil
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+MODULE_PATH = ROOT / "src" / "guguwebui" / "utils" / "table.py"
+
+
+def load_table():
+    # 直接按文件加载，避免导入 guguwebui 包时读取插件配置
+    spec = importlib.util.spec_from_file_location("guguwebui_table", MODULE_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.Table
+
+
+def make_db(chat_users):
+    """与 DEFALUT_DB 结构一致的数据库，聊天用户、会话与 QQ 昵称按 chat_users 规模生成"""
+    return {
+        "token": {
+            uuid.uuid4().hex: {"user_name": f"admin{i}", "expire_time": "2026-01-01 00:00:00+00:00"}
+            for i in range(50)
+        },
+        "user": {"admin": "$argon2id$v=19$m=65536,t=3,p=4$" + "x" * 64},
+        "temp": {},
+        "chat_users": {
+            f"Player{i}": {
+                "password": "$argon2id$v=19$m=65536,t=3,p=4$" + "y" * 64,
+                "created_time": "2025-06-01 12:00:00+00:00",
+            }
+            for i in range(chat_users)
+        },
+        "chat_verification": {},
+        "chat_sessions": {
+            uuid.uuid4().hex: {
+                "player_id": f"Player{i}",
+                "expire_time": "2026-01-01 00:00:00+00:00",
+                "last_sent_ms": 0,
+            }
+            for i in range(chat_users // 2)
+        },
+        "qq_nicknames": {str(10000 + i): f"昵称{i}" for i in range(chat_users // 4)},
+    }
+
+
+def legacy_save(table):
+    """改动前的 Table.save：直接覆盖写原文件
+
+    序列化与新实现一致（json.dumps 后一次写入），差异只在写入方式。改动前实际使用
+    json.dump 流式写文件，会多出大量小块写调用，比这里更慢。
+    """
+    content = json.dumps(table.data, ensure_ascii=False)
+    table.path.parents[0].mkdir(parents=True, exist_ok=True)
+    with open(table.path, "w", encoding="UTF-8") as f:
+        f.write(content)
+
+
+def run(Table, directory, mode, chat_users, operations):
+    path = directory / f"db_{mode}.json"
+    path.write_text(json.dumps(make_db(chat_users), ensure_ascii=False), encoding="utf-8")
+    table = Table(path, write_behind_delay=1.0 if mode == "write-behind" else 0)
+    save = (lambda: legacy_save(table)) if mode == "legacy" else table.save
+    sessions = list(table["chat_sessions"].values())
+
+    start = time.perf_counter()
+    for i in range(operations):
+        if i % 2:
+            # 聊天发送：ChatService.send_message 记录 last_sent_ms
+            sessions[i % len(sessions)]["last_sent_ms"] = int(time.time() * 1000)
+        else:
+            # 登录：AuthService 写入新 token
+            table["token"][uuid.uuid4().hex] = {"user_name": "admin", "expire_time": "2026-01-01 00:00:00+00:00"}
+        save()
+    elapsed = time.perf_counter() - start
+    # 卸载时的落盘不计入请求路径耗时，单独统计
+    close_start = time.perf_counter()
+    table.close()
+    close_elapsed = time.perf_counter() - close_start
+
+    reloaded = json.loads(path.read_text(encoding="utf-8"))
+    assert reloaded["token"].keys() == table["token"].keys(), "落盘内容与内存不一致"
+    writes = operations if mode == "legacy" else table.flush_count
+    return elapsed, close_elapsed, writes, path.stat().st_size
+
+
+def main():
+    chat_users = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    operations = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    Table = load_table()
+    directory = Path(tempfile.mkdtemp(prefix="bench_user_db_"))
+    try:
+        print(f"chat users: {chat_users}  operations: {operations} (login / chat send alternating)")
+        print(f"{'mode':>12} {'ops/s':>10} {'us/op':>10} {'close ms':>10} {'file writes':>12} {'db bytes':>10}")
+        for mode in ("legacy", "sync", "write-behind"):
+            elapsed, close_elapsed, writes, size = run(Table, directory, mode, chat_users, operations)
+            print(
+                f"{mode:>12} {operations / elapsed:10.0f} {elapsed / operations * 1e6:10.1f}"
+                f" {close_elapsed * 1000:10.2f} {writes:12d} {size:10d}"
+            )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,7 @@ from guguwebui.utils.dependency_checker import check_and_install_dependencies
 # 全局变量声明
 web_server_interface = None
 _mounted_to_fastapi_mcdr = False
-chat_logger = None  # 在 _do_startup 中赋值为 ChatLogger 实例
+chat_logger = None  # 在 _do_startup 中赋值为共享的 ChatLogger 实例
 
 
 def _bootstrap(server: PluginServerInterface):
@@ -228,12 +228,18 @@ def _log_fastapi_mcdr_url(server: PluginServerInterface):
         server.logger.info("WebUI 已挂载到 fastapi_mcdr 插件，访问地址请查看 fastapi_mcdr 插件配置")
 
 
-def _init_chat_logger(server: PluginServerInterface):
+def _init_chat_logger(server: PluginServerInterface, plugin_config: dict):
     """初始化聊天消息监听器，返回 ChatLogger 实例或 None。"""
     try:
-        from .utils.chat_logger import ChatLogger
+        from .utils.chat_logger import CHAT_CACHE_SIZE, get_chat_logger
         from .utils.mc_util import create_chat_logger_status_rtext
-        logger = ChatLogger()
+        logger = get_chat_logger(plugin_config.get("chat_cache_size", CHAT_CACHE_SIZE))
+        logger.configure_archive(
+            segment_max_bytes=int(plugin_config.get("chat_segment_mb", 16)) * 1024 * 1024,
+            compression=plugin_config.get("chat_archive_compression", "none"),
+            retention_seconds=int(plugin_config.get("chat_retention_days", 0)) * 86400,
+            max_total_bytes=int(plugin_config.get("chat_retention_mb", 0)) * 1024 * 1024,
+        )
         server.logger.info(create_chat_logger_status_rtext('init', True))
         return logger
     except Exception as e:
@@ -241,6 +247,22 @@ def _init_chat_logger(server: PluginServerInterface):
         return None
 
 
+def _init_audit_log(server: PluginServerInterface, plugin_config: dict):
+    """按配置设置操作审计的分段、压缩、保留与 fsync 策略，并启动后台写入与维护线程。"""
+    try:
+        from .services.operation_audit_service import configure_storage
+        configure_storage(
+            segment_max_bytes=int(plugin_config.get("audit_segment_mb", 8)) * 1024 * 1024,
+            segment_max_seconds=int(plugin_config.get("audit_segment_days", 30)) * 86400,
+            compression=plugin_config.get("audit_archive_compression", "none"),
+            retention_seconds=int(plugin_config.get("audit_retention_days", 0)) * 86400,
+            max_total_bytes=int(plugin_config.get("audit_retention_mb", 0)) * 1024 * 1024,
+            fsync_interval=int(plugin_config.get("audit_fsync_interval_ms", 1000)) / 1000,
+        )
+    except Exception as e:
+        server.logger.error(f"操作审计日志初始化失败: {e}")
+
+
 def _do_startup(server: PluginServerInterface):
     """依赖就绪后执行完整启动流程（在后台线程中调用）。"""
     global web_server_interface, chat_logger
@@ -281,9 +303,14 @@ def _do_startup(server: PluginServerInterface):
     app.mount("/assets", StaticFiles(directory=f"{STATIC_PATH}/static/assets"), name="assets")
     app.mount("/custom", StaticFiles(directory=f"{STATIC_PATH}/custom"), name="custom")
 
+    # 登录、聊天等高频修改只标记 db.json 为待写入，由定时器合并写入
+    from guguwebui.constant import user_db
+    user_db.set_write_behind(int(plugin_config.get("user_db_write_behind_ms", 1000)) / 1000)
+
     init_app(server)
     start_self_update_checker(server)
-    chat_logger = _init_chat_logger(server)
+    chat_logger = _init_chat_logger(server, plugin_config)
+    _init_audit_log(server, plugin_config)
 
     if use_fastapi_mcdr:
         _log_fastapi_mcdr_url(server)
@@ -615,6 +642,27 @@ def on_unload(server: PluginServerInterface):
     except Exception as e:
         server.logger.warning(f"停止日志捕获器时出错: {e}")
 
+    # 写入聊天记录计数器检查点并释放共享实例
+    try:
+        from .utils.chat_logger import close_chat_logger
+        close_chat_logger()
+    except Exception as e:
+        server.logger.warning(f"保存聊天记录检查点时出错: {e}")
+
+    # 写入 db.json 中尚未落盘的修改，之后的修改改为立即写入
+    try:
+        from .constant import user_db
+        user_db.close()
+    except Exception as e:
+        server.logger.warning(f"保存用户数据库时出错: {e}")
+
+    # 写入排队中的操作审计记录并停止后台线程
+    try:
+        from .services.operation_audit_service import close_audit_log
+        close_audit_log()
+    except Exception as e:
+        server.logger.warning(f"保存操作审计记录时出错: {e}")
+
     # 停止Web服务器（仅在独立模式下需要）
     try:
         if 'web_server_interface' in globals() and web_server_interface:
@@ -10,6 +10,7 @@ SECRET_KEY = "guguwebui"
 STATIC_PATH = "./guguwebui_static"
 USER_DB_PATH = Path(STATIC_PATH) / "db.json"
 AUDIT_LOG_PATH = Path(STATIC_PATH) / "audit_log.bin"
+LOG_HISTORY_PATH = Path(STATIC_PATH) / "terminal_logs"
 PATH_DB_PATH = Path("./config") / "guguwebui" / "config_path.json"
 
 # 插件网页 api_handler：multipart 单文件字段默认最大字节数（超过则 413）
@@ -60,6 +61,14 @@ DEFALUT_CONFIG = {
     "allow_temp_password": True,
     "force_standalone": False,  # 是否强制独立运行（忽略fastapi_mcdr插件）
     "log_capture_compat_mode": True,  # 日志捕获兼容模式（通过读取日志文件获取）
+    "log_buffer_size": 5000,  # 内存中保留的终端日志条数
+    "log_dedup_window_ms": 1000,  # 终端日志去重窗口（毫秒），窗口内内容相同的日志只保留一条；0 表示关闭去重
+    "log_dedup_max_entries": 20000,  # 去重窗口最多记录的日志条数
+    "log_history_enabled": False,  # 将超出内存缓冲区的终端日志写入磁盘历史，供向前翻页
+    "log_history_segment_mb": 8,  # 单个历史分段大小上限（MB），超出后轮转
+    "log_history_segment_hours": 24,  # 单个历史分段最长写入时长（小时），超出后轮转
+    "log_history_max_mb": 256,  # 历史日志总大小上限（MB）
+    "log_history_retention_days": 7,  # 历史日志保留天数
     "ai_api_key": "",  # AI API密钥
     "ai_model": "deepseek-chat",  # AI模型名称
     "ai_api_url": "https://api.deepseek.com/chat/completions",  # 自定义API链接
@@ -73,6 +82,18 @@ DEFALUT_CONFIG = {
     "public_chat_to_game_enabled": False,  # 公开聊天页发送消息到游戏
     "chat_verification_expire_minutes": 10,  # 聊天页验证码过期时间（分钟）
     "chat_session_expire_hours": 24,  # 聊天页会话过期时间（小时）
+    "chat_cache_size": 1000,  # 内存中缓存的最近聊天消息条数
+    "chat_segment_mb": 16,  # 聊天记录活动分段大小上限（MB），超出或跨月后封存
+    "chat_archive_compression": "none",  # 封存分段的压缩算法：none / lzma / zstd（zstd 需 Python 3.14 或 zstandard 包）
+    "chat_retention_days": 0,  # 聊天记录保留天数，0 表示永久保留
+    "chat_retention_mb": 0,  # 聊天记录总大小上限（MB），0 表示不限制
+    "audit_segment_mb": 8,  # 操作审计活动分段大小上限（MB），超出后封存
+    "audit_segment_days": 30,  # 操作审计活动分段最长写入时长（天），超出后封存
+    "audit_archive_compression": "none",  # 操作审计封存分段的压缩算法：none / lzma / zstd
+    "audit_retention_days": 0,  # 操作审计保留天数，0 表示永久保留
+    "audit_retention_mb": 0,  # 操作审计总大小上限（MB），0 表示不限制
+    "audit_fsync_interval_ms": 1000,  # 操作审计写入后最迟多久 fsync 一次（毫秒），0 表示每批写入后立即 fsync
+    "user_db_write_behind_ms": 1000,  # db.json 延迟写入时间（毫秒），期间的多次修改合并为一次写入；0 表示每次修改立即写入
     "icp_records": [],  # ICP备案信息，最多两个，每个包含 icp 和 url 字段
     # 示例配置（请在 config.json 中添加）：
     # "icp_records": [
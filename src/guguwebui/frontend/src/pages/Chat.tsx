@@ -11,7 +11,7 @@ import {
 import React, { useCallback, useEffect, useRef, useState } from 'react'
 import { useTranslation } from 'react-i18next'
 import { useAuth } from '../hooks/useAuth'
-import api from '../utils/api'
+import api, { getBasePath, getTargetServerId } from '../utils/api'
 import { parseRText } from '../utils/rtextParser'
 
 interface ChatMessage {
@@ -124,18 +124,8 @@ const Chat: React.FC = () => {
         player_id: username
       })
       if (resp.data.status === 'success') {
-        if (resp.data.messages && resp.data.messages.length > 0) {
-          // resp.data.messages are newest, we append them to the end
-          const newMsgs = [...resp.data.messages].reverse()
-          setChatMessages(prev => [...prev, ...newMsgs])
-        }
-        if (resp.data.online) {
-          setOnlineStatus({
-            web: resp.data.online.web || [],
-            game: resp.data.online.game || [],
-            bot: resp.data.online.bot || []
-          })
-        }
+        applyNewMessages(resp.data.messages || [])
+        if (resp.data.online) applyOnlineStatus(resp.data.online)
       }
     } catch (e) {
       console.error('Failed to load new messages', e)
@@ -144,6 +134,23 @@ const Chat: React.FC = () => {
     }
   }, [username])
 
+  // Shared by polling and SSE push
+  const applyNewMessages = (messages: ChatMessage[]) => {
+    if (messages.length === 0) return
+    const knownIds = new Set(chatMessagesRef.current.map(m => m.id))
+    // messages are newest, we append them to the end
+    const newMsgs = messages.filter(m => !knownIds.has(m.id)).reverse()
+    if (newMsgs.length > 0) setChatMessages(prev => [...prev, ...newMsgs])
+  }
+
+  const applyOnlineStatus = (online: OnlineStatus) => {
+    setOnlineStatus({
+      web: online.web || [],
+      game: online.game || [],
+      bot: online.bot || []
+    })
+  }
+
   const fetchServerStatus = useCallback(async () => {
     if (statusFetchingRef.current) return
     statusFetchingRef.current = true
@@ -162,18 +169,54 @@ const Chat: React.FC = () => {
     }
   }, [])
 
-  // Poll for status (always) and for new messages (only after initial load)
+  // Poll for status (always)
   useEffect(() => {
     fetchServerStatus()
     const statusTimer = setInterval(fetchServerStatus, 5000)
     return () => clearInterval(statusTimer)
   }, [fetchServerStatus])
 
+  // New messages (only after initial load): SSE push on the local server, falling back to polling every 2 seconds
   useEffect(() => {
     if (!initialMessagesLoaded) return
-    const messageTimer = setInterval(loadNewMessages, 2000)
-    return () => clearInterval(messageTimer)
-  }, [initialMessagesLoaded, loadNewMessages])
+    let messageTimer: ReturnType<typeof setInterval> | null = null
+    let source: EventSource | null = null
+
+    const startPolling = () => {
+      if (messageTimer) return
+      messageTimer = setInterval(loadNewMessages, 2000)
+    }
+
+    if (typeof EventSource !== 'undefined' && getTargetServerId() === 'local') {
+      const currentMaxId = chatMessagesRef.current.length > 0 ? Math.max(...chatMessagesRef.current.map(m => m.id)) : 0
+      source = new EventSource(`${getBasePath()}/api/chat/stream?after_id=${currentMaxId}`)
+      const onData = (handler: (data: any) => void) => (ev: Event) => {
+        try {
+          handler(JSON.parse((ev as MessageEvent).data))
+        } catch (e) {
+          console.error('Error parsing streamed chat event', e)
+        }
+      }
+      source.addEventListener('messages', onData(data => applyNewMessages(data.messages || [])))
+      source.addEventListener('ready', onData(data => data.online && applyOnlineStatus(data.online)))
+      source.addEventListener('online', onData(data => data.online && applyOnlineStatus(data.online)))
+      source.addEventListener('clear', () => setChatMessages([]))
+      source.onerror = () => {
+        // EventSource reconnects with Last-Event-ID on its own; fall back to polling once it is CLOSED
+        if (source && source.readyState === EventSource.CLOSED) {
+          source = null
+          startPolling()
+        }
+      }
+    } else {
+      startPolling()
+    }
+
+    return () => {
+      if (messageTimer) clearInterval(messageTimer)
+      source?.close()
+    }
+  }, [initialMessagesLoaded, loadNewMessages]) // eslint-disable-line react-hooks/exhaustive-deps
 
   const loadChatMessages = async (limit = 50, beforeId = 0) => {
     if (isLoadingMessages) return
@@ -17,7 +17,7 @@ import {
 import React, { useCallback, useEffect, useRef, useState } from 'react'
 import { useTranslation } from 'react-i18next'
 import VersionFooter from '../components/VersionFooter'
-import api from '../utils/api'
+import api, { getBasePath, getTargetServerId } from '../utils/api'
 import { parseRText } from '../utils/rtextParser'
 
 interface ChatMessage {
@@ -194,17 +194,8 @@ const PlayerChat: React.FC = () => {
         player_id: currentPlayer
       })
       if (resp.data.status === 'success') {
-        if (resp.data.messages && resp.data.messages.length > 0) {
-          setChatMessages(prev => [...resp.data.messages, ...prev])
-        }
-        if (resp.data.online) {
-          setOnlineStatus({
-            web: resp.data.online.web || [],
-            game: resp.data.online.game || [],
-            bot: resp.data.online.bot || []
-          })
-          updateOfflineMembers(resp.data.online)
-        }
+        applyNewMessages(resp.data.messages || [])
+        if (resp.data.online) applyOnlineStatus(resp.data.online)
       }
     } catch (e) {
       console.error('Failed to load new messages', e)
@@ -213,6 +204,23 @@ const PlayerChat: React.FC = () => {
     }
   }, [isLoggedIn, currentPlayer])
 
+  // 轮询与推送共用的新消息/在线列表处理
+  const applyNewMessages = (messages: ChatMessage[]) => {
+    if (messages.length === 0) return
+    const knownIds = new Set(chatMessagesRef.current.map(m => m.id))
+    const fresh = messages.filter(m => !knownIds.has(m.id))
+    if (fresh.length > 0) setChatMessages(prev => [...fresh, ...prev])
+  }
+
+  const applyOnlineStatus = (online: OnlineStatus) => {
+    setOnlineStatus({
+      web: online.web || [],
+      game: online.game || [],
+      bot: online.bot || []
+    })
+    updateOfflineMembers(online)
+  }
+
   const fetchServerStatus = useCallback(async () => {
     if (statusFetchingRef.current) return
     statusFetchingRef.current = true
@@ -241,12 +249,51 @@ const PlayerChat: React.FC = () => {
     return () => clearInterval(statusTimer)
   }, [isLoggedIn, fetchServerStatus])
 
-  // 消息列表轮询：仅在登录且初始消息加载完成后开始，避免 get_new_messages 在 get_messages 完成前用 after_id: 0 请求
+  // 新消息：仅在登录且初始消息加载完成后开始，避免 after_id 为 0 时重复拉取全部新消息
+  // 本机优先使用 SSE 推送（连接期间即计入在线），不支持或被拒绝时回退为 2 秒轮询
   useEffect(() => {
     if (!isLoggedIn || !initialMessagesLoaded) return
-    const messageTimer = setInterval(loadNewMessages, 2000)
-    return () => clearInterval(messageTimer)
-  }, [isLoggedIn, initialMessagesLoaded, loadNewMessages])
+    let messageTimer: ReturnType<typeof setInterval> | null = null
+    let source: EventSource | null = null
+
+    const startPolling = () => {
+      if (messageTimer) return
+      messageTimer = setInterval(loadNewMessages, 2000)
+    }
+
+    if (typeof EventSource !== 'undefined' && getTargetServerId() === 'local') {
+      const currentMaxId = chatMessagesRef.current.length > 0 ? Math.max(...chatMessagesRef.current.map(m => m.id)) : 0
+      const sessionId = localStorage.getItem('chat_session_id') || ''
+      source = new EventSource(
+        `${getBasePath()}/api/chat/stream?after_id=${currentMaxId}&session_id=${encodeURIComponent(sessionId)}`
+      )
+      const onData = (handler: (data: any) => void) => (ev: Event) => {
+        try {
+          handler(JSON.parse((ev as MessageEvent).data))
+        } catch (e) {
+          console.error('Error parsing streamed chat event', e)
+        }
+      }
+      source.addEventListener('messages', onData(data => applyNewMessages(data.messages || [])))
+      source.addEventListener('ready', onData(data => data.online && applyOnlineStatus(data.online)))
+      source.addEventListener('online', onData(data => data.online && applyOnlineStatus(data.online)))
+      source.addEventListener('clear', () => setChatMessages([]))
+      source.onerror = () => {
+        // 断线时 EventSource 会携带 Last-Event-ID 自动重连；被拒绝时进入 CLOSED，改为轮询
+        if (source && source.readyState === EventSource.CLOSED) {
+          source = null
+          startPolling()
+        }
+      }
+    } else {
+      startPolling()
+    }
+
+    return () => {
+      if (messageTimer) clearInterval(messageTimer)
+      source?.close()
+    }
+  }, [isLoggedIn, initialMessagesLoaded, loadNewMessages]) // eslint-disable-line react-hooks/exhaustive-deps
 
   const notify = (msg: string) => {
     setAuthError(msg)
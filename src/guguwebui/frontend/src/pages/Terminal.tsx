@@ -22,7 +22,7 @@ import { useTranslation } from 'react-i18next'
 import ReactMarkdown from 'react-markdown'
 import rehypeRaw from 'rehype-raw'
 import remarkGfm from 'remark-gfm'
-import api, { isCancel } from '../utils/api'
+import api, { getBasePath, getTargetServerId, isCancel } from '../utils/api'
 
 // --- Interfaces ---
 
@@ -33,6 +33,36 @@ interface LogItem {
   time?: string
 }
 
+// format=compact 时日志接口返回的列式结构（旧版子服不支持该参数，仍返回逐条数组）
+interface CompactLogs {
+  format: 'compact'
+  count: number
+  first_line: number | null
+  counter_start: number | null
+  counter_deltas?: number[]
+  times: string[]
+  time: number[]
+  tags: string[]
+  tag: number[]
+  message: string[]
+}
+
+const decodeLogs = (logs: LogItem[] | CompactLogs | undefined): LogItem[] => {
+  if (!logs) return []
+  if (Array.isArray(logs)) return logs
+  const items: LogItem[] = []
+  let counter = logs.counter_start ?? 0
+  for (let i = 0; i < logs.count; i++) {
+    if (i > 0) counter += logs.counter_deltas ? logs.counter_deltas[i - 1] : 1
+    items.push({
+      line_number: logs.first_line === null ? undefined : logs.first_line + i,
+      counter,
+      content: `[#${counter}] [${logs.times[logs.time[i]]}] [${logs.tags[logs.tag[i]]}] ${logs.message[i]}\n`,
+    })
+  }
+  return items
+}
+
 interface CommandSuggestion {
   command: string
   description?: string
@@ -164,11 +194,14 @@ const Terminal: React.FC = () => {
   const [isLoading, setIsLoading] = useState(true)
   const [serverStatus, setServerStatus] = useState<'online' | 'offline' | 'loading' | 'error'>('loading')
   const [serverVersion, setServerVersion] = useState('')
+  const [logCapture, setLogCapture] = useState<{ mode: string; backend?: string } | null>(null)
 
   // Auto-scroll & Refresh
   const [autoScroll, setAutoScroll] = useState(true)
   const [autoRefresh, setAutoRefresh] = useState(true)
   const [initialLoadComplete, setInitialLoadComplete] = useState(false)
+  const [hasEarlierLogs, setHasEarlierLogs] = useState(false)
+  const [loadingEarlier, setLoadingEarlier] = useState(false)
   const logsEndRef = useRef<HTMLDivElement>(null)
   const terminalContainerRef = useRef<HTMLDivElement>(null)
   const suggestionsContainerRef = useRef<HTMLDivElement>(null)
@@ -247,6 +280,7 @@ const Terminal: React.FC = () => {
     checkServerStatus(signal)
     loadLogs(signal)
     checkApiKeyStatus(signal)
+    checkLogCaptureStatus(signal)
 
     // Load history from local storage
     const savedHistory = localStorage.getItem('commandHistory')
@@ -267,7 +301,8 @@ const Terminal: React.FC = () => {
     }
   }, []) // eslint-disable-line react-hooks/exhaustive-deps
 
-  // Auto refresh timer (separate effect to handle autoRefresh state properly)
+  // Auto refresh (separate effect to handle autoRefresh state properly)
+  // 本地服务器优先使用 SSE 推送；代理子服或推送不可用时回退为定时轮询
   // eslint-disable-next-line react-hooks/exhaustive-deps
   useEffect(() => {
     if (!autoRefresh) return
@@ -276,19 +311,55 @@ const Terminal: React.FC = () => {
     // 创建 AbortController 用于取消请求
     const abortController = new AbortController()
     const signal = abortController.signal
+    let refreshTimer: ReturnType<typeof setInterval> | null = null
+    let source: EventSource | null = null
 
-    // Immediately fetch once when autoRefresh is enabled and initial load is complete
-    fetchNewLogs(signal)
-
-    // Then set up interval for auto refresh
-    const refreshTimer = setInterval(() => {
+    const startPolling = () => {
+      if (refreshTimer) return
+      // Immediately fetch once, then set up interval for auto refresh
       fetchNewLogs(signal)
-    }, REFRESH_INTERVAL)
+      refreshTimer = setInterval(() => {
+        fetchNewLogs(signal)
+      }, REFRESH_INTERVAL)
+    }
+
+    if (typeof EventSource !== 'undefined' && getTargetServerId() === 'local') {
+      source = new EventSource(
+        `${getBasePath()}/api/server_logs/stream?last_counter=${lastLogCounter.current}`
+      )
+      source.addEventListener('logs', (ev) => {
+        try {
+          const data = JSON.parse((ev as MessageEvent).data)
+          appendNewLogs(data.logs || [], data.last_counter)
+        } catch (e) {
+          console.error('Error parsing streamed logs', e)
+        }
+      })
+      // 计数器已从头开始（插件或服务器重启），本地日志与新计数器不再对应，重新加载
+      source.addEventListener('reset', (ev) => {
+        try {
+          lastLogCounter.current = JSON.parse((ev as MessageEvent).data).last_counter || 0
+        } catch (e) {
+          console.error('Error parsing stream reset', e)
+        }
+        loadLogs(signal)
+      })
+      source.onerror = () => {
+        // 断线时 EventSource 会携带 Last-Event-ID 自动重连；被拒绝（如 401）时进入 CLOSED，改为轮询
+        if (source && source.readyState === EventSource.CLOSED) {
+          source = null
+          startPolling()
+        }
+      }
+    } else {
+      startPolling()
+    }
 
     return () => {
       // 取消所有进行中的请求
       abortController.abort()
-      clearInterval(refreshTimer)
+      if (refreshTimer) clearInterval(refreshTimer)
+      source?.close()
     }
   }, [autoRefresh, initialLoadComplete]) // eslint-disable-line react-hooks/exhaustive-deps
 
@@ -465,16 +536,27 @@ const Terminal: React.FC = () => {
     }
   }
 
+  const checkLogCaptureStatus = async (signal?: AbortSignal) => {
+    try {
+      const res = await api.get('/log_capture_status', { signal })
+      setLogCapture({ mode: res.data.mode, backend: res.data.tail?.backend })
+    } catch {
+      // 诊断信息仅供参考，获取失败（如非管理员）时不显示
+      setLogCapture(null)
+    }
+  }
+
   const loadLogs = async (signal?: AbortSignal) => {
     setIsLoading(true)
     try {
-      const res = await api.get('/server_logs', { params: { max_lines: 500 }, signal })
+      const res = await api.get('/server_logs', { params: { max_lines: 500, format: 'compact' }, signal })
       if (res.data.status === 'success') {
-        const newLogs: LogItem[] = res.data.logs || []
+        const newLogs = decodeLogs(res.data.logs)
         setLogs(newLogs)
         if (newLogs.length > 0) {
           lastLogCounter.current = newLogs[newLogs.length - 1].counter || 0
         }
+        setHasEarlierLogs(newLogs.length > 0 && (newLogs[0].counter || 0) > 1)
       }
     } catch (e: unknown) {
       const err = e as { name?: string; code?: string };
@@ -489,6 +571,44 @@ const Terminal: React.FC = () => {
     }
   }
 
+  const loadEarlierLogs = async () => {
+    const firstCounter = logs[0]?.counter
+    if (loadingEarlier || !firstCounter) return
+    setLoadingEarlier(true)
+    try {
+      const res = await api.get('/server_logs', { params: { before_counter: firstCounter, max_lines: 200, format: 'compact' } })
+      if (res.data.status === 'success') {
+        const older = decodeLogs(res.data.logs)
+        setLogs(prev => {
+          const oldest = prev[0]?.counter
+          return [...older.filter(l => oldest === undefined || (l.counter || 0) < oldest), ...prev]
+        })
+        setHasEarlierLogs(!!res.data.has_more && older.length > 0)
+      }
+    } catch {
+      showNote(t('page.terminal.msg.load_logs_failed'), 'error')
+    } finally {
+      setLoadingEarlier(false)
+    }
+  }
+
+  const appendNewLogs = (newItems: LogItem[], lastCounter: number) => {
+    if (newItems.length === 0) return
+
+    // Filter duplicates using functional update to avoid stale closure
+    setLogs(prev => {
+      const currentCounters = new Set(prev.slice(-200).map(l => l.counter))
+      const uniqueNew = newItems.filter(l => l.counter === undefined || !currentCounters.has(l.counter))
+
+      if (uniqueNew.length > 0) {
+        const combined = [...prev, ...uniqueNew]
+        lastLogCounter.current = lastCounter
+        return combined.length > MAX_LOGS ? combined.slice(combined.length - MAX_LOGS) : combined
+      }
+      return prev
+    })
+  }
+
   const fetchNewLogs = async (signal?: AbortSignal) => {
     if (isLoading || newLogsFetchingRef.current) return
     newLogsFetchingRef.current = true
@@ -497,27 +617,14 @@ const Terminal: React.FC = () => {
       const res = await api.get('/new_logs', {
         params: {
           last_counter: lastLogCounter.current,
-          max_lines: 100
+          max_lines: 100,
+          format: 'compact'
         },
         signal
       })
 
       if (res.data.status === 'success' && res.data.new_logs_count > 0) {
-        const newItems: LogItem[] = res.data.logs
-        if (newItems.length === 0) return
-
-        // Filter duplicates using functional update to avoid stale closure
-        setLogs(prev => {
-          const currentCounters = new Set(prev.slice(-200).map(l => l.counter))
-          const uniqueNew = newItems.filter(l => l.counter === undefined || !currentCounters.has(l.counter))
-
-          if (uniqueNew.length > 0) {
-            const combined = [...prev, ...uniqueNew]
-            lastLogCounter.current = res.data.last_counter
-            return combined.length > MAX_LOGS ? combined.slice(combined.length - MAX_LOGS) : combined
-          }
-          return prev
-        })
+        appendNewLogs(decodeLogs(res.data.logs), res.data.last_counter)
       }
     } catch (e: unknown) {
       const err = e as { name?: string; code?: string };
@@ -844,6 +951,13 @@ const Terminal: React.FC = () => {
                         : serverStatus}
               </span>
               {isLoading && <Loader2 size={12} className="animate-spin ml-1" />}
+              {logCapture && (
+                <span className="hidden sm:inline text-slate-400" title={t('page.terminal.capture.title')}>
+                  · {logCapture.mode === 'compat'
+                    ? t('page.terminal.capture.compat', { backend: logCapture.backend || '-' })
+                    : t('page.terminal.capture.intercept')}
+                </span>
+              )}
             </div>
           </div>
         </div>
@@ -921,7 +1035,20 @@ const Terminal: React.FC = () => {
               <p>{t('page.terminal.empty')}</p>
             </div>
           ) : (
-            logs.map((log, idx) => (
+            <>
+            {hasEarlierLogs && (
+              <div className="flex justify-center pb-2">
+                <button
+                  type="button"
+                  onClick={loadEarlierLogs}
+                  disabled={loadingEarlier}
+                  className="text-xs text-slate-400 hover:text-slate-200 underline disabled:opacity-50"
+                >
+                  {loadingEarlier ? t('page.terminal.loading_earlier') : t('page.terminal.load_earlier')}
+                </button>
+              </div>
+            )}
+            {logs.map((log, idx) => (
               <div key={`${log.counter || idx}-${log.time}`}>
                 <div className={`break-words whitespace-pre-wrap ${getLogClass(log.content)} hover:bg-white/5`}>
                   <span className="select-none opacity-30 mr-3 text-xs w-8 inline-block text-right">{log.line_number ?? idx + 1}</span>
@@ -973,7 +1100,8 @@ const Terminal: React.FC = () => {
                   </div>
                 )}
               </div>
-            ))
+            ))}
+            </>
           )}
           <div ref={logsEndRef} />
         </div>
@@ -35,6 +35,7 @@ def is_proxy_candidate_path(path: str) -> bool:
         "/api/servers",
         "/api/panel_merge_config",
         "/api/audit_logs",
+        "/api/audit_logs/export",
     ]:
         return False
     # OpenAPI 文档与语言列表也保持主服本地（避免跨服混淆）
@@ -49,6 +50,13 @@ def is_proxy_candidate_path(path: str) -> bool:
     return True
 
 
+# 推送类接口（SSE 长连接）：代理会整体缓冲响应体，无法转发，前端对子服应回退为轮询
+STREAM_API_PATHS = {
+    "/api/server_logs/stream",
+    "/api/chat/stream",
+}
+
+
 def is_admin_api_path(path: str) -> bool:
     # 近似映射：需要管理员权限的接口集合（与路由 Depends(get_current_admin) 对齐）
     admin_exact = {
@@ -69,11 +77,13 @@ def is_admin_api_path(path: str) -> bool:
         "/api/pim/uninstall_plugin",
         "/api/pim/update_plugin",
         "/api/chat/clear_messages",
+        "/api/chat/search",
         "/api/install_pim_plugin",
         "/api/check_pim_status",
         "/api/deepseek",
         "/api/online-plugins",
         "/api/audit_logs",
+        "/api/audit_logs/export",
     }
     if path in admin_exact:
         return True
@@ -105,7 +115,14 @@ def _filter_inbound_response_headers(headers: aiohttp.typedefs.LooseHeaders) ->
     out_headers: Dict[str, str] = {}
     for k, v in dict(headers).items():
         lk = str(k).lower()
-        if lk in {"set-cookie", "content-length", "transfer-encoding", "connection"}:
+        # aiohttp 已自动解压子服响应体，不能再透传 Content-Encoding；压缩由主服重新协商
+        if lk in {
+            "set-cookie",
+            "content-length",
+            "transfer-encoding",
+            "connection",
+            "content-encoding",
+        }:
             continue
         out_headers[str(k)] = str(v)
     return out_headers
@@ -205,6 +222,16 @@ class ApiProxyDispatchMiddleware(BaseHTTPMiddleware):
                     status_code=400,
                 )
 
+            if request.url.path in STREAM_API_PATHS:
+                return JSONResponse(
+                    {
+                        "status": "error",
+                        "message": "Streaming endpoints cannot be proxied",
+                        "code": "stream_not_proxied",
+                    },
+                    status_code=400,
+                )
+
             sub_path = request.url.path[len("/api/") :]
             return await proxy_request_to_slave(request, slave, sub_path)
         except HTTPException:
@@ -2,36 +2,77 @@
 
 from __future__ import annotations
 
-from typing import Any, Dict, List
+import asyncio
+import csv
+import io
+import json
+import time
+from typing import Any, Dict, Iterator, List, Optional
 
 from fastapi import APIRouter, Depends
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from guguwebui.dependencies.auth import get_current_admin
-from guguwebui.services.operation_audit_service import list_records
+from guguwebui.services.operation_audit_service import iter_records, list_records
 
 router = APIRouter(tags=["audit"])
 
+_CSV_COLUMNS = ["id", "ts", "time", "operation_type", "summary", "username", "nickname", "auth_via", "detail"]
+
+
+def _public_row(r: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "id": r.get("id"),
+        "ts": r.get("ts"),
+        "operation_type": r.get("operation_type"),
+        "summary": r.get("summary"),
+        "detail": r.get("detail"),
+        "account": r.get("account"),
+    }
+
+
+def _filters(
+    operation_type: Optional[str],
+    username: Optional[str],
+    nickname: Optional[str],
+    auth_via: Optional[str],
+    since: Optional[float],
+    until: Optional[float],
+) -> Dict[str, Any]:
+    types = None
+    if operation_type:
+        types = [t.strip() for t in operation_type.split(",") if t.strip()] or None
+    return {
+        "operation_types": types,
+        "username": username or None,
+        "nickname": nickname or None,
+        "auth_via": auth_via or None,
+        "since": since,
+        "until": until,
+    }
+
 
 @router.get("/audit_logs")
 async def get_audit_logs(
     offset: int = 0,
     limit: int = 50,
+    operation_type: Optional[str] = None,
+    username: Optional[str] = None,
+    nickname: Optional[str] = None,
+    auth_via: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
     _admin: dict = Depends(get_current_admin),
 ):
-    rows, total = list_records(offset=offset, limit=limit, newest_first=True)
-    out: List[Dict[str, Any]] = []
-    for r in rows:
-        out.append(
-            {
-                "id": r.get("id"),
-                "ts": r.get("ts"),
-                "operation_type": r.get("operation_type"),
-                "summary": r.get("summary"),
-                "detail": r.get("detail"),
-                "account": r.get("account"),
-            }
+    rows, total = await asyncio.to_thread(
+        lambda: list_records(
+            offset=offset,
+            limit=limit,
+            newest_first=True,
+            **_filters(operation_type, username, nickname, auth_via, since, until),
         )
+    )
+    out: List[Dict[str, Any]] = [_public_row(r) for r in rows]
     return JSONResponse(
         {
             "status": "success",
@@ -41,3 +82,70 @@ async def get_audit_logs(
             "records": out,
         }
     )
+
+
+def _ndjson_lines(rows: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    for r in rows:
+        yield (json.dumps(_public_row(r), ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _csv_lines(rows: Iterator[Dict[str, Any]]) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    # 带 BOM，便于表格软件识别 UTF-8
+    buf.write("\ufeff")
+    writer.writerow(_CSV_COLUMNS)
+    for r in rows:
+        account = r.get("account") if isinstance(r.get("account"), dict) else {}
+        ts = r.get("ts")
+        try:
+            when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(float(ts)))
+        except (TypeError, ValueError, OverflowError, OSError):
+            when = ""
+        detail = r.get("detail")
+        writer.writerow([
+            r.get("id") or "",
+            ts if ts is not None else "",
+            when,
+            r.get("operation_type") or "",
+            r.get("summary") or "",
+            account.get("username") or "",
+            account.get("nickname") or "",
+            account.get("auth_via") or "",
+            json.dumps(detail, ensure_ascii=False) if detail is not None else "",
+        ])
+        if buf.tell() >= 64 * 1024:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+@router.get("/audit_logs/export")
+async def export_audit_logs(
+    format: str = "ndjson",
+    operation_type: Optional[str] = None,
+    username: Optional[str] = None,
+    nickname: Optional[str] = None,
+    auth_via: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    _admin: dict = Depends(get_current_admin),
+):
+    """按筛选条件流式导出审计记录（按时间升序），逐批读取，不整体载入日志"""
+    fmt = format.strip().lower()
+    if fmt not in ("ndjson", "csv"):
+        return JSONResponse({"status": "error", "message": "format 只支持 ndjson 或 csv"}, status_code=400)
+    rows = iter_records(**_filters(operation_type, username, nickname, auth_via, since, until))
+    filename = f"audit_log_{time.strftime('%Y%m%d_%H%M%S')}.{fmt}"
+    if fmt == "csv":
+        body, media_type = _csv_lines(rows), "text/csv; charset=utf-8"
+    else:
+        body, media_type = _ndjson_lines(rows), "application/x-ndjson"
+    # 同步生成器由 Starlette 放到线程池中迭代，文件读取不阻塞事件循环
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -1,5 +1,8 @@
+import asyncio
+from typing import Optional
+
 from fastapi import APIRouter, Depends, HTTPException, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from guguwebui.dependencies.auth import get_current_admin, get_current_user
 from guguwebui.services.chat_service import ChatService
@@ -99,6 +102,61 @@ async def get_new_chat_messages(request: Request):
     return JSONResponse({"status": "success", **result})
 
 
+@router.get("/chat/stream")
+async def chat_stream_messages(
+    request: Request,
+    after_id: int = 0,
+    session_id: str = "",
+):
+    """以 SSE 推送新消息与在线列表，替代轮询 /chat/get_new_messages"""
+    last_event_id = request.headers.get("Last-Event-ID", "").strip()
+    if last_event_id.isdigit():
+        after_id = max(after_id, int(last_event_id))
+    chat_service: ChatService = request.app.state.chat_service
+
+    # 持有有效聊天会话的玩家或已登录的 WebUI 用户在连接期间计入 Web 在线列表
+    player_id = chat_service.get_session_player(session_id)
+    if player_id is None:
+        try:
+            user = await get_current_user(request)
+            player_id = user.get("username") if user else None
+        except HTTPException:
+            player_id = None
+
+    return StreamingResponse(
+        chat_service.stream_messages(after_id, player_id, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/chat/search")
+async def chat_search_messages(
+    request: Request,
+    q: Optional[str] = None,
+    player: Optional[str] = None,
+    source: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    before_id: Optional[int] = None,
+    limit: int = 50,
+    _admin: dict = Depends(get_current_admin),
+):
+    """按玩家、来源、时间范围与文本搜索聊天记录"""
+    result = await asyncio.to_thread(
+        request.app.state.chat_service.search_messages,
+        q,
+        player,
+        source,
+        since,
+        until,
+        before_id,
+        limit,
+    )
+    status_code = 200 if result.get("status") == "success" else 400
+    return JSONResponse(result, status_code=status_code)
+
+
 @router.post("/chat/clear_messages")
 async def chat_clear_messages(
     request: Request,
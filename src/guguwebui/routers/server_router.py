@@ -1,5 +1,8 @@
-from fastapi import APIRouter, Depends, Request
-from fastapi.responses import JSONResponse
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
 
 from guguwebui.dependencies.auth import get_current_admin, get_current_user
 from guguwebui.services.operation_audit_service import record_operation
@@ -48,12 +51,20 @@ async def api_get_server_logs(
     request: Request,
     start_line: int = 0,
     max_lines: int = 100,
+    before_counter: Optional[int] = None,
+    log_format: str = Query("full", alias="format"),
     _user: dict = Depends(get_current_user),
 ):
-    """获取服务器日志"""
-    return JSONResponse(
-        {"status": "success", **request.app.state.server_service.get_logs(max_lines)}
-    )
+    """获取服务器日志；指定 before_counter 时向前翻页（可能读取磁盘历史）"""
+    server_service = request.app.state.server_service
+    compact = log_format == "compact"
+    if before_counter is None:
+        result = server_service.get_logs(max_lines, compact=compact)
+    else:
+        result = await asyncio.to_thread(
+            server_service.get_logs, max_lines, before_counter, compact
+        )
+    return JSONResponse({"status": "success", **result})
 
 
 @router.get("/new_logs")
@@ -61,17 +72,81 @@ async def api_get_new_logs(
     request: Request,
     last_counter: int = 0,
     max_lines: int = 100,
+    log_format: str = Query("full", alias="format"),
     _user: dict = Depends(get_current_user),
 ):
     """获取新增日志"""
     return JSONResponse(
         {
             "status": "success",
-            **request.app.state.server_service.get_new_logs(last_counter, max_lines),
+            **request.app.state.server_service.get_new_logs(
+                last_counter, max_lines, compact=log_format == "compact"
+            ),
         }
     )
 
 
+@router.get("/server_logs/stream")
+async def api_stream_server_logs(
+    request: Request,
+    last_counter: int = 0,
+    _user: dict = Depends(get_current_user),
+):
+    """以 SSE 推送新增日志，替代轮询 /new_logs"""
+    last_event_id = request.headers.get("Last-Event-ID", "").strip()
+    if last_event_id.isdigit():
+        last_counter = max(last_counter, int(last_event_id))
+    server_service: ServerService = request.app.state.server_service
+    return StreamingResponse(
+        server_service.stream_logs(last_counter, request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/server_logs/search")
+async def api_search_server_logs(
+    request: Request,
+    level: Optional[str] = None,
+    source: Optional[str] = None,
+    q: Optional[str] = None,
+    regex: bool = False,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+    before_counter: Optional[int] = None,
+    limit: int = 200,
+    _user: dict = Depends(get_current_user),
+):
+    """按等级、来源、文本与时间范围搜索服务器日志"""
+    result = await asyncio.to_thread(
+        request.app.state.server_service.search_logs,
+        level,
+        source,
+        q,
+        regex,
+        since,
+        until,
+        before_counter,
+        limit,
+    )
+    status_code = 200 if result.get("status") == "success" else 400
+    return JSONResponse(result, status_code=status_code)
+
+
+@router.get("/log_capture_status")
+async def api_get_log_capture_status(
+    request: Request,
+    _admin: dict = Depends(get_current_admin),
+):
+    """获取终端日志捕获诊断信息"""
+    status = request.app.state.server_service.get_log_capture_status()
+    if status is None:
+        return JSONResponse(
+            {"status": "error", "message": "日志捕获未初始化"}, status_code=503
+        )
+    return JSONResponse({"status": "success", **status})
+
+
 @router.get("/command_suggestions")
 async def api_get_command_suggestions(
     request: Request,
@@ -1,9 +1,10 @@
+import asyncio
 import datetime
 import random
 import secrets
 import string
 import time
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
 
 from guguwebui.constant import DEFALUT_CONFIG, user_db
 from guguwebui.state import RCON_ONLINE_CACHE, WEB_ONLINE_PLAYERS
@@ -13,7 +14,8 @@ from guguwebui.utils.auth_util import (
     hash_password,
     verify_password,
 )
-from guguwebui.utils.chat_logger import ChatLogger
+from guguwebui.utils.chat_logger import CHAT_CACHE_SIZE, get_chat_logger
+from guguwebui.utils.event_stream import SSE_KEEPALIVE, format_sse
 from guguwebui.utils.mc_util import (
     create_chat_logger_status_rtext,
     create_chat_message_rtext,
@@ -23,12 +25,30 @@ from guguwebui.utils.mc_util import (
     get_server_port,
 )
 
+# 在线列表中游戏内玩家与假人的缓存时间（秒），多个轮询或推送连接共享同一次 RCON 查询
+ONLINE_CACHE_SECONDS = 5
+# 推送连接上在线列表的最长刷新间隔（秒），用于反映轮询心跳过期等无事件触发的变化
+ONLINE_PUSH_INTERVAL = 30
+
 
 class ChatService:
     def __init__(self, server, config_service=None):
         self.server = server
         self.config_service = config_service
-        self.chat_logger = ChatLogger()
+        cache_size = None
+        if config_service is not None:
+            cache_size = config_service.get_config().get("chat_cache_size", CHAT_CACHE_SIZE)
+        self.chat_logger = get_chat_logger(cache_size)
+        # 推送连接按玩家计数，连接存在即视为在线，不依赖轮询心跳
+        self._stream_players: Dict[str, int] = {}
+        self._online_cache: Optional[Dict[str, Any]] = None
+        self._online_cache_ts = 0.0
+        # 刷新游戏内玩家与假人缓存的后台任务，并发的调用方共享同一次刷新
+        self._online_refresh: Optional[asyncio.Future] = None
+        # 组装好的在线列表快照及其对应的 (变化版本, 缓存时间, 秒级时间)，同一轮推送的各连接共用
+        self._online_version = 0
+        self._online_snapshot: Optional[Dict[str, list]] = None
+        self._online_snapshot_key: Optional[Tuple[int, float, int]] = None
 
     def generate_verification_code(self) -> Tuple[str, int]:
         """生成聊天页验证码"""
@@ -295,60 +315,247 @@ class ChatService:
         self, after_id: int = 0, player_id_heartbeat: str = None
     ) -> Dict[str, Any]:
         """获取新消息（基于最后消息ID）"""
-        messages = self.chat_logger.get_new_messages(after_id)
-
-        try:
-            uuid_cache = {}
-            for m in messages:
-                pid = m.get("player_id")
-                if not pid:
-                    continue
-                if pid not in uuid_cache:
-                    uuid_cache[pid] = await get_player_uuid(pid, self.server)
-                m["uuid"] = uuid_cache[pid]
-        except Exception:
-            pass
-
-        if player_id_heartbeat:
-            WEB_ONLINE_PLAYERS[player_id_heartbeat] = int(time.time()) + 5
-
-        online_web = [
-            pid
-            for pid, until in WEB_ONLINE_PLAYERS.items()
-            if until >= int(time.time())
+        messages = [
+            self.chat_logger.fill_uuid(m)
+            for m in self.chat_logger.get_new_messages(after_id)
         ]
-        online_game = []
 
-        if self.server.is_rcon_running():
+        if player_id_heartbeat:
             now_sec = int(time.time())
-            if RCON_ONLINE_CACHE["dirty"] or (
-                now_sec - int(RCON_ONLINE_CACHE["ts"]) >= 300
-            ):
-                try:
-                    feedback = self.server.rcon_query("list")
-                    names = set()
-                    if isinstance(feedback, str) and ":" in feedback:
-                        names_part = feedback.split(":", 1)[1].strip()
-                        if names_part:
-                            for name in [
-                                n.strip() for n in names_part.split(",") if n.strip()
-                            ]:
-                                names.add(name)
-                    RCON_ONLINE_CACHE["names"] = names
-                    RCON_ONLINE_CACHE["ts"] = now_sec
-                    RCON_ONLINE_CACHE["dirty"] = False
-                except Exception:
-                    pass
-            online_game = list(RCON_ONLINE_CACHE["names"])
-
-        online_bot = get_bot_list(self.server)
+            was_online = WEB_ONLINE_PLAYERS.get(player_id_heartbeat, 0) >= now_sec
+            WEB_ONLINE_PLAYERS[player_id_heartbeat] = now_sec + 5
+            if not was_online and player_id_heartbeat not in self._stream_players:
+                self.notify_online_changed()
 
         return {
             "status": "success",
             "messages": messages,
             "last_message_id": self.chat_logger.get_last_message_id(),
-            "online": {"web": online_web, "game": online_game, "bot": online_bot},
+            "online": await self.get_online_players(),
+        }
+
+    def _refresh_game_players(self) -> list:
+        """按需通过 RCON list 刷新游戏内在线玩家缓存（阻塞，须在线程中调用）"""
+        if not self.server.is_rcon_running():
+            # 未启用 RCON 时无从刷新；清掉标记避免每次都判定为过期，RCON 恢复后立即查询一次
+            RCON_ONLINE_CACHE["dirty"] = False
+            RCON_ONLINE_CACHE["ts"] = 0
+            return []
+        now_sec = int(time.time())
+        if RCON_ONLINE_CACHE["dirty"] or (
+            now_sec - int(RCON_ONLINE_CACHE["ts"]) >= 300
+        ):
+            try:
+                feedback = self.server.rcon_query("list")
+                names = set()
+                if isinstance(feedback, str) and ":" in feedback:
+                    names_part = feedback.split(":", 1)[1].strip()
+                    if names_part:
+                        for name in [
+                            n.strip() for n in names_part.split(",") if n.strip()
+                        ]:
+                            names.add(name)
+                RCON_ONLINE_CACHE["names"] = names
+                RCON_ONLINE_CACHE["ts"] = now_sec
+                RCON_ONLINE_CACHE["dirty"] = False
+            except Exception:
+                pass
+        return list(RCON_ONLINE_CACHE["names"])
+
+    def _refresh_online_cache(self) -> None:
+        """刷新游戏内玩家与假人缓存（可能执行 RCON 查询，在线程中运行）"""
+        self._online_cache = {
+            "game": self._refresh_game_players(),
+            "bot": get_bot_list(self.server),
         }
+        self._online_cache_ts = time.monotonic()
+
+    async def get_online_players(self) -> Dict[str, list]:
+        """在线列表：Web 为推送连接与未过期轮询心跳的并集，游戏内玩家与假人短时缓存
+
+        缓存过期时在线程中刷新，不阻塞事件循环；同一时刻的轮询与各推送连接共享同一次刷新和同一份快照。
+        """
+        if (
+            self._online_cache is None
+            or RCON_ONLINE_CACHE["dirty"]
+            or time.monotonic() - self._online_cache_ts >= ONLINE_CACHE_SECONDS
+        ):
+            if self._online_refresh is None or self._online_refresh.done():
+                self._online_refresh = asyncio.ensure_future(
+                    asyncio.to_thread(self._refresh_online_cache)
+                )
+            try:
+                await asyncio.shield(self._online_refresh)
+            except Exception as e:
+                self.server.logger.warning(f"刷新在线玩家列表失败: {e}")
+
+        now_sec = int(time.time())
+        key = (self._online_version, self._online_cache_ts, now_sec)
+        if self._online_snapshot is None or self._online_snapshot_key != key:
+            cache = self._online_cache or {"game": [], "bot": []}
+            online_web = set(self._stream_players)
+            online_web.update(
+                pid for pid, until in WEB_ONLINE_PLAYERS.items() if until >= now_sec
+            )
+            self._online_snapshot = {
+                "web": sorted(online_web),
+                "game": cache["game"],
+                "bot": cache["bot"],
+            }
+            self._online_snapshot_key = key
+        return self._online_snapshot
+
+    def notify_online_changed(self) -> None:
+        """通知推送连接刷新在线列表（可在任意线程调用）"""
+        self._online_version += 1
+        self.chat_logger.subscribers.publish([("online", None)])
+
+    def get_session_player(self, session_id: str) -> Optional[str]:
+        """返回有效聊天会话对应的玩家ID，会话无效或过期时返回 None"""
+        session = user_db["chat_sessions"].get(session_id) if session_id else None
+        if not session:
+            return None
+        try:
+            expire_time = datetime.datetime.fromisoformat(
+                session["expire_time"].replace("Z", "+00:00")
+            )
+        except (KeyError, ValueError):
+            return None
+        if datetime.datetime.now(datetime.timezone.utc) > expire_time:
+            return None
+        return session.get("player_id")
+
+    def _stream_connected(self, player_id: Optional[str]) -> None:
+        if not player_id:
+            return
+        count = self._stream_players.get(player_id, 0)
+        self._stream_players[player_id] = count + 1
+        if count == 0:
+            self.notify_online_changed()
+
+    def _stream_disconnected(self, player_id: Optional[str]) -> None:
+        if not player_id:
+            return
+        count = self._stream_players.get(player_id, 0) - 1
+        if count > 0:
+            self._stream_players[player_id] = count
+            return
+        self._stream_players.pop(player_id, None)
+        self.notify_online_changed()
+
+    async def stream_messages(
+        self,
+        after_id: int,
+        player_id: Optional[str],
+        is_disconnected: Callable[[], Awaitable[bool]],
+        keepalive_interval: float = 15.0,
+    ) -> AsyncIterator[str]:
+        """以 SSE 形式推送新消息与在线列表。
+
+        after_id 为客户端已有的最后消息ID（断线重连时来自 Last-Event-ID），先补齐再转为实时推送；
+        player_id 不为空时，连接存续期间该玩家计入 Web 在线列表。
+        """
+        chat_logger = self.chat_logger
+        # 先订阅再补齐，避免两步之间写入的消息丢失
+        sub = chat_logger.subscribers.subscribe()
+        self._stream_connected(player_id)
+        try:
+            last_id = max(int(after_id or 0), 0)
+            while True:
+                messages = [
+                    chat_logger.fill_uuid(m)
+                    for m in chat_logger.get_new_messages(last_id)
+                ]
+                if not messages:
+                    break
+                last_id = messages[-1]["id"]
+                yield format_sse(
+                    {"messages": messages, "last_message_id": last_id},
+                    event="messages",
+                    event_id=last_id,
+                )
+            last_id = max(last_id, chat_logger.get_last_message_id())
+            yield format_sse(
+                {"last_message_id": last_id, "online": await self.get_online_players()},
+                event="ready",
+                event_id=last_id,
+            )
+            online_sent = time.monotonic()
+
+            catching_up = False
+            while not sub.closed:
+                if catching_up:
+                    items, overflowed = [], True
+                else:
+                    items, overflowed = await sub.get(keepalive_interval)
+                if await is_disconnected():
+                    break
+
+                kinds = {kind for kind, _ in items}
+                if "clear" in kinds or chat_logger.get_last_message_id() < last_id:
+                    # 聊天记录被清空，消息ID从头开始；只保留清空之后写入的消息
+                    if "clear" in kinds:
+                        cut = max(i for i, (kind, _) in enumerate(items) if kind == "clear")
+                        items = items[cut + 1:]
+                    last_id = 0
+                    yield format_sse({"last_message_id": 0}, event="clear", event_id=0)
+                if overflowed:
+                    # 客户端消费过慢，队列已丢弃积压，改为按消息ID补齐
+                    messages = chat_logger.get_new_messages(last_id)
+                    catching_up = len(messages) >= 100
+                else:
+                    messages = [
+                        entry
+                        for kind, entry in items
+                        if kind == "message" and entry["id"] > last_id
+                    ]
+                if messages:
+                    messages = [chat_logger.fill_uuid(m) for m in messages]
+                    last_id = messages[-1]["id"]
+                    yield format_sse(
+                        {"messages": messages, "last_message_id": last_id},
+                        event="messages",
+                        event_id=last_id,
+                    )
+
+                now = time.monotonic()
+                if "online" in kinds or now - online_sent >= ONLINE_PUSH_INTERVAL:
+                    online_sent = now
+                    yield format_sse(
+                        {"online": await self.get_online_players()}, event="online"
+                    )
+                elif not items and not overflowed:
+                    yield SSE_KEEPALIVE
+        finally:
+            chat_logger.subscribers.unsubscribe(sub)
+            self._stream_disconnected(player_id)
+
+    def search_messages(
+        self,
+        q: Optional[str] = None,
+        player: Optional[str] = None,
+        source: Optional[str] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        before_id: Optional[int] = None,
+        limit: int = 50,
+    ) -> Dict[str, Any]:
+        """搜索聊天记录；source 支持以逗号分隔的多个值（game / webui / plugin）"""
+        limit = max(1, min(limit, 200))
+        sources = [item.strip().lower() for item in (source or "").split(",") if item.strip()]
+        invalid = [item for item in sources if item not in ("game", "webui", "plugin")]
+        if invalid:
+            return {"status": "error", "message": f"无效的消息来源: {', '.join(invalid)}"}
+        result = self.chat_logger.search_messages(
+            text=(q or "").strip() or None,
+            player=(player or "").strip() or None,
+            sources=sources,
+            since=since,
+            until=until,
+            before_id=before_id,
+            limit=limit,
+        )
+        return {"status": "success", **result}
 
     def clear_messages(self):
         """清空聊天消息"""
@@ -11,7 +11,7 @@ from guguwebui.constant import (DEFALUT_CONFIG, MCDR_OFFICIAL_CATALOGUE_URL,
                                 PF_PLUGIN_CATALOGUE_URL,
                                 SERVER_PROPERTIES_PATH)
 from guguwebui.utils.api_cache import api_cache
-from guguwebui.utils.chat_logger import ChatLogger
+from guguwebui.utils.chat_logger import get_chat_logger
 from guguwebui.utils.i18n_util import (build_json_i18n_translations,
                                        build_yaml_i18n_translations,
                                        consistent_type_update, get_comment)
@@ -115,8 +115,7 @@ class ConfigService:
 
         chat_message_count = 0
         try:
-            chat_logger = ChatLogger()
-            chat_message_count = chat_logger.get_message_count()
+            chat_message_count = get_chat_logger().get_message_count()
         except Exception:
             pass
 
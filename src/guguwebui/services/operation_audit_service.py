@@ -1,24 +1,73 @@
-"""操作层审计：追加写入 guguwebui_static/audit_log.bin（长度前缀 + UTF-8 JSON）。"""
+"""操作层审计：追加写入 guguwebui_static/audit_log.bin（长度前缀 + UTF-8 JSON）。
+
+audit_log.bin 为活动分段，超过大小或写入时长上限后移入 audit_segments/ 封存，
+由后台维护线程压缩并按保留策略删除（见 utils/audit_archive.py），读取对分段透明。
+
+旁路索引 audit_log.idx 与数据文件同步追加，每条记录一项定长条目：
+[帧偏移(8字节，高位为分段号)][时间戳(8字节双精度)]，均为大端。
+记录按写入顺序追加，分页时按下标直接定位所需的帧，只解码返回的那一页。
+
+筛选用的二级索引 audit_log.keys 同样每条记录一项：[操作类型编号(4字节)][账号编号(4字节)]，
+编号对应的取值保存在 audit_log.keys.json。首次使用时整体载入内存并建立倒排表，之后随写入增量维护。
+
+索引只是数据文件的派生物，缺失或落后（升级前的日志、崩溃）时首次使用会扫描活动分段补齐。
+
+记录由后台写入线程批量落盘并按配置的间隔 fsync，请求处理中只入队；查询前会先写入排队中的记录。
+"""
 
 from __future__ import annotations
 
+import bisect
+import heapq
 import json
+import logging
+import os
 import struct
 import threading
 import time
 import uuid
-from typing import Any, Dict, List, Optional
+from array import array
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
 
 from guguwebui.constant import AUDIT_LOG_PATH as _AUDIT_CONST
 from guguwebui.utils.audit_actor import account_snapshot_from_user
+from guguwebui.utils.audit_archive import AuditArchive
+from guguwebui.utils.chat_archive import encode_offset, local_offset, resolve_compression, segment_of
+
+logger = logging.getLogger(__name__)
 
 AUDIT_LOG_PATH = _AUDIT_CONST
+AUDIT_INDEX_PATH = AUDIT_LOG_PATH.with_suffix(".idx")
+AUDIT_KEYS_PATH = AUDIT_LOG_PATH.with_suffix(".keys")
+AUDIT_KEY_NAMES_PATH = AUDIT_LOG_PATH.with_suffix(".keys.json")
 
 _LOCK = threading.Lock()
 _UINT32_BE = struct.Struct(">I")
+_INDEX_ENTRY = struct.Struct(">Qd")
+_KEY_ENTRY = struct.Struct(">II")
 
 # detail 中单字段字符串最大长度，防止异常大对象
 _MAX_DETAIL_STR = 8000
+# 超过该长度的帧视为损坏
+_MAX_FRAME = 32 * 1024 * 1024
+# 导出时每批读取的记录数
+EXPORT_BATCH = 200
+# 后台维护（压缩封存分段、保留策略）的最长间隔（秒）；分段封存后会立即触发一次
+MAINTENANCE_INTERVAL = 3600
+
+# 分段与保留策略，由 configure_storage 按插件配置设置；0 表示不限制
+_POLICY: Dict[str, Any] = {
+    "segment_max_bytes": 8 * 1024 * 1024,
+    "segment_max_seconds": 30 * 86400,
+    "compression": "none",
+    "retention_seconds": 0,
+    "max_total_bytes": 0,
+    # 写入后最迟多少秒 fsync 一次；0 表示每批写入后立即 fsync
+    "fsync_interval": 1.0,
+}
+
+AccountKey = Tuple[str, str, str]
 
 
 def _truncate_detail(detail: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
@@ -37,9 +86,510 @@ def _ensure_parent() -> None:
     AUDIT_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 
-def append_record(record: Dict[str, Any]) -> None:
-    if "id" not in record:
-        record["id"] = str(uuid.uuid4())
+def _file_size(path) -> int:
+    try:
+        return path.stat().st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _pread(f, size: int, offset: int) -> bytes:
+    if hasattr(os, "pread"):
+        return os.pread(f.fileno(), size, offset)
+    f.seek(offset)
+    return f.read(size)
+
+
+def _record_ts(record: Dict[str, Any]) -> float:
+    try:
+        return float(record.get("ts") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _record_keys(record: Dict[str, Any]) -> Tuple[str, AccountKey]:
+    """取出二级索引的键：操作类型与账号快照 (username, nickname, auth_via)"""
+    account = record.get("account")
+    if not isinstance(account, dict):
+        account = {}
+    return str(record.get("operation_type") or ""), (
+        str(account.get("username") or ""),
+        str(account.get("nickname") or ""),
+        str(account.get("auth_via") or ""),
+    )
+
+
+def _decode_frame(payload: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        record = json.loads(payload.decode("utf-8"))
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return None
+    return record if isinstance(record, dict) else None
+
+
+class _IndexView(NamedTuple):
+    """查询时在锁内取得的索引快照；保留策略重载索引时会换成新数组，快照保持自洽"""
+
+    count: int
+    offsets: array
+    ts: array
+    monotonic: bool
+    types: array
+    accounts: array
+    by_type: Dict[int, array]
+    by_account: Dict[int, array]
+
+
+class _FrameIndex:
+    """帧偏移索引与二级索引；修改须在 _LOCK 内进行。
+
+    内存中的数组只会追加，已计入 count 的条目不再变化，查询可在锁外按快照读取。
+    """
+
+    def __init__(self) -> None:
+        self.archive: Optional[AuditArchive] = None
+        self.count = 0
+        # 活动分段的大小与其第一条记录的下标
+        self.data_size = 0
+        self.active_start = 0
+        self.ready = False
+        self.offsets = array("Q")
+        self.ts = array("d")
+        # 时间戳是否单调不减；成立时时间范围可直接二分定位
+        self.monotonic = True
+        self.types = array("I")
+        self.accounts = array("I")
+        self.type_names: List[str] = []
+        self.type_ids: Dict[str, int] = {}
+        self.account_keys: List[AccountKey] = []
+        self.account_ids: Dict[AccountKey, int] = {}
+        self.by_type: Dict[int, array] = {}
+        self.by_account: Dict[int, array] = {}
+
+    # ---- 载入与修复 ----
+
+    def sync_unlocked(self) -> None:
+        """首次使用时核对索引与数据文件，去掉失效条目、为未索引的帧补齐条目并载入内存"""
+        if self.ready:
+            return
+        _ensure_parent()
+        if self.archive is None:
+            self.archive = AuditArchive(AUDIT_LOG_PATH.parent, AUDIT_LOG_PATH)
+        active = self.archive.active
+        data_size = _file_size(AUDIT_LOG_PATH)
+        count = _file_size(AUDIT_INDEX_PATH) // _INDEX_ENTRY.size
+        start = 0
+        with open(AUDIT_LOG_PATH, "a+b") as data, open(AUDIT_INDEX_PATH, "a+b") as index:
+            # 从末尾回退到最后一个有效条目：封存分段中的条目直接保留，活动分段中的须完整落在文件内
+            while count:
+                offset, _ts = _INDEX_ENTRY.unpack(
+                    _pread(index, _INDEX_ENTRY.size, (count - 1) * _INDEX_ENTRY.size)
+                )
+                segment_no = segment_of(offset)
+                if segment_no != active:
+                    if self.archive.find(segment_no) is not None:
+                        break
+                    count -= 1
+                    continue
+                end = self._frame_end(data, local_offset(offset), data_size)
+                if end is not None:
+                    start = end
+                    break
+                count -= 1
+            index.truncate(count * _INDEX_ENTRY.size)
+            if start == 0 and not self._sealed_indexed(index, count):
+                # 分段已封存但索引尾部未落盘：按封存分段重新生成全部条目，二级索引随之重建
+                logger.warning("审计索引缺少已封存分段的条目，将重建")
+                index.truncate(0)
+                sealed = self._index_sealed()
+                index.write(b"".join(sealed))
+                count = len(sealed)
+                with open(AUDIT_KEYS_PATH, "wb"):
+                    pass
+
+            entries: List[bytes] = []
+            offset = start
+            while offset < data_size:
+                end = self._frame_end(data, offset, data_size)
+                if end is None:
+                    break
+                record = _decode_frame(_pread(data, end - offset - 4, offset + 4)) or {}
+                entries.append(_INDEX_ENTRY.pack(encode_offset(active, offset), _record_ts(record)))
+                offset = end
+            if entries:
+                index.seek(0, os.SEEK_END)
+                index.write(b"".join(entries))
+                count += len(entries)
+            # 崩溃时写了一半的帧：截掉，避免之后追加的帧被它遮挡
+            if offset < data_size:
+                data.truncate(offset)
+
+            index.seek(0)
+            raw = index.read(count * _INDEX_ENTRY.size)
+        self.data_size = offset
+        offsets = array("Q")
+        ts_values = array("d")
+        for frame_offset, ts in _INDEX_ENTRY.iter_unpack(raw):
+            offsets.append(frame_offset)
+            ts_values.append(ts)
+
+        # 保留策略删除分段后、改写索引前崩溃：去掉指向已删除分段的条目
+        dropped = bisect.bisect_left(offsets, encode_offset(self.archive.first_segment(), 0))
+        if dropped:
+            self._drop_prefix_files(dropped)
+            offsets, ts_values = offsets[dropped:], ts_values[dropped:]
+
+        self.offsets, self.ts = offsets, ts_values
+        self.monotonic = all(ts_values[i] <= ts_values[i + 1] for i in range(len(ts_values) - 1))
+        self.count = len(offsets)
+        self.active_start = bisect.bisect_left(offsets, encode_offset(active, 0))
+        self._load_keys()
+        self.ready = True
+
+    def _sealed_indexed(self, index, count: int) -> bool:
+        """索引前 count 项是否覆盖了清单中全部封存分段的记录"""
+        expected = sum(int(entry.get("count", 0)) for entry in self.archive.segments)
+        if not expected:
+            return True
+        known = {entry["no"] for entry in self.archive.segments}
+        index.seek(0)
+        raw = index.read(count * _INDEX_ENTRY.size)
+        indexed = sum(1 for offset, _ts in _INDEX_ENTRY.iter_unpack(raw) if segment_of(offset) in known)
+        return indexed >= expected
+
+    def _index_sealed(self) -> List[bytes]:
+        """扫描全部封存分段，生成对应的索引条目"""
+        entries: List[bytes] = []
+        for entry in self.archive.segments:
+            buf = self.archive.read(entry["no"])
+            if buf is None:
+                continue
+            local = 0
+            while True:
+                header = bytes(buf[local:local + 4])
+                if len(header) < 4:
+                    break
+                (length,) = _UINT32_BE.unpack(header)
+                if length > _MAX_FRAME or local + 4 + length > len(buf):
+                    break
+                record = _decode_frame(bytes(buf[local + 4:local + 4 + length])) or {}
+                entries.append(_INDEX_ENTRY.pack(encode_offset(entry["no"], local), _record_ts(record)))
+                local += 4 + length
+        return entries
+
+    def _load_keys(self) -> None:
+        """载入二级索引；与偏移索引不一致的部分从数据文件补齐"""
+        self.types = array("I")
+        self.accounts = array("I")
+        self.by_type = {}
+        self.by_account = {}
+        try:
+            with open(AUDIT_KEY_NAMES_PATH, "r", encoding="utf-8") as f:
+                names = json.load(f)
+            self.type_names = [str(name) for name in names["operation_types"]]
+            self.account_keys = [tuple(str(part) for part in key) for key in names["accounts"]]
+        except FileNotFoundError:
+            names = None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"读取审计筛选索引失败，将重建: {e}")
+            names = None
+        if names is None:
+            self.type_names = []
+            self.account_keys = []
+            with open(AUDIT_KEYS_PATH, "wb"):
+                pass
+        self.type_ids = {name: i for i, name in enumerate(self.type_names)}
+        self.account_ids = {key: i for i, key in enumerate(self.account_keys)}
+
+        known = min(_file_size(AUDIT_KEYS_PATH) // _KEY_ENTRY.size, self.count)
+        with open(AUDIT_KEYS_PATH, "a+b") as f:
+            f.truncate(known * _KEY_ENTRY.size)
+            f.seek(0)
+            raw = f.read()
+        for type_id, account_id in _KEY_ENTRY.iter_unpack(raw):
+            if type_id >= len(self.type_names) or account_id >= len(self.account_keys):
+                # 编号越界说明取值表与索引不匹配，整体重建
+                logger.warning("审计筛选索引与取值表不一致，将重建")
+                self.type_names, self.account_keys = [], []
+                self.type_ids, self.account_ids = {}, {}
+                with open(AUDIT_KEYS_PATH, "wb"):
+                    pass
+                self.types, self.accounts = array("I"), array("I")
+                self.by_type, self.by_account = {}, {}
+                break
+            self._add_keys(type_id, account_id)
+
+        if len(self.types) < self.count:
+            self._rebuild_keys(len(self.types))
+
+    def _rebuild_keys(self, start: int) -> None:
+        """解码下标 start 之后的帧，补齐二级索引"""
+        entries: List[bytes] = []
+        names_changed = False
+        records = _read_frames(self.archive, self.offsets[start:self.count], keep_missing=True)
+        for record in records:
+            type_id, account_id, changed = self._intern(*_record_keys(record or {}))
+            names_changed = names_changed or changed
+            self._add_keys(type_id, account_id)
+            entries.append(_KEY_ENTRY.pack(type_id, account_id))
+        if names_changed:
+            self._save_names()
+        with open(AUDIT_KEYS_PATH, "ab") as f:
+            f.write(b"".join(entries))
+
+    @staticmethod
+    def _frame_end(data, offset: int, data_size: int) -> Optional[int]:
+        """返回 offset 处完整帧的结束位置；帧不完整或长度异常时返回 None"""
+        if offset + 4 > data_size:
+            return None
+        (length,) = _UINT32_BE.unpack(_pread(data, 4, offset))
+        end = offset + 4 + length
+        if length > _MAX_FRAME or end > data_size:
+            return None
+        return end
+
+    @staticmethod
+    def _drop_prefix_files(count: int) -> None:
+        """删除索引文件中最早的 count 项（先写临时文件再替换）"""
+        for path, entry_size in ((AUDIT_INDEX_PATH, _INDEX_ENTRY.size), (AUDIT_KEYS_PATH, _KEY_ENTRY.size)):
+            if not path.exists():
+                continue
+            tmp = path.with_name(path.name + ".tmp")
+            with open(path, "rb") as src, open(tmp, "wb") as dst:
+                src.seek(count * entry_size)
+                while True:
+                    chunk = src.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+            os.replace(tmp, path)
+
+    def drop_prefix_unlocked(self, count: int) -> None:
+        """保留策略删除分段后调用：去掉最早的 count 条索引并重新载入"""
+        if count <= 0:
+            return
+        self._drop_prefix_files(count)
+        self.ready = False
+        self.sync_unlocked()
+
+    # ---- 写入 ----
+
+    def _intern(self, operation_type: str, account: AccountKey) -> Tuple[int, int, bool]:
+        changed = False
+        type_id = self.type_ids.get(operation_type)
+        if type_id is None:
+            type_id = self.type_ids[operation_type] = len(self.type_names)
+            self.type_names.append(operation_type)
+            changed = True
+        account_id = self.account_ids.get(account)
+        if account_id is None:
+            account_id = self.account_ids[account] = len(self.account_keys)
+            self.account_keys.append(account)
+            changed = True
+        return type_id, account_id, changed
+
+    def _save_names(self) -> None:
+        """取值表先于引用它的索引项落盘（先写临时文件再替换）"""
+        tmp = AUDIT_KEY_NAMES_PATH.with_name(AUDIT_KEY_NAMES_PATH.name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {"operation_types": self.type_names, "accounts": [list(key) for key in self.account_keys]},
+                f,
+                ensure_ascii=False,
+            )
+        os.replace(tmp, AUDIT_KEY_NAMES_PATH)
+
+    def _add_keys(self, type_id: int, account_id: int) -> None:
+        position = len(self.types)
+        self.types.append(type_id)
+        self.accounts.append(account_id)
+        self.by_type.setdefault(type_id, array("I")).append(position)
+        self.by_account.setdefault(account_id, array("I")).append(position)
+
+    def _should_rotate(self, ts: float) -> bool:
+        if not self.data_size:
+            return False
+        if self.data_size >= _POLICY["segment_max_bytes"]:
+            return True
+        max_seconds = _POLICY["segment_max_seconds"]
+        return bool(max_seconds) and self.active_start < self.count and ts - self.ts[self.active_start] >= max_seconds
+
+    def _rotate_unlocked(self) -> bool:
+        """封存活动分段，之后的记录写入新的活动分段；封存失败时返回 False，继续写入当前分段，之后重试"""
+        try:
+            self.archive.seal_active(
+                first_ts=self.ts[self.active_start],
+                last_ts=self.ts[self.count - 1],
+                count=self.count - self.active_start,
+                size=self.data_size,
+            )
+        except OSError as e:
+            logger.warning(f"封存审计日志分段失败，稍后重试: {e}")
+            return False
+        self.data_size = 0
+        self.active_start = self.count
+        _MAINTENANCE_EVENT.set()
+        return True
+
+    def append_batch_unlocked(self, items: List[Tuple[bytes, Dict[str, Any]]]) -> None:
+        """批量追加 (帧, 记录)：三个文件各合并为一次写入，需要封存时先写出已攒下的部分"""
+        self.sync_unlocked()
+        data_buf, index_buf, keys_buf = bytearray(), bytearray(), bytearray()
+        names_changed = False
+        rotate = True
+
+        def write_out() -> None:
+            # 取值表先于引用它的索引项落盘
+            if names_changed:
+                self._save_names()
+            for path, buf in ((AUDIT_LOG_PATH, data_buf), (AUDIT_INDEX_PATH, index_buf), (AUDIT_KEYS_PATH, keys_buf)):
+                if buf:
+                    with open(path, "ab") as f:
+                        f.write(buf)
+                    buf.clear()
+
+        try:
+            for frame, record in items:
+                ts = _record_ts(record)
+                if rotate and self._should_rotate(ts):
+                    write_out()
+                    names_changed = False
+                    # 封存失败时本批不再重试
+                    rotate = self._rotate_unlocked()
+                type_id, account_id, changed = self._intern(*_record_keys(record))
+                names_changed = names_changed or changed
+                offset = encode_offset(self.archive.active, self.data_size)
+                data_buf += frame
+                index_buf += _INDEX_ENTRY.pack(offset, ts)
+                keys_buf += _KEY_ENTRY.pack(type_id, account_id)
+                self.data_size += len(frame)
+                if self.ts and ts < self.ts[-1]:
+                    self.monotonic = False
+                self.offsets.append(offset)
+                self.ts.append(ts)
+                self._add_keys(type_id, account_id)
+                self.count += 1
+            write_out()
+        except Exception:
+            # 内存索引已领先于磁盘，下次使用时按文件重新载入
+            self.ready = False
+            raise
+
+    # ---- 查询 ----
+
+    def view_unlocked(self) -> _IndexView:
+        return _IndexView(
+            self.count, self.offsets, self.ts, self.monotonic,
+            self.types, self.accounts, self.by_type, self.by_account,
+        )
+
+    def resolve_unlocked(
+        self,
+        operation_types: Optional[Iterable[str]],
+        username: Optional[str],
+        nickname: Optional[str],
+        auth_via: Optional[str],
+    ) -> Tuple[Optional[Set[int]], Optional[Set[int]]]:
+        """把筛选条件换算为操作类型编号集合与账号编号集合；None 表示该维度不筛选"""
+        type_set: Optional[Set[int]] = None
+        if operation_types is not None:
+            type_set = set()
+            for value in operation_types:
+                if value.endswith("*"):
+                    prefix = value[:-1]
+                    type_set.update(i for i, name in enumerate(self.type_names) if name.startswith(prefix))
+                elif value in self.type_ids:
+                    type_set.add(self.type_ids[value])
+
+        account_set: Optional[Set[int]] = None
+        if username is not None or nickname is not None or auth_via is not None:
+            username = username.casefold() if username is not None else None
+            nickname = nickname.casefold() if nickname is not None else None
+            account_set = {
+                i
+                for i, (u, n, a) in enumerate(self.account_keys)
+                if (username is None or u.casefold() == username)
+                and (nickname is None or n.casefold() == nickname)
+                and (auth_via is None or a == auth_via)
+            }
+        return type_set, account_set
+
+
+def _match(
+    view: _IndexView,
+    type_set: Optional[Set[int]],
+    account_set: Optional[Set[int]],
+    since: Optional[float],
+    until: Optional[float],
+) -> Sequence[int]:
+    """返回快照中满足条件的下标（升序）；只读取内存索引，不解码记录"""
+    lo, hi = 0, view.count
+    check_ts = since is not None or until is not None
+    if check_ts and view.monotonic:
+        if since is not None:
+            lo = bisect.bisect_left(view.ts, since, 0, hi)
+        if until is not None:
+            hi = bisect.bisect_right(view.ts, until, lo, hi)
+        check_ts = False
+    if type_set is None and account_set is None and not check_ts:
+        return range(lo, hi)
+
+    # 以候选最少的维度驱动，其余条件逐条核对
+    candidates = []
+    for id_set, postings in ((type_set, view.by_type), (account_set, view.by_account)):
+        if id_set is None:
+            continue
+        lists = []
+        size = 0
+        for key in id_set:
+            plist = postings.get(key)
+            if plist is None:
+                continue
+            start = bisect.bisect_left(plist, lo)
+            stop = bisect.bisect_left(plist, hi, start)
+            lists.append((plist, start, stop))
+            size += stop - start
+        candidates.append((size, lists))
+    if candidates:
+        _size, lists = min(candidates, key=lambda item: item[0])
+        driver = heapq.merge(*(plist[start:stop] for plist, start, stop in lists))
+    else:
+        driver = range(lo, hi)
+
+    out = array("I")
+    for position in driver:
+        if type_set is not None and view.types[position] not in type_set:
+            continue
+        if account_set is not None and view.accounts[position] not in account_set:
+            continue
+        if check_ts:
+            ts = view.ts[position]
+            if (since is not None and ts < since) or (until is not None and ts > until):
+                continue
+        out.append(position)
+    return out
+
+
+_INDEX = _FrameIndex()
+_MAINTENANCE_EVENT = threading.Event()
+_maintenance_thread: Optional[threading.Thread] = None
+_stopping = False
+
+# 待写入的记录；请求处理中只入队，由后台写入线程批量落盘
+_PENDING: Deque[Dict[str, Any]] = deque()
+_WRITER_EVENT = threading.Event()
+_writer_thread: Optional[threading.Thread] = None
+_writer_stopping = False
+# 距上次 fsync 后是否写入过数据，以及上次 fsync 的时间（time.monotonic）
+_unsynced = False
+_last_fsync = 0.0
+# 收到新记录后稍等片刻再写入，合并同一时间段内的多条记录
+WRITE_COALESCE_SECONDS = 0.05
+# 积压超过该条数时由调用方直接写入，避免写入线程异常时无限堆积
+MAX_PENDING = 10000
+
+
+def _encode_frame(record: Dict[str, Any]) -> Tuple[bytes, Dict[str, Any]]:
     payload = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
     if len(payload) > 4 * 1024 * 1024:
         record = {
@@ -51,11 +601,71 @@ def append_record(record: Dict[str, Any]) -> None:
             "account": record.get("account"),
         }
         payload = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
-    _ensure_parent()
-    frame = _UINT32_BE.pack(len(payload)) + payload
+    return _UINT32_BE.pack(len(payload)) + payload, record
+
+
+def _drain_unlocked() -> None:
+    """把排队中的记录一次性写入；须在 _LOCK 内调用"""
+    global _unsynced
+    if not _PENDING:
+        return
+    batch = []
+    while _PENDING:
+        batch.append(_PENDING.popleft())
+    _INDEX.append_batch_unlocked([_encode_frame(record) for record in batch])
+    _unsynced = True
+    if not _POLICY["fsync_interval"]:
+        _fsync_unlocked()
+
+
+def _fsync_unlocked() -> None:
+    global _unsynced, _last_fsync
+    for path in (AUDIT_LOG_PATH, AUDIT_INDEX_PATH, AUDIT_KEYS_PATH):
+        if path.exists():
+            with open(path, "ab") as f:
+                os.fsync(f.fileno())
+    _unsynced = False
+    _last_fsync = time.monotonic()
+
+
+def flush(sync: bool = False) -> None:
+    """立即写入排队中的记录；sync 为 True 时同时 fsync"""
     with _LOCK:
-        with open(AUDIT_LOG_PATH, "ab") as f:
-            f.write(frame)
+        _INDEX.sync_unlocked()
+        _drain_unlocked()
+        if sync and _unsynced:
+            _fsync_unlocked()
+
+
+def append_record(record: Dict[str, Any]) -> None:
+    """记录入队后立即返回；写入线程未运行（尚未启动或已卸载）时直接写入"""
+    if "id" not in record:
+        record["id"] = str(uuid.uuid4())
+    _PENDING.append(record)
+    writer = _writer_thread
+    if writer is not None and writer.is_alive() and not _writer_stopping and len(_PENDING) < MAX_PENDING:
+        _WRITER_EVENT.set()
+        return
+    flush()
+
+
+def _writer_loop() -> None:
+    while True:
+        interval = _POLICY["fsync_interval"]
+        _WRITER_EVENT.wait(interval if interval and _unsynced else None)
+        if not _writer_stopping:
+            time.sleep(WRITE_COALESCE_SECONDS)
+        _WRITER_EVENT.clear()
+        try:
+            with _LOCK:
+                _INDEX.sync_unlocked()
+                _drain_unlocked()
+                if _unsynced and (_writer_stopping or time.monotonic() - _last_fsync >= interval):
+                    _fsync_unlocked()
+        except Exception as e:
+            logger.warning(f"写入操作审计记录失败: {e}")
+        if _writer_stopping:
+            return
 
 
 def record_operation(
@@ -76,39 +686,232 @@ def record_operation(
     append_record(rec)
 
 
-def _read_all_records_unlocked() -> List[Dict[str, Any]]:
-    if not AUDIT_LOG_PATH.is_file():
-        return []
-    out: List[Dict[str, Any]] = []
-    with open(AUDIT_LOG_PATH, "rb") as f:
-        data = f.read()
-    offset = 0
-    n = len(data)
-    while offset + 4 <= n:
-        (length,) = _UINT32_BE.unpack_from(data, offset)
-        offset += 4
-        if length > n - offset or length > 32 * 1024 * 1024:
-            break
-        chunk = data[offset : offset + length]
-        offset += length
-        try:
-            out.append(json.loads(chunk.decode("utf-8")))
-        except (json.JSONDecodeError, UnicodeDecodeError):
-            continue
+def _frame_at(buf, local: int) -> Optional[Dict[str, Any]]:
+    """从封存分段内容中解析 local 处的帧"""
+    header = bytes(buf[local:local + 4])
+    if len(header) < 4:
+        return None
+    (length,) = _UINT32_BE.unpack(header)
+    payload = bytes(buf[local + 4:local + 4 + length])
+    if length > _MAX_FRAME or len(payload) < length:
+        return None
+    return _decode_frame(payload)
+
+
+def _active_frame_at(f, local: int) -> Optional[Dict[str, Any]]:
+    header = _pread(f, 4, local)
+    if len(header) < 4:
+        return None
+    (length,) = _UINT32_BE.unpack(header)
+    if length > _MAX_FRAME:
+        return None
+    payload = _pread(f, length, local + 4)
+    if len(payload) < length:
+        return None
+    return _decode_frame(payload)
+
+
+def _read_frames(archive: AuditArchive, offsets: Iterable[int], keep_missing: bool = False) -> List[Optional[Dict[str, Any]]]:
+    """按偏移读取并解码对应的帧，跨分段透明；读取失败的帧默认跳过，keep_missing 时以 None 占位"""
+    out: List[Optional[Dict[str, Any]]] = []
+    buffers: Dict[int, Any] = {}
+    with open(AUDIT_LOG_PATH, "rb") as active_file:
+        for offset in offsets:
+            segment_no, local = segment_of(offset), local_offset(offset)
+            record = None
+            if segment_no == archive.active:
+                record = _active_frame_at(active_file, local)
+            if record is None:
+                # 封存分段；查询期间活动分段恰好被封存时也从这里读到
+                if segment_no not in buffers:
+                    buffers[segment_no] = archive.read(segment_no)
+                buf = buffers[segment_no]
+                if buf is not None:
+                    record = _frame_at(buf, local)
+            if record is not None or keep_missing:
+                out.append(record)
     return out
 
 
+def _match_positions(
+    operation_types: Optional[Iterable[str]],
+    username: Optional[str],
+    nickname: Optional[str],
+    auth_via: Optional[str],
+    since: Optional[float],
+    until: Optional[float],
+) -> Tuple[_IndexView, Sequence[int]]:
+    with _LOCK:
+        _INDEX.sync_unlocked()
+        # 先写入排队中的记录，查询结果包含刚发生的操作
+        _drain_unlocked()
+        view = _INDEX.view_unlocked()
+        type_set, account_set = _INDEX.resolve_unlocked(operation_types, username, nickname, auth_via)
+    return view, _match(view, type_set, account_set, since, until)
+
+
 def list_records(
     *,
     offset: int = 0,
     limit: int = 50,
     newest_first: bool = True,
+    operation_types: Optional[Iterable[str]] = None,
+    username: Optional[str] = None,
+    nickname: Optional[str] = None,
+    auth_via: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
 ) -> tuple[List[Dict[str, Any]], int]:
+    """按写入顺序分页读取审计记录，total 为满足筛选条件的条数；只解码返回的一页
+
+    operation_types 中以 * 结尾的值按前缀匹配（如 pim.*）；username / nickname 不区分大小写。
+    """
     limit = max(1, min(limit, 500))
     offset = max(0, offset)
-    with _LOCK:
-        rows = _read_all_records_unlocked()
-    total = len(rows)
-    rows.sort(key=lambda r: float(r.get("ts") or 0), reverse=newest_first)
-    page = rows[offset : offset + limit]
+    view, positions = _match_positions(operation_types, username, nickname, auth_via, since, until)
+    total = len(positions)
+    if newest_first:
+        selected = positions[max(total - offset - limit, 0):max(total - offset, 0)]
+    else:
+        selected = positions[offset:offset + limit]
+    page = _read_frames(_INDEX.archive, (view.offsets[p] for p in selected))
+    if newest_first:
+        page.reverse()
     return page, total
+
+
+def iter_records(
+    *,
+    newest_first: bool = False,
+    operation_types: Optional[Iterable[str]] = None,
+    username: Optional[str] = None,
+    nickname: Optional[str] = None,
+    auth_via: Optional[str] = None,
+    since: Optional[float] = None,
+    until: Optional[float] = None,
+) -> Iterator[Dict[str, Any]]:
+    """逐条产出满足条件的记录（用于导出），每次只解码 EXPORT_BATCH 条，不整体读入日志"""
+    view, positions = _match_positions(operation_types, username, nickname, auth_via, since, until)
+    total = len(positions)
+    for start in range(0, total, EXPORT_BATCH):
+        if newest_first:
+            batch = positions[max(total - start - EXPORT_BATCH, 0):total - start]
+        else:
+            batch = positions[start:start + EXPORT_BATCH]
+        rows = _read_frames(_INDEX.archive, (view.offsets[p] for p in batch))
+        if newest_first:
+            rows.reverse()
+        yield from rows
+
+
+# ---- 分段维护 ----
+
+
+def configure_storage(
+    segment_max_bytes: int = 8 * 1024 * 1024,
+    segment_max_seconds: int = 30 * 86400,
+    compression: str = "none",
+    retention_seconds: int = 0,
+    max_total_bytes: int = 0,
+    fsync_interval: float = 1.0,
+) -> None:
+    """按插件配置设置分段、压缩、保留与 fsync 策略，并启动后台写入与维护线程"""
+    global _maintenance_thread, _stopping, _writer_thread, _writer_stopping
+    with _LOCK:
+        _POLICY.update(
+            segment_max_bytes=max(int(segment_max_bytes), 64 * 1024),
+            segment_max_seconds=max(int(segment_max_seconds), 0),
+            compression=resolve_compression(compression),
+            retention_seconds=max(int(retention_seconds), 0),
+            max_total_bytes=max(int(max_total_bytes), 0),
+            fsync_interval=max(float(fsync_interval), 0.0),
+        )
+        _stopping = False
+        _writer_stopping = False
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_writer_loop, name="GUGUWebUI-AuditWriter", daemon=True)
+            _writer_thread.start()
+        if _maintenance_thread is None or not _maintenance_thread.is_alive():
+            _maintenance_thread = threading.Thread(
+                target=_maintenance_loop, name="GUGUWebUI-AuditArchive", daemon=True
+            )
+            _maintenance_thread.start()
+    _MAINTENANCE_EVENT.set()
+
+
+def _maintenance_loop() -> None:
+    while True:
+        _MAINTENANCE_EVENT.wait(MAINTENANCE_INTERVAL)
+        _MAINTENANCE_EVENT.clear()
+        if _stopping:
+            return
+        try:
+            run_maintenance()
+        except Exception as e:
+            logger.warning(f"审计日志分段维护失败: {e}")
+
+
+def run_maintenance() -> None:
+    """压缩尚未压缩的封存分段，然后执行保留策略"""
+    with _LOCK:
+        _INDEX.sync_unlocked()
+        archive = _INDEX.archive
+        compression = _POLICY["compression"]
+        pending = [] if compression == "none" else [
+            dict(entry) for entry in archive.segments if entry["compression"] == "none"
+        ]
+    for entry in pending:
+        if _stopping:
+            return
+        try:
+            name, size = archive.write_compressed(entry, compression)
+        except OSError as e:
+            logger.warning(f"压缩审计归档分段 {entry['file']} 失败: {e}")
+            continue
+        with _LOCK:
+            archive.finish_compress(entry["no"], name, size, compression)
+    with _LOCK:
+        _apply_retention_unlocked()
+
+
+def _apply_retention_unlocked() -> None:
+    """删除超出保留期限或总大小上限的最早封存分段（活动分段始终保留）"""
+    archive = _INDEX.archive
+    expired: List[dict] = []
+    retention_seconds = _POLICY["retention_seconds"]
+    if retention_seconds:
+        cutoff = time.time() - retention_seconds
+        for entry in archive.segments:
+            if entry["last_ts"] >= cutoff:
+                break
+            expired.append(entry)
+    max_total_bytes = _POLICY["max_total_bytes"]
+    if max_total_bytes:
+        total = archive.total_size() + _INDEX.data_size - sum(entry["size"] for entry in expired)
+        for entry in archive.segments[len(expired):]:
+            if total <= max_total_bytes:
+                break
+            expired.append(entry)
+            total -= entry["size"]
+    if not expired:
+        return
+    archive.drop(expired)
+    _INDEX.drop_prefix_unlocked(
+        bisect.bisect_left(_INDEX.offsets, encode_offset(archive.first_segment(), 0))
+    )
+    logger.info(f"审计日志保留策略删除了 {len(expired)} 个分段")
+
+
+def close_audit_log() -> None:
+    """停止后台线程并写入、fsync 排队中的记录（插件卸载时调用）；之后的记录改为直接写入"""
+    global _maintenance_thread, _stopping, _writer_thread, _writer_stopping
+    _writer_stopping = True
+    _WRITER_EVENT.set()
+    _stopping = True
+    _MAINTENANCE_EVENT.set()
+    for thread in (_writer_thread, _maintenance_thread):
+        if thread is not None and thread.is_alive():
+            thread.join(timeout=5)
+    _writer_thread = None
+    _maintenance_thread = None
+    flush(sync=True)
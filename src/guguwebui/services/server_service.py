@@ -1,10 +1,12 @@
 import datetime
 import json
+import re
 import traceback
 from pathlib import Path
-from typing import List, Optional
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
 
 from guguwebui.utils.api_cache import api_cache
+from guguwebui.utils.event_stream import SSE_KEEPALIVE, format_sse
 from guguwebui.utils.mc_util import get_java_server_info, get_server_port
 from guguwebui.utils.mcdr_adapter import MCDRAdapter
 
@@ -68,7 +70,22 @@ class ServerService:
             }
         return {"status": "error", "message": "Invalid action"}
 
-    def get_logs(self, max_lines: int = 100):
+    @staticmethod
+    def _slim_logs(logs):
+        """整页日志只返回前端展示所需字段"""
+        return [
+            {
+                "line_number": log["line_number"],
+                "content": log["content"],
+                "source": log["source"],
+                "counter": log.get("counter", 0),
+            }
+            for log in logs
+        ]
+
+    def get_logs(
+        self, max_lines: int = 100, before_counter: Optional[int] = None, compact: bool = False
+    ):
         if not self.log_watcher:
             return None
 
@@ -76,34 +93,143 @@ class ServerService:
         if max_lines > 500:
             max_lines = 500
 
-        result = self.log_watcher.get_merged_logs(max_lines)
-
-        formatted_logs = []
-        for log in result["logs"]:
-            formatted_logs.append(
-                {
-                    "line_number": log["line_number"],
-                    "content": log["content"],
-                    "source": log["source"],
-                    "counter": log.get("counter", 0),
-                }
-            )
+        if before_counter is not None:
+            return self.get_logs_before(before_counter, max_lines, compact)
 
+        result = self.log_watcher.get_merged_logs(max_lines, compact=compact)
         return {
-            "logs": formatted_logs,
+            "logs": result["logs"] if compact else self._slim_logs(result["logs"]),
             "total_lines": result["total_lines"],
             "current_start": result["start_line"],
             "current_end": result["end_line"],
         }
 
-    def get_new_logs(self, last_counter: int = 0, max_lines: int = 100):
+    def get_logs_before(self, before_counter: int, max_lines: int = 100, compact: bool = False):
+        """向前翻页获取 counter 小于 before_counter 的日志，超出内存部分读取磁盘历史"""
+        result = self.log_watcher.get_logs_before_counter(before_counter, max_lines, compact=compact)
+        return {
+            "logs": result["logs"] if compact else self._slim_logs(result["logs"]),
+            "total_lines": result["total_lines"],
+            "has_more": result["has_more"],
+        }
+
+    def search_logs(
+        self,
+        level: Optional[str] = None,
+        source: Optional[str] = None,
+        q: Optional[str] = None,
+        regex: bool = False,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        before_counter: Optional[int] = None,
+        limit: int = 200,
+    ):
+        """搜索终端日志；level / source 支持以逗号分隔的多个值"""
+        if not self.log_watcher:
+            return {"status": "error", "message": "日志捕获未初始化"}
+
+        limit = max(1, min(limit, 500))
+        levels = [item.strip() for item in (level or "").split(",") if item.strip()]
+        sources = [item.strip() for item in (source or "").split(",") if item.strip()]
+        try:
+            result = self.log_watcher.search_logs(
+                levels=levels,
+                sources=sources,
+                query=q,
+                use_regex=regex,
+                since=since,
+                until=until,
+                before_counter=before_counter,
+                limit=limit,
+            )
+        except re.error as e:
+            return {"status": "error", "message": f"无效的正则表达式: {e}"}
+        return {"status": "success", **result}
+
+    def get_log_capture_status(self):
+        if not self.log_watcher:
+            return None
+        return self.log_watcher.get_capture_status()
+
+    def get_new_logs(self, last_counter: int = 0, max_lines: int = 100, compact: bool = False):
         if not self.log_watcher:
             return None
 
         if max_lines > 200:
             max_lines = 200
 
-        return self.log_watcher.get_logs_since_counter(last_counter, max_lines)
+        return self.log_watcher.get_logs_since_counter(last_counter, max_lines, compact=compact)
+
+    async def stream_logs(
+        self,
+        last_counter: int,
+        is_disconnected: Callable[[], Awaitable[bool]],
+        keepalive_interval: float = 15.0,
+    ) -> AsyncIterator[str]:
+        """以 SSE 形式推送新日志。
+
+        last_counter 为客户端已有的最后计数器（断线重连时来自 Last-Event-ID），
+        先从缓冲区补齐缺失部分，再转为实时推送；为 0 时只推送连接之后的新日志。
+        last_counter 大于当前计数器（插件或服务器重启后计数器从头开始）时发送 reset 事件，
+        按新连接处理，客户端应重新加载日志。
+        """
+        if not self.log_watcher:
+            return
+
+        log_watcher = self.log_watcher
+        # 先订阅再补齐，避免两步之间产生的日志丢失
+        sub = log_watcher.subscribers.subscribe()
+        try:
+            current = log_watcher.get_last_counter()
+            if last_counter > current:
+                yield format_sse({"last_counter": current}, event="reset", event_id=current)
+                last_counter = current
+            elif last_counter <= 0:
+                last_counter = current
+            else:
+                while True:
+                    result = log_watcher.get_logs_since_counter(last_counter, 200)
+                    if not result["logs"]:
+                        break
+                    last_counter = result["last_counter"]
+                    yield format_sse(
+                        {"logs": result["logs"], "last_counter": last_counter},
+                        event="logs",
+                        event_id=last_counter,
+                    )
+            yield format_sse({"last_counter": last_counter}, event="ready")
+
+            catching_up = False
+            while not sub.closed:
+                if catching_up:
+                    items, overflowed = [], True
+                else:
+                    items, overflowed = await sub.get(keepalive_interval)
+                if await is_disconnected():
+                    break
+                if overflowed:
+                    # 客户端消费过慢，队列已丢弃积压，改为从缓冲区按计数器补齐
+                    result = log_watcher.get_logs_since_counter(last_counter, 200)
+                    logs = result["logs"]
+                    catching_up = len(logs) >= 200
+                else:
+                    logs = [
+                        log_watcher.to_api_entry(entry, line_number)
+                        for line_number, entry in items
+                        if entry.counter > last_counter
+                    ]
+                if not logs:
+                    if not items and not overflowed:
+                        yield SSE_KEEPALIVE
+                    continue
+                last_counter = logs[-1]["counter"]
+                yield format_sse(
+                    {"logs": logs, "last_counter": last_counter},
+                    event="logs",
+                    event_id=last_counter,
+                )
+        finally:
+            log_watcher.subscribers.unsubscribe(sub)
 
     async def get_rcon_status(self):
         cache_key = "rcon_status"
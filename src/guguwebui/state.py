@@ -28,7 +28,7 @@ class PluginApiHandlerParams(TypedDict):
 # FastAPI 应用实例，由 web_server.init_app 注入，供 PIM 等模块调度异步任务
 app: Optional[Any] = None
 
-# Web在线玩家心跳（基于 /api/chat/get_new_messages 请求），值为最近心跳Unix秒
+# Web在线玩家心跳（基于 /api/chat/get_new_messages 轮询，推送连接另由 ChatService 按连接计数），值为心跳过期Unix秒
 WEB_ONLINE_PLAYERS: Dict[str, int] = {}
 
 # RCON 在线玩家缓存，降低查询频率
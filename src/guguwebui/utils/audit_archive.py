@@ -0,0 +1,221 @@
+"""
+操作审计分段归档
+audit_log.bin 为正在写入的活动分段，超过大小上限或写入时长上限后整体移入 audit_segments/ 封存，
+之后只读；后台维护线程按配置压缩封存分段（lzma / zstd），并按保留天数、总大小上限删除最早的分段。
+
+偏移索引 audit_log.idx 中的偏移字段与聊天记录相同，编码为 (分段号 << 40) | 分段内偏移（见 chat_archive.encode_offset）；
+分段内偏移始终指向未压缩的数据，压缩只替换文件，不需要改写索引。
+升级前的索引项分段号为 0，恰好对应升级前的 audit_log.bin。
+
+分段清单 audit_segments.json 记录活动分段号与全部封存分段，每项：
+{"no", "file", "first_ts", "last_ts", "count", "size"（磁盘大小）, "raw_size"（解压后大小）, "compression"}
+"""
+
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from guguwebui.utils.chat_archive import compress_data, decompress_data
+from guguwebui.utils.chat_index import MappedFile
+
+logger = logging.getLogger(__name__)
+
+_SUFFIXES = {"none": ".bin", "lzma": ".bin.xz", "zstd": ".bin.zst"}
+# 同时保留在内存中的解压后分段数
+DECODED_CACHE_SIZE = 2
+
+
+class AuditArchive:
+    """分段清单与封存分段的读取；清单的修改由 operation_audit_service 在其锁内发起"""
+
+    def __init__(self, data_dir: Path, active_path: Path):
+        self.data_dir = Path(data_dir)
+        self.directory = self.data_dir / "audit_segments"
+        self.manifest_path = self.data_dir / "audit_segments.json"
+        self.active_path = Path(active_path)
+        self._lock = threading.Lock()
+        self._mapped: Dict[int, MappedFile] = {}
+        self._decoded: "OrderedDict[int, bytes]" = OrderedDict()
+
+        self.active = 0
+        self.next_segment = 1
+        self.segments: List[dict] = []
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.load()
+
+    # ---- 清单 ----
+
+    def load(self) -> None:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = None
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取审计分段清单失败，按未分段处理: {e}")
+            manifest = None
+
+        if not isinstance(manifest, dict):
+            self._restore_unsealed(0)
+            # 升级前的数据：整个 audit_log.bin 作为分段 0
+            self.active = 0
+            self.next_segment = 1
+            self.segments = []
+            return
+
+        self.active = int(manifest.get("active", 0))
+        self.next_segment = max(int(manifest.get("next_segment", 1)), self.active + 1)
+        self.segments = list(manifest.get("segments", []))
+
+        self._restore_unsealed(self.active)
+
+    def _restore_unsealed(self, segment_no: int) -> None:
+        """封存时先移动文件再写清单：两步之间崩溃时把已移走的活动分段移回"""
+        path = self.directory / f"{segment_no:06d}{_SUFFIXES['none']}"
+        if not path.exists():
+            return
+        if self.active_path.exists() and self.active_path.stat().st_size > 0:
+            logger.warning(f"发现未记入清单的审计分段 {path.name}，且活动分段非空，保留原样")
+            return
+        os.replace(path, self.active_path)
+
+    def save(self) -> None:
+        manifest = {
+            "active": self.active,
+            "next_segment": self.next_segment,
+            "segments": self.segments,
+        }
+        tmp = self.manifest_path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def find(self, segment_no: int) -> Optional[dict]:
+        for entry in self.segments:
+            if entry["no"] == segment_no:
+                return entry
+        return None
+
+    def knows(self, segment_no: int) -> bool:
+        return segment_no == self.active or self.find(segment_no) is not None
+
+    def first_segment(self) -> int:
+        """仍保留的最早分段号"""
+        return self.segments[0]["no"] if self.segments else self.active
+
+    def total_size(self) -> int:
+        return sum(entry["size"] for entry in self.segments)
+
+    # ---- 修改 ----
+
+    def seal_active(self, first_ts: float, last_ts: float, count: int, size: int) -> dict:
+        """封存活动分段并开始新的活动分段，返回封存分段的清单项"""
+        entry = {
+            "no": self.active,
+            "file": f"{self.active:06d}{_SUFFIXES['none']}",
+            "first_ts": first_ts,
+            "last_ts": last_ts,
+            "count": count,
+            "size": size,
+            "raw_size": size,
+            "compression": "none",
+        }
+        # 先移动文件再提交清单：移动失败（Windows 下文件仍被读取）时清单与内存状态均不变
+        path = self.directory / entry["file"]
+        os.replace(self.active_path, path)
+        previous = (list(self.segments), self.active, self.next_segment)
+        try:
+            self.segments.append(entry)
+            self.active = self.next_segment
+            self.next_segment += 1
+            self.save()
+        except Exception:
+            self.segments, self.active, self.next_segment = previous
+            os.replace(path, self.active_path)
+            raise
+        self.active_path.touch()
+        return entry
+
+    def write_compressed(self, entry: dict, compression: str) -> Tuple[str, int]:
+        """把未压缩的封存分段压缩写入新文件（先写临时文件再替换），返回 (文件名, 磁盘大小)
+
+        不修改清单，可在锁外执行；随后由 finish_compress 切换。
+        """
+        name = f"{entry['no']:06d}{_SUFFIXES[compression]}"
+        path = self.directory / name
+        tmp = path.with_name(path.name + ".tmp")
+        payload = compress_data((self.directory / entry["file"]).read_bytes(), compression)
+        with open(tmp, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return name, len(payload)
+
+    def finish_compress(self, segment_no: int, name: str, size: int, compression: str) -> bool:
+        """清单改为指向压缩后的文件并删除原文件；分段已被删除时返回 False"""
+        entry = self.find(segment_no)
+        if entry is None:
+            self._unlink(name)
+            return False
+        old = dict(entry)
+        entry.update(file=name, size=size, compression=compression)
+        self.save()
+        self.delete_file(old)
+        return True
+
+    def drop(self, entries: List[dict]) -> None:
+        """移除过期分段（先更新清单再删除文件）"""
+        numbers = {entry["no"] for entry in entries}
+        self.segments = [entry for entry in self.segments if entry["no"] not in numbers]
+        self.save()
+        for entry in entries:
+            self.delete_file(entry)
+
+    def delete_file(self, entry: dict) -> None:
+        with self._lock:
+            self._mapped.pop(entry["no"], None)
+            self._decoded.pop(entry["no"], None)
+        self._unlink(entry["file"])
+
+    def _unlink(self, name: str) -> None:
+        try:
+            (self.directory / name).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"删除审计归档分段 {name} 失败: {e}")
+
+    # ---- 读取 ----
+
+    def read(self, segment_no: int) -> Optional[object]:
+        """返回封存分段的完整内容（未压缩时为只读映射视图）；分段不存在或无法读取时返回 None"""
+        entry = self.find(segment_no)
+        if entry is None:
+            return None
+        path = self.directory / entry["file"]
+        with self._lock:
+            if entry["compression"] == "none":
+                mapped = self._mapped.get(segment_no)
+                if mapped is None:
+                    mapped = self._mapped[segment_no] = MappedFile(path)
+                return mapped.view(entry["raw_size"])
+            data = self._decoded.get(segment_no)
+            if data is not None:
+                self._decoded.move_to_end(segment_no)
+                return data
+        # 解压在锁外进行，不阻塞其他分段的读取
+        try:
+            data = decompress_data(path.read_bytes(), entry["compression"])
+        except Exception as e:
+            logger.warning(f"读取审计归档分段 {entry['file']} 失败: {e}")
+            return None
+        with self._lock:
+            self._decoded[segment_no] = data
+            while len(self._decoded) > DECODED_CACHE_SIZE:
+                self._decoded.popitem(last=False)
+        return data
@@ -0,0 +1,357 @@
+"""
+聊天记录分段归档
+chat_messages.bin 为正在写入的活动分段，写满（大小上限）或跨月后整体移入 chat_segments/ 封存，
+之后只读；封存分段由后台整理线程统一迁移为 v3 记录，并按配置压缩（lzma / zstd）。
+
+偏移索引 chat_messages.idx 中的偏移字段编码为 (分段号 << 40) | 分段内偏移：
+升级前的索引项分段号为 0，恰好对应升级前的 chat_messages.bin，无需迁移即可继续使用。
+
+分段清单 chat_segments.json 记录活动分段号与全部封存分段，每项：
+{"no", "file", "first_id", "last_id", "first_ts_ms", "last_ts_ms", "count",
+ "size"（磁盘大小）, "raw_size"（解压后大小）, "format"（3 表示只含 v3 记录，0 表示可能含旧格式）, "compression"}
+整理中被替换、但索引尚未全部改写的旧分段暂存在 "retired" 中，文件保留到改写完成，读取不受影响。
+
+偏移编码与压缩函数同时供操作审计分段（audit_archive）使用。
+"""
+
+import json
+import logging
+import lzma
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from guguwebui.utils.chat_index import MappedFile
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SHIFT = 40
+LOCAL_MASK = (1 << SEGMENT_SHIFT) - 1
+# 分段内记录格式：3 = 只含 v3 记录，0 = 可能含 v1/v2 记录（升级前写入）
+FORMAT_V3 = 3
+FORMAT_MIXED = 0
+COMPRESSIONS = ("none", "lzma", "zstd")
+_SUFFIXES = {"none": ".bin", "lzma": ".bin.xz", "zstd": ".bin.zst"}
+# 同时保留在内存中的解压后分段数
+DECODED_CACHE_SIZE = 2
+
+try:  # Python 3.14+
+    from compression import zstd as _zstd
+
+    def _zstd_compress(data: bytes) -> bytes:
+        return _zstd.compress(data, level=10)
+
+    def _zstd_decompress(data: bytes) -> bytes:
+        return _zstd.decompress(data)
+except ImportError:
+    try:
+        import zstandard as _zstd
+
+        def _zstd_compress(data: bytes) -> bytes:
+            return _zstd.ZstdCompressor(level=10).compress(data)
+
+        def _zstd_decompress(data: bytes) -> bytes:
+            return _zstd.ZstdDecompressor().decompress(data)
+    except ImportError:
+        _zstd = None
+
+
+def encode_offset(segment_no: int, local: int) -> int:
+    return (segment_no << SEGMENT_SHIFT) | local
+
+
+def segment_of(offset: int) -> int:
+    return offset >> SEGMENT_SHIFT
+
+
+def local_offset(offset: int) -> int:
+    return offset & LOCAL_MASK
+
+
+_zstd_warned = False
+
+
+def resolve_compression(name: Optional[str]) -> str:
+    """规范化压缩算法配置；未安装 zstd 支持时回退为 lzma"""
+    global _zstd_warned
+    name = (name or "none").strip().lower()
+    if name not in COMPRESSIONS:
+        logger.warning(f"未知的归档压缩算法 {name}，将不压缩")
+        return "none"
+    if name == "zstd" and _zstd is None:
+        if not _zstd_warned:
+            logger.warning("当前环境不支持 zstd（需要 Python 3.14 或 zstandard 包），归档改用 lzma 压缩")
+            _zstd_warned = True
+        return "lzma"
+    return name
+
+
+def compress_data(data: bytes, compression: str) -> bytes:
+    if compression == "lzma":
+        return lzma.compress(data, preset=6)
+    if compression == "zstd":
+        return _zstd_compress(data)
+    return data
+
+
+def decompress_data(data: bytes, compression: str) -> bytes:
+    if compression == "lzma":
+        return lzma.decompress(data)
+    if compression == "zstd":
+        if _zstd is None:
+            raise OSError("当前环境不支持 zstd，无法读取该归档分段")
+        return _zstd_decompress(data)
+    return data
+
+
+class ChatArchive:
+    """分段清单与封存分段的读取；清单的修改由 ChatLogger 在其锁内发起"""
+
+    def __init__(self, data_dir: Path, active_path: Path):
+        self.data_dir = Path(data_dir)
+        self.directory = self.data_dir / "chat_segments"
+        self.manifest_path = self.data_dir / "chat_segments.json"
+        self.active_path = Path(active_path)
+        self._lock = threading.Lock()
+        self._mapped: Dict[int, MappedFile] = {}
+        self._decoded: "OrderedDict[int, bytes]" = OrderedDict()
+
+        self.active = 0
+        self.active_format = FORMAT_V3
+        self.next_segment = 1
+        self.segments: List[dict] = []
+        self.retired: List[dict] = []
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.load()
+
+    # ---- 清单 ----
+
+    def load(self) -> None:
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            manifest = None
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取聊天分段清单失败，按未分段处理: {e}")
+            manifest = None
+
+        if not isinstance(manifest, dict):
+            self._restore_unsealed(0)
+            # 升级前的数据：整个 chat_messages.bin 作为分段 0，可能含旧格式记录
+            has_data = self.active_path.exists() and self.active_path.stat().st_size > 0
+            self.active = 0
+            self.active_format = FORMAT_MIXED if has_data else FORMAT_V3
+            self.next_segment = 1
+            self.segments = []
+            self.retired = []
+            self._remove_orphans()
+            return
+
+        self.active = int(manifest.get("active", 0))
+        self.active_format = int(manifest.get("active_format", FORMAT_MIXED))
+        self.next_segment = max(int(manifest.get("next_segment", 1)), self.active + 1)
+        self.segments = list(manifest.get("segments", []))
+        self.retired = list(manifest.get("retired", []))
+
+        # 旧版本封存时先写清单再移动文件：两步之间崩溃时补做移动
+        if self.segments:
+            newest = self.segments[-1]
+            path = self.directory / newest["file"]
+            if not path.exists() and self.active_path.exists():
+                os.replace(self.active_path, path)
+                self.active_path.touch()
+        self._restore_unsealed(self.active)
+        self._remove_orphans()
+
+    def _restore_unsealed(self, segment_no: int) -> None:
+        """封存时先移动文件再写清单：两步之间崩溃时活动分段文件不存在，把已移走的文件移回"""
+        path = self.directory / f"{segment_no:06d}{_SUFFIXES['none']}"
+        if not path.exists() or self.active_path.exists():
+            return
+        os.replace(path, self.active_path)
+
+    def _remove_orphans(self) -> None:
+        """删除清单中没有登记的分段文件：整理时分配编号并写出分段后、登记前崩溃留下的文件，
+        其内容仍在旧分段中"""
+        listed = {entry["file"] for entry in self.segments + self.retired}
+        for path in self.directory.iterdir():
+            if path.name in listed or not path.name[:6].isdigit():
+                continue
+            logger.warning(f"删除未记入清单的聊天分段文件 {path.name}")
+            try:
+                path.unlink()
+            except OSError as e:
+                logger.warning(f"删除聊天分段文件 {path.name} 失败: {e}")
+
+    def save(self) -> None:
+        manifest = {
+            "active": self.active,
+            "active_format": self.active_format,
+            "next_segment": self.next_segment,
+            "segments": self.segments,
+            "retired": self.retired,
+        }
+        tmp = self.manifest_path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    def find(self, segment_no: int) -> Optional[dict]:
+        for entry in self.segments:
+            if entry["no"] == segment_no:
+                return entry
+        for entry in self.retired:
+            if entry["no"] == segment_no:
+                return entry
+        return None
+
+    def knows(self, segment_no: int) -> bool:
+        return segment_no == self.active or self.find(segment_no) is not None
+
+    def allocate(self) -> int:
+        """分配新的分段编号；写出分段文件前先持久化，崩溃后不会再次分配同一编号"""
+        segment_no = self.next_segment
+        self.next_segment += 1
+        self.save()
+        return segment_no
+
+    def total_size(self) -> int:
+        return sum(entry["size"] for entry in self.segments)
+
+    # ---- 修改 ----
+
+    def seal_active(self, first_id: int, last_id: int, first_ts_ms: int, last_ts_ms: int,
+                    count: int, size: int) -> dict:
+        """封存活动分段并开始新的活动分段，返回封存分段的清单项"""
+        entry = {
+            "no": self.active,
+            "file": f"{self.active:06d}{_SUFFIXES['none']}",
+            "first_id": first_id,
+            "last_id": last_id,
+            "first_ts_ms": first_ts_ms,
+            "last_ts_ms": last_ts_ms,
+            "count": count,
+            "size": size,
+            "raw_size": size,
+            "format": self.active_format,
+            "compression": "none",
+        }
+        # 先移动文件再提交清单：移动失败（Windows 下文件仍被打开或映射）时清单与内存状态均不变
+        path = self.directory / entry["file"]
+        os.replace(self.active_path, path)
+        previous = (list(self.segments), self.active, self.active_format, self.next_segment)
+        try:
+            self.segments.append(entry)
+            self.active = self.next_segment
+            self.next_segment += 1
+            self.active_format = FORMAT_V3
+            self.save()
+        except Exception:
+            self.segments, self.active, self.active_format, self.next_segment = previous
+            os.replace(path, self.active_path)
+            raise
+        self.active_path.touch()
+        return entry
+
+    def write_segment(self, segment_no: int, data: bytes, compression: str) -> Tuple[str, int]:
+        """写入整理后的分段文件（先写临时文件再替换），返回 (文件名, 磁盘大小)"""
+        name = f"{segment_no:06d}{_SUFFIXES[compression]}"
+        path = self.directory / name
+        tmp = path.with_name(path.name + ".tmp")
+        payload = compress_data(data, compression)
+        with open(tmp, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return name, len(payload)
+
+    def replace(self, old: dict, new_entries: List[dict]) -> None:
+        """用整理后的分段替换旧分段；旧分段转入 retired，直到索引改写完成"""
+        position = self.segments.index(old)
+        self.segments[position:position + 1] = new_entries
+        retired = dict(old)
+        retired["replaced_by"] = [entry["no"] for entry in new_entries]
+        self.retired.append(retired)
+        self.save()
+
+    def finish_replace(self, segment_no: int) -> None:
+        """索引已全部指向新分段：移除旧分段并删除文件"""
+        entries = [entry for entry in self.retired if entry["no"] == segment_no]
+        self.retired = [entry for entry in self.retired if entry["no"] != segment_no]
+        self.save()
+        for entry in entries:
+            self.delete_file(entry)
+
+    def drop(self, entries: List[dict]) -> None:
+        """移除过期分段（先更新清单再删除文件）"""
+        numbers = {entry["no"] for entry in entries}
+        self.segments = [entry for entry in self.segments if entry["no"] not in numbers]
+        self.save()
+        for entry in entries:
+            self.delete_file(entry)
+
+    def reset(self) -> None:
+        """删除全部封存分段（清空聊天记录时调用）"""
+        for entry in self.segments + self.retired:
+            self.delete_file(entry)
+        self.segments = []
+        self.retired = []
+        self.active = 0
+        self.active_format = FORMAT_V3
+        self.next_segment = 1
+        self.save()
+
+    def delete_file(self, entry: dict) -> None:
+        with self._lock:
+            self._mapped.pop(entry["no"], None)
+            self._decoded.pop(entry["no"], None)
+        try:
+            (self.directory / entry["file"]).unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"删除聊天归档分段 {entry['file']} 失败: {e}")
+
+    # ---- 读取 ----
+
+    def read(self, segment_no: int) -> Tuple[Optional[object], int]:
+        """返回封存分段的完整内容（未压缩时为只读映射视图）与记录格式；分段不存在时返回 (None, 0)"""
+        entry = self.find(segment_no)
+        if entry is None:
+            return None, FORMAT_MIXED
+        path = self.directory / entry["file"]
+        with self._lock:
+            if entry["compression"] == "none":
+                mapped = self._mapped.get(segment_no)
+                if mapped is None:
+                    mapped = self._mapped[segment_no] = MappedFile(path)
+                return mapped.view(entry["raw_size"]), entry["format"]
+            data = self._decoded.get(segment_no)
+            if data is not None:
+                self._decoded.move_to_end(segment_no)
+                return data, entry["format"]
+        # 解压在锁外进行，不阻塞其他分段的读取
+        try:
+            data = decompress_data(path.read_bytes(), entry["compression"])
+        except Exception as e:
+            logger.warning(f"读取聊天归档分段 {entry['file']} 失败: {e}")
+            return None, FORMAT_MIXED
+        with self._lock:
+            self._decoded[segment_no] = data
+            while len(self._decoded) > DECODED_CACHE_SIZE:
+                self._decoded.popitem(last=False)
+        return data, entry["format"]
+
+    def stats(self) -> dict:
+        compressed = sum(1 for entry in self.segments if entry["compression"] != "none")
+        return {
+            "segments": len(self.segments),
+            "compressed_segments": compressed,
+            "bytes": self.total_size(),
+            "raw_bytes": sum(entry["raw_size"] for entry in self.segments),
+            "active_segment": self.active,
+        }
@@ -0,0 +1,185 @@
+"""
+聊天消息偏移索引与映射读取
+chat_messages.bin 之外追加写入的定长二进制索引，每条消息一项：
+[消息ID(8字节)][记录在数据文件中的偏移(8字节)][时间戳毫秒(8字节)]，均为大端。
+偏移的高位为记录所在的分段号（见 chat_archive.encode_offset）。
+
+消息ID单调递增，索引项按ID有序，可直接按下标随机读取并二分查找。
+索引只是数据文件的派生物，损坏或缺失时可由 ChatLogger 扫描数据文件重建。
+
+数据文件通过 MappedFile 以只读内存映射的方式共享给所有读取请求，按页解析时不再整段读入。
+"""
+
+import mmap
+import os
+import struct
+import threading
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional
+
+INDEX_RECORD = struct.Struct(">QQq")
+
+
+class IndexRecord(NamedTuple):
+    id: int
+    offset: int
+    timestamp_ms: int
+
+
+class ChatOffsetIndex:
+    """定长偏移索引文件；不持有文件句柄，调用方负责加锁"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.count = 0
+
+    def reload(self) -> int:
+        """按文件大小重新计算条目数，截掉崩溃时写了一半的末尾项"""
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            self.path.touch()
+            size = 0
+        whole = size - size % INDEX_RECORD.size
+        if whole != size:
+            with open(self.path, "r+b") as f:
+                f.truncate(whole)
+        self.count = whole // INDEX_RECORD.size
+        return self.count
+
+    def append(self, message_id: int, offset: int, timestamp_ms: int) -> None:
+        with open(self.path, "ab") as f:
+            f.write(INDEX_RECORD.pack(message_id, offset, timestamp_ms))
+        self.count += 1
+
+    def extend(self, records: Iterable[IndexRecord]) -> None:
+        data = b"".join(INDEX_RECORD.pack(*record) for record in records)
+        if not data:
+            return
+        with open(self.path, "ab") as f:
+            f.write(data)
+        self.count += len(data) // INDEX_RECORD.size
+
+    def truncate(self, count: int) -> None:
+        with open(self.path, "r+b") as f:
+            f.truncate(count * INDEX_RECORD.size)
+        self.count = count
+
+    def reset(self) -> None:
+        with open(self.path, "wb"):
+            pass
+        self.count = 0
+
+    def rewrite(self, position: int, records: List[IndexRecord]) -> None:
+        """原地改写自下标 position 起的索引项（条数不变，用于分段整理后更新偏移）"""
+        if position < 0 or position + len(records) > self.count:
+            raise ValueError("改写范围超出索引")
+        data = b"".join(INDEX_RECORD.pack(*record) for record in records)
+        with open(self.path, "r+b") as f:
+            f.seek(position * INDEX_RECORD.size)
+            f.write(data)
+
+    def drop_prefix(self, count: int) -> None:
+        """删除最早的 count 项（保留策略清理分段后调用），先写临时文件再替换"""
+        count = min(max(count, 0), self.count)
+        if not count:
+            return
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(self.path, "rb") as src, open(tmp, "wb") as dst:
+            src.seek(count * INDEX_RECORD.size)
+            while True:
+                chunk = src.read(1024 * 1024)
+                if not chunk:
+                    break
+                dst.write(chunk)
+        os.replace(tmp, self.path)
+        self.count -= count
+
+    def read_range(self, start: int, stop: int) -> List[IndexRecord]:
+        """读取下标 [start, stop) 的索引项"""
+        start = max(start, 0)
+        stop = min(stop, self.count)
+        if start >= stop:
+            return []
+        with open(self.path, "rb") as f:
+            f.seek(start * INDEX_RECORD.size)
+            data = f.read((stop - start) * INDEX_RECORD.size)
+        return [IndexRecord(*fields) for fields in INDEX_RECORD.iter_unpack(data)]
+
+    def record(self, position: int) -> Optional[IndexRecord]:
+        records = self.read_range(position, position + 1)
+        return records[0] if records else None
+
+    def last(self) -> Optional[IndexRecord]:
+        return self.record(self.count - 1) if self.count else None
+
+    def bisect_id(self, message_id: int) -> int:
+        """返回第一个 ID 大于 message_id 的下标（与 bisect.bisect_right 语义一致），只读取 O(log n) 项"""
+        lo, hi = 0, self.count
+        if not hi:
+            return 0
+        with open(self.path, "rb") as f:
+            fd = f.fileno()
+            while lo < hi:
+                mid = (lo + hi) // 2
+                data = _pread(f, fd, INDEX_RECORD.size, mid * INDEX_RECORD.size)
+                if len(data) < INDEX_RECORD.size:
+                    hi = mid
+                    continue
+                if INDEX_RECORD.unpack(data)[0] <= message_id:
+                    lo = mid + 1
+                else:
+                    hi = mid
+        return lo
+
+
+def _pread(f, fd: int, size: int, offset: int) -> bytes:
+    if hasattr(os, "pread"):
+        return os.pread(fd, size, offset)
+    f.seek(offset)
+    return f.read(size)
+
+
+class MappedFile:
+    """只读内存映射，供多个读取请求共享；文件增长超出映射范围时重新映射
+
+    重新映射时不主动关闭旧映射：仍在解析的请求持有其 memoryview，
+    旧映射在最后一个视图释放后由引用计数回收。
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._map = None
+        self.size = 0
+        self.remaps = 0
+
+    def view(self, required_size: int) -> Optional[memoryview]:
+        """返回至少覆盖 required_size 字节的只读视图；文件为空或无法映射时返回 None"""
+        with self._lock:
+            if self._map is None or self.size < required_size:
+                self._remap()
+            if self._map is None or self.size < required_size:
+                return None
+            return memoryview(self._map)
+
+    def _remap(self) -> None:
+        self._map = None
+        self.size = 0
+        try:
+            with open(self.path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if not size:
+                    return
+                # 映射建立后即可关闭文件句柄，映射本身保持有效
+                self._map = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return
+        self.size = size
+        self.remaps += 1
+
+    def reset(self) -> None:
+        """文件将被截断或删除前调用，丢弃当前映射"""
+        with self._lock:
+            self._map = None
+            self.size = 0
@@ -1,191 +1,777 @@
+import asyncio
+import bisect
 import datetime
+import itertools
 import json
 import logging
+import os
+import queue
 import struct
+import threading
+import time
+from collections import deque
 from pathlib import Path
 
+from guguwebui.utils.chat_archive import (
+    FORMAT_V3,
+    ChatArchive,
+    encode_offset,
+    local_offset,
+    resolve_compression,
+    segment_of,
+)
+from guguwebui.utils.chat_index import ChatOffsetIndex, IndexRecord, MappedFile
+from guguwebui.utils.chat_search import ChatSearchIndex
+from guguwebui.utils.event_stream import SubscriptionHub
+
 logger = logging.getLogger(__name__)
 
+# 计数器检查点：每累计多少条消息或间隔多少秒写一次 chat_index.json
+CHECKPOINT_EVERY = 100
+CHECKPOINT_INTERVAL = 30.0
+# 扫描数据文件时每次读取的块大小；块内剩余不足 _SCAN_GUARD 时先补读再解析，
+# 避免 v1/v2 记录末尾的可选字段被误判为缺失
+_SCAN_CHUNK = 4 * 1024 * 1024
+_SCAN_GUARD = 1024 * 1024
+# 搜索加载索引时从数据文件补齐消息的每批条数
+_SEARCH_BACKFILL_BATCH = 1000
+_MESSAGE_TYPES = {'game': 0, 'webui': 1, 'plugin': 2}
+# 内存中缓存的最近消息条数（默认值，可通过 chat_cache_size 配置）
+CHAT_CACHE_SIZE = 1000
+# 解析失败的玩家名在此时间（秒）内不再重复入队
+UUID_RETRY_SECONDS = 300
+# 待解析玩家名队列上限，满时直接放弃（消息仍会写入，只是暂不补全UUID）
+UUID_QUEUE_SIZE = 1024
+# 活动分段默认大小上限
+CHAT_SEGMENT_BYTES = 16 * 1024 * 1024
+# 后台整理（迁移、压缩、保留策略）的执行间隔（秒）；封存新分段时会立即执行一次
+MAINTENANCE_INTERVAL = 3600
+
+
+class PlayerUuidResolver:
+    """后台线程解析玩家UUID
+
+    写入路径只查询共享的 玩家名→UUID 表或把玩家名入队，不等待 usercache.json 与 Mojang API；
+    解析成功后保存到 chat_uuids.json，并回调补全已缓存消息中缺失的UUID。
+    """
+
+    def __init__(self, path, on_resolved=None):
+        self.path = Path(path)
+        self._on_resolved = on_resolved
+        self._lock = threading.Lock()
+        self._uuids = self._load()
+        self._pending = set()
+        self._failed = {}
+        self._queue = queue.Queue(maxsize=UUID_QUEUE_SIZE)
+        self._thread = None
+        self._stopping = False
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                return data
+        except (OSError, ValueError):
+            pass
+        return {}
+
+    def _save(self):
+        with self._lock:
+            data = dict(self._uuids)
+        tmp = self.path.with_suffix(".json.tmp")
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"保存玩家UUID缓存失败: {e}")
+
+    def get(self, player_id):
+        return self._uuids.get(player_id)
+
+    def fill(self, message):
+        """用已解析的UUID补全消息（插件消息没有UUID）"""
+        if message.get('uuid') is None and not message.get('is_plugin', False):
+            message['uuid'] = self._uuids.get(message['player_id'])
+        return message
+
+    def request(self, player_id, server):
+        """把玩家名加入解析队列，已知、排队中或近期解析失败的玩家名直接忽略"""
+        with self._lock:
+            if self._stopping or player_id in self._uuids or player_id in self._pending:
+                return
+            failed_at = self._failed.get(player_id)
+            if failed_at is not None and time.monotonic() - failed_at < UUID_RETRY_SECONDS:
+                return
+            try:
+                self._queue.put_nowait((player_id, server))
+            except queue.Full:
+                return
+            self._pending.add(player_id)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="GUGUWebUI-UuidResolver", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        # 解析线程持有自己的事件循环，逐个执行 get_player_uuid
+        loop = asyncio.new_event_loop()
+        try:
+            while not self._stopping:
+                item = self._queue.get()
+                if item is None:
+                    break
+                player_id, server = item
+                try:
+                    player_uuid = loop.run_until_complete(self._resolve(player_id, server))
+                except Exception as e:
+                    logger.debug(f"解析玩家 {player_id} 的UUID失败: {e}")
+                    player_uuid = None
+                with self._lock:
+                    self._pending.discard(player_id)
+                    if player_uuid:
+                        self._uuids[player_id] = player_uuid
+                        self._failed.pop(player_id, None)
+                    else:
+                        self._failed[player_id] = time.monotonic()
+                if player_uuid:
+                    self._save()
+                    if self._on_resolved is not None:
+                        self._on_resolved(player_id, player_uuid)
+        finally:
+            try:
+                from guguwebui.utils.mc_util import close_mojang_session
+                loop.run_until_complete(close_mojang_session())
+            except Exception:
+                pass
+            loop.close()
+
+    @staticmethod
+    async def _resolve(player_id, server):
+        from guguwebui.utils.mc_util import get_player_uuid
+        return await get_player_uuid(player_id, server)
+
+    def stop(self, timeout=2.0):
+        with self._lock:
+            self._stopping = True
+            thread = self._thread
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        if thread is not None and thread.is_alive():
+            thread.join(timeout=timeout)
+
 
 class ChatLogger:
-    """聊天消息记录器，将消息保存到二进制文件中"""
+    """聊天消息记录器，将消息保存到二进制文件中
+
+    chat_messages.bin 为正在写入的活动分段，只追加写入，写满或跨月后移入 chat_segments/ 封存（见 chat_archive）；
+    chat_messages.idx 为覆盖全部分段、每条消息一项的定长偏移索引。
+    消息总数、下一个ID等计数器保存在内存中，定期写入 chat_index.json 作为检查点；
+    启动时以索引末项为起点扫描数据文件尾部，补齐崩溃前未写入索引的消息。
+
+    写入与索引、缓存的更新在同一把锁内完成，读取只在锁内取快照、锁外解析文件。
+    插件内应通过 get_chat_logger() 获取共享实例，而不是各自创建。
+    """
 
-    def __init__(self, data_dir=None):
+    def __init__(self, data_dir=None, cache_size=CHAT_CACHE_SIZE):
         if data_dir is None:
             data_dir = Path("guguwebui_static")
         self.data_dir = Path(data_dir)
         self.chat_messages_file = self.data_dir / "chat_messages.bin"
         self.chat_index_file = self.data_dir / "chat_index.json"
-        self.message_positions_file = self.data_dir / "message_positions.json"  # 新增：消息位置索引
+        self.message_offsets_file = self.data_dir / "chat_messages.idx"
+        self.chat_uuids_file = self.data_dir / "chat_uuids.json"
+        self.chat_terms_file = self.data_dir / "chat_messages.terms"
+        # 旧版本每条消息整体重写的位置索引，已由 chat_messages.idx 取代
+        self.message_positions_file = self.data_dir / "message_positions.json"
 
         # 确保数据目录存在
         self.data_dir.mkdir(parents=True, exist_ok=True)
 
-        # 初始化索引
-        self._init_index()
-
-        # 消息计数器
-        self._message_counter = self._get_next_message_id()
-
-        # 内存缓存：最近的消息（最多缓存1000条）
-        self._message_cache = []
-        self._cache_max_size = 1000
+        self._lock = threading.RLock()
+        self._offsets = ChatOffsetIndex(self.message_offsets_file)
+        # 读取请求共享的数据文件只读映射
+        self._mapped = MappedFile(self.chat_messages_file)
+        # 玩家名→UUID 表与后台解析队列
+        self._uuids = PlayerUuidResolver(self.chat_uuids_file, self._backfill_uuid)
+        # 搜索用倒排索引，第一次搜索时加载
+        self._search = ChatSearchIndex(self.chat_terms_file)
+        # 新消息推送订阅（聊天页 SSE），每条消息写入后发布一次 ("message", 消息)
+        self.subscribers = SubscriptionHub(max_queue=500)
+        # 封存分段与分段清单
+        self._archive = ChatArchive(self.data_dir, self.chat_messages_file)
+
+        # 分段与保留策略，由 configure_archive 按配置设置
+        self._segment_max_bytes = CHAT_SEGMENT_BYTES
+        self._compression = "none"
+        self._retention_seconds = 0
+        self._max_total_bytes = 0
+        self._active_first_ts_ms = None
+        # 每次清空聊天记录加一，后台整理据此放弃已过时的结果
+        self._generation = 0
+        self._maintenance_thread = None
+        self._maintenance_wake = threading.Event()
+        self._stopping = False
+
+        # 内存计数器
+        self._message_counter = 1
+        self._message_count = 0
+        self._file_size = 0
+        self._unsaved = 0
+        self._last_checkpoint = time.monotonic()
+
+        # 内存缓存：最近的消息，按ID升序；_cache_ids 与 _message_cache 一一对应，用于二分查找
+        self._cache_max_size = max(int(cache_size), 1)
+        self._message_cache = deque(maxlen=self._cache_max_size)
+        self._cache_ids = deque(maxlen=self._cache_max_size)
         self._cache_loaded = False
 
-        # 消息位置索引缓存
-        self._positions_cache = {}
-        self._positions_loaded = False
-
-    def _init_index(self):
-        """初始化索引文件"""
-        if not self.chat_index_file.exists():
-            index = {
-                "message_count": 0,
-                "next_message_id": 1,
-                "file_size": 0
-            }
-            self._write_index(index)
+        with self._lock:
+            self._recover(self._read_index())
+            self._prune_index()
+            self._active_first_ts_ms = self._active_first_ts()
+            last = self._offsets.last()
+            self._search.attach(last.id if last is not None else 0)
+            self._checkpoint()
+        if self.message_positions_file.exists():
+            try:
+                self.message_positions_file.unlink()
+            except OSError:
+                pass
 
     def _read_index(self):
-        """读取索引文件"""
+        """读取计数器检查点，文件缺失或损坏时返回空检查点"""
         try:
             with open(self.chat_index_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            # 如果索引文件损坏，重新初始化
-            self._init_index()
-            return self._read_index()
+                index = json.load(f)
+            if isinstance(index, dict):
+                return index
+        except (OSError, ValueError):
+            pass
+        return {"message_count": 0, "next_message_id": 1, "file_size": 0}
 
     def _write_index(self, index):
-        """写入索引文件"""
-        with open(self.chat_index_file, 'w', encoding='utf-8') as f:
+        """写入计数器检查点（先写临时文件再替换，避免写到一半时崩溃留下损坏的检查点）"""
+        tmp = self.chat_index_file.with_suffix(".json.tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
             json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.chat_index_file)
+
+    def _checkpoint(self):
+        self._search.flush()
+        self._write_index({
+            "message_count": self._message_count,
+            "next_message_id": self._message_counter,
+            "file_size": self._file_size,
+        })
+        self._unsaved = 0
+        self._last_checkpoint = time.monotonic()
 
-    def _load_positions_index(self):
-        """加载消息位置索引"""
-        if self._positions_loaded:
-            return self._positions_cache
+    def _maybe_checkpoint(self):
+        self._unsaved += 1
+        if (self._unsaved >= CHECKPOINT_EVERY
+                or time.monotonic() - self._last_checkpoint >= CHECKPOINT_INTERVAL):
+            try:
+                self._checkpoint()
+            except OSError as e:
+                logger.warning(f"写入聊天计数器检查点失败: {e}")
+
+    def flush(self):
+        """立即写入计数器检查点（卸载插件时调用）"""
+        with self._lock:
+            if self._unsaved:
+                self._checkpoint()
+
+    def close(self):
+        """写入检查点并停止UUID解析与后台整理线程"""
+        self._stopping = True
+        self._maintenance_wake.set()
+        thread = self._maintenance_thread
+        if thread is not None and thread.is_alive():
+            thread.join(timeout=5)
+        self.flush()
+        self._uuids.stop()
+
+    def _backfill_uuid(self, player_id, player_uuid):
+        """后台解析出UUID后补全缓存中该玩家的消息；文件中的记录在读取时按同一张表补全"""
+        with self._lock:
+            for message in self._message_cache:
+                if message['player_id'] == player_id and message['uuid'] is None and not message['is_plugin']:
+                    message['uuid'] = player_uuid
+
+    # ---- 分段归档 ----
+
+    def configure_archive(self, segment_max_bytes=CHAT_SEGMENT_BYTES, compression="none", retention_seconds=0,
+                          max_total_bytes=0):
+        """设置分段与保留策略并启动后台整理线程
 
-        try:
-            if self.message_positions_file.exists():
-                with open(self.message_positions_file, 'r', encoding='utf-8') as f:
-                    self._positions_cache = json.load(f)
+        Args:
+            segment_max_bytes: 活动分段大小上限，超出后封存（跨月时同样封存）
+            compression: 封存分段的压缩算法：none / lzma / zstd
+            retention_seconds: 保留时长，0 表示不按时间清理
+            max_total_bytes: 聊天记录总大小上限，0 表示不按大小清理
+        """
+        with self._lock:
+            self._segment_max_bytes = max(int(segment_max_bytes), 64 * 1024)
+            self._compression = resolve_compression(compression)
+            self._retention_seconds = max(int(retention_seconds), 0)
+            self._max_total_bytes = max(int(max_total_bytes), 0)
+            if self._maintenance_thread is None and not self._stopping:
+                self._maintenance_thread = threading.Thread(
+                    target=self._maintenance_loop, name="GUGUWebUI-ChatArchive", daemon=True)
+                self._maintenance_thread.start()
             else:
-                self._positions_cache = {}
-        except (FileNotFoundError, json.JSONDecodeError):
-            self._positions_cache = {}
+                self._maintenance_wake.set()
 
-        self._positions_loaded = True
-        return self._positions_cache
+    def _active_start(self):
+        """活动分段第一条消息在偏移索引中的下标"""
+        segments = self._archive.segments
+        return self._offsets.bisect_id(segments[-1]["last_id"]) if segments else 0
 
-    def _save_positions_index(self):
-        """保存消息位置索引"""
+    def _active_first_ts(self):
+        record = self._offsets.record(self._active_start())
+        if record is not None and segment_of(record.offset) == self._archive.active:
+            return record.timestamp_ms
+        return None
+
+    @staticmethod
+    def _month_of(timestamp_ms):
+        return time.localtime(timestamp_ms / 1000)[:2]
+
+    def _should_rotate(self, timestamp_ms):
+        """活动分段达到大小上限，或新消息与分段首条消息不在同一月份时封存（调用方持有锁）"""
+        if not self._file_size:
+            return False
+        if self._file_size >= self._segment_max_bytes:
+            return True
+        first = self._active_first_ts_ms
+        return first is not None and self._month_of(first) != self._month_of(timestamp_ms)
+
+    def _rotate(self):
+        """封存活动分段（调用方持有锁）"""
+        start = self._active_start()
+        first = self._offsets.record(start)
+        last = self._offsets.last()
+        if first is None or segment_of(first.offset) != self._archive.active:
+            return
+        self._mapped.reset()
         try:
-            with open(self.message_positions_file, 'w', encoding='utf-8') as f:
-                json.dump(self._positions_cache, f, ensure_ascii=False)
-        except Exception as e:
-            logger.warning(f"保存位置索引失败: {e}")
+            entry = self._archive.seal_active(first.id, last.id, first.timestamp_ms, last.timestamp_ms,
+                                              self._offsets.count - start, self._file_size)
+        except OSError as e:
+            # 分段状态未改变，继续写入当前活动分段，下次写入时重试封存
+            logger.warning(f"封存聊天记录分段失败，稍后重试: {e}")
+            return
+        self._file_size = 0
+        self._active_first_ts_ms = None
+        self._checkpoint()
+        logger.debug(f"聊天记录分段 {entry['file']} 已封存，共 {entry['count']} 条")
+        self._maintenance_wake.set()
+
+    def _prune_index(self):
+        """丢弃指向已删除分段的索引前缀（保留策略删除分段后、改写索引前崩溃时出现；调用方持有锁）"""
+        offsets = self._offsets
+        lo, hi = 0, offsets.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            record = offsets.record(mid)
+            if record is not None and self._archive.knows(segment_of(record.offset)):
+                hi = mid
+            else:
+                lo = mid + 1
+        if lo:
+            logger.warning(f"聊天消息索引中有 {lo} 项指向已删除的分段，已丢弃")
+            offsets.drop_prefix(lo)
+            self._message_count = offsets.count
+
+    def _maintenance_loop(self):
+        while not self._stopping:
+            try:
+                self.run_maintenance()
+            except Exception as e:
+                logger.warning(f"整理聊天记录归档失败: {e}")
+            self._maintenance_wake.wait(MAINTENANCE_INTERVAL)
+            self._maintenance_wake.clear()
+
+    def run_maintenance(self):
+        """整理归档：完成中断的整理，封存含旧格式记录的活动分段，迁移/压缩封存分段并执行保留策略"""
+        for retired in list(self._archive.retired):
+            self._finish_replacement(retired)
+        self._seal_legacy_active()
+        for entry in list(self._archive.segments):
+            if self._stopping:
+                return
+            if self._needs_compaction(entry):
+                self._compact_segment(entry)
+        self._apply_retention()
+
+    def _needs_compaction(self, entry):
+        return (entry["format"] != FORMAT_V3
+                or entry["compression"] != self._compression
+                or entry["raw_size"] > 2 * self._segment_max_bytes)
+
+    def _seal_legacy_active(self):
+        """升级前写入的活动分段可能含 v1/v2 记录：检查后要么标记为纯 v3，要么立即封存交给整理迁移"""
+        if self._archive.active_format == FORMAT_V3:
+            return
+        with self._lock:
+            active = self._archive.active
+            start = self._active_start()
+            stop = self._offsets.count
+        legacy = False
+        position = start
+        while position < stop and not legacy:
+            with self._lock:
+                if self._archive.active != active:
+                    return
+                records = self._offsets.read_range(position, min(position + _SEARCH_BACKFILL_BATCH, stop))
+                data = self._mapped.view(self._file_size)
+            if not records or data is None:
+                break
+            legacy = any(data[local_offset(record.offset)] != 3 for record in records)
+            position += len(records)
+        # 封存前释放映射视图，否则 Windows 下无法移动仍被映射的文件
+        data = None
+        with self._lock:
+            if self._archive.active != active or self._archive.active_format == FORMAT_V3:
+                return
+            if legacy:
+                self._rotate()
+            else:
+                self._archive.active_format = FORMAT_V3
+                self._archive.save()
+
+    def _compact_segment(self, entry):
+        """把封存分段重写为纯 v3 记录并按配置压缩，过大的分段同时拆分；完成后改写对应的索引项"""
+        with self._lock:
+            generation = self._generation
+            compression = self._compression
+            max_bytes = self._segment_max_bytes
+            start = self._offsets.bisect_id(entry["first_id"] - 1)
+            records = self._offsets.read_range(start, self._offsets.bisect_id(entry["last_id"]))
+        if not records or any(segment_of(record.offset) != entry["no"] for record in records):
+            logger.warning(f"聊天记录分段 {entry['file']} 与索引不一致，跳过整理")
+            return
+        data, record_format = self._archive.read(entry["no"])
+        if data is None:
+            return
 
-    def _add_position_to_index(self, message_id, file_position):
-        """添加消息位置到索引"""
-        self._load_positions_index()
-        self._positions_cache[str(message_id)] = file_position
+        chunks = []  # [(数据, [(索引项, 分段内偏移)])]
+        buffer, placed = bytearray(), []
+        for record in records:
+            local = local_offset(record.offset)
+            if data[local] == 3:
+                length = 5 + struct.unpack_from('I', data, local + 1)[0]
+                packed = bytes(data[local:local + length])
+            else:
+                message, _ = self._unpack_message(data, local)
+                if message is None:
+                    logger.warning(f"聊天记录分段 {entry['file']} 中的消息 {record.id} 无法解析，跳过整理")
+                    return
+                packed = self._pack_message(
+                    message['id'], message['player_id'], message['message'], message['timestamp'],
+                    message['rtext_data'], _MESSAGE_TYPES.get(message['message_source'], 0), message['uuid'])
+            if buffer and len(buffer) + len(packed) > max_bytes:
+                chunks.append((bytes(buffer), placed))
+                buffer, placed = bytearray(), []
+            placed.append((record, len(buffer)))
+            buffer += packed
+        chunks.append((bytes(buffer), placed))
+        del data
+
+        new_entries, new_records = [], []
+        for chunk, placed in chunks:
+            with self._lock:
+                segment_no = self._archive.allocate()
+            name, size = self._archive.write_segment(segment_no, chunk, compression)
+            first, last = placed[0][0], placed[-1][0]
+            new_entries.append({
+                "no": segment_no, "file": name,
+                "first_id": first.id, "last_id": last.id,
+                "first_ts_ms": first.timestamp_ms, "last_ts_ms": last.timestamp_ms,
+                "count": len(placed), "size": size, "raw_size": len(chunk),
+                "format": FORMAT_V3, "compression": compression,
+            })
+            new_records.extend(IndexRecord(record.id, encode_offset(segment_no, local), record.timestamp_ms)
+                               for record, local in placed)
+
+        with self._lock:
+            if generation != self._generation or entry not in self._archive.segments:
+                for new_entry in new_entries:
+                    self._archive.delete_file(new_entry)
+                return
+            # 清单先登记新分段（旧分段转入 retired），再改写索引，最后删除旧分段；任一步崩溃后都可继续
+            self._archive.replace(entry, new_entries)
+            self._offsets.rewrite(start, new_records)
+            self._archive.finish_replace(entry["no"])
+        logger.debug(f"聊天记录分段 {entry['file']} 已整理为 {len(new_entries)} 个分段")
+
+    def _finish_replacement(self, retired):
+        """继续上次中断的整理：按新分段的实际内容改写索引，然后删除旧分段"""
+        new_records = []
+        for segment_no in retired.get("replaced_by", []):
+            data, _ = self._archive.read(segment_no)
+            if data is None:
+                logger.warning(f"聊天记录分段 {segment_no} 缺失，无法完成整理")
+                return
+            offset = 0
+            while offset < len(data):
+                message, end = self._unpack_v3(data, offset)
+                if message is None:
+                    break
+                new_records.append(IndexRecord(message['id'], encode_offset(segment_no, offset),
+                                               int(message['timestamp'].timestamp() * 1000)))
+                offset = end
+        with self._lock:
+            if new_records:
+                start = self._offsets.bisect_id(new_records[0].id - 1)
+                self._offsets.rewrite(start, new_records)
+            self._archive.finish_replace(retired["no"])
+
+    def _apply_retention(self):
+        """按保留时长与总大小删除最早的封存分段（活动分段始终保留）"""
+        with self._lock:
+            retention_ms = self._retention_seconds * 1000
+            max_bytes = self._max_total_bytes
+            if not retention_ms and not max_bytes:
+                return
+            cutoff = time.time() * 1000 - retention_ms
+            total = self._archive.total_size() + self._file_size
+            expired = []
+            for entry in self._archive.segments:
+                too_old = retention_ms and entry["last_ts_ms"] < cutoff
+                too_big = max_bytes and total > max_bytes
+                if not (too_old or too_big):
+                    break
+                expired.append(entry)
+                total -= entry["size"]
+            if not expired:
+                return
+            last_id = expired[-1]["last_id"]
+            removed = self._offsets.bisect_id(last_id)
+            # 先更新清单再删除索引前缀：两步之间崩溃时，启动时会丢弃指向已删除分段的索引项
+            self._archive.drop(expired)
+            self._offsets.drop_prefix(removed)
+            self._message_count = self._offsets.count
+            while self._cache_ids and self._cache_ids[0] <= last_id:
+                self._cache_ids.popleft()
+                self._message_cache.popleft()
+            # 搜索索引中残留被删除的消息，清空后在下次搜索时按剩余数据重建
+            self._search.reset()
+            self._checkpoint()
+        logger.info(f"已按保留策略清理 {len(expired)} 个聊天记录分段，共 {removed} 条消息")
+
+    def _recover(self, checkpoint):
+        """根据偏移索引与数据文件恢复内存计数器
+
+        - 检查点与文件大小、索引条数一致时直接采用
+        - 否则校验索引末项，并从其后扫描数据文件，把未建索引的消息补入索引
+        - 索引指向数据文件之外（数据未落盘）或与数据不符时丢弃对应索引项
+        - 数据文件末尾无法解析的半条记录（写入中途崩溃）会被截掉
+        """
+        data_size = self.chat_messages_file.stat().st_size if self.chat_messages_file.exists() else 0
+        offsets = self._offsets
+        offsets.reload()
+
+        last = offsets.last()
+        if (last is not None
+                and checkpoint.get("file_size") == data_size
+                and checkpoint.get("message_count") == offsets.count):
+            self._file_size = data_size
+            self._message_count = offsets.count
+            self._message_counter = max(last.id + 1, checkpoint.get("next_message_id", 1))
+            return
 
-        # 限制索引大小，只保留最近的10000条消息位置
-        if len(self._positions_cache) > 10000:
-            # 按消息ID排序，删除最老的消息位置
-            sorted_ids = sorted(self._positions_cache.keys(), key=int)
-            for old_id in sorted_ids[:-10000]:
-                del self._positions_cache[old_id]
+        active = self._archive.active
+        while last is not None and segment_of(last.offset) == active and local_offset(last.offset) >= data_size:
+            offsets.truncate(offsets.count - 1)
+            last = offsets.last()
+
+        # 索引末项位于已封存的分段时，活动分段中的记录全部需要补入索引
+        scan_from = 0
+        if last is not None and segment_of(last.offset) == active:
+            end = self._record_end(last)
+            if end is None:
+                logger.warning("聊天消息索引与数据文件不一致，正在重建索引")
+                offsets.reset()
+                last = None
+            else:
+                scan_from = end
 
-        self._save_positions_index()
+        if scan_from < data_size:
+            records = []
+            scanned_end = scan_from
+            with open(self.chat_messages_file, 'rb') as f:
+                for message, start, scanned_end in self._iter_file_records(f, scan_from, data_size):
+                    if last is None or message['id'] > last.id:
+                        records.append(IndexRecord(message['id'], encode_offset(active, start),
+                                                   int(message['timestamp'].timestamp() * 1000)))
+                        last = records[-1]
+                    # ID 不递增的记录无法二分查找，不建索引
+            offsets.extend(records)
+            if scanned_end < data_size:
+                self._repair_tail(scanned_end, data_size)
+                data_size = self.chat_messages_file.stat().st_size
+
+        self._file_size = data_size
+        self._message_count = offsets.count
+        next_id = last.id + 1 if last is not None else 1
+        self._message_counter = max(next_id, checkpoint.get("next_message_id", 1))
+
+    def _repair_tail(self, end, data_size):
+        tail = data_size - end
+        if tail <= _SCAN_GUARD:
+            logger.warning(f"聊天消息文件末尾有 {tail} 字节无法解析，已截断")
+            self._mapped.reset()
+            with open(self.chat_messages_file, 'r+b') as f:
+                f.truncate(end)
+        else:
+            logger.warning(f"聊天消息文件自偏移 {end} 起有 {tail} 字节无法解析，已跳过")
+
+    def _record_end(self, record):
+        """解析索引项指向的记录，ID 一致时返回记录结束偏移"""
+        data_size = self.chat_messages_file.stat().st_size
+        with open(self.chat_messages_file, 'rb') as f:
+            for message, _, end in self._iter_file_records(f, local_offset(record.offset), data_size):
+                return end if message['id'] == record.id else None
+        return None
+
+    def _iter_file_records(self, f, start, stop):
+        """分块解析文件 [start, stop) 内的连续记录，产出 (消息, 起始偏移, 结束偏移)
+
+        遇到无法解析的数据即停止；内存占用与块大小相关，而与文件大小无关。
+        """
+        f.seek(start)
+        buffer = b""
+        base = start  # buffer[0] 对应的文件偏移
+        pos = 0
+        eof = start >= stop
+        while True:
+            if not eof and len(buffer) - pos < _SCAN_GUARD:
+                chunk = f.read(min(_SCAN_CHUNK, stop - base - len(buffer)))
+                if chunk:
+                    buffer = buffer[pos:] + chunk
+                    base += pos
+                    pos = 0
+                else:
+                    eof = True
+                continue
+            if pos >= len(buffer):
+                return
+            message, new_pos = self._unpack_message(buffer, pos)
+            if message is None:
+                if eof:
+                    return
+                # 单条记录超过 _SCAN_GUARD，读入更多数据后重试
+                chunk = f.read(min(_SCAN_CHUNK, stop - base - len(buffer)))
+                if chunk:
+                    buffer += chunk
+                else:
+                    eof = True
+                continue
+            yield message, base + pos, base + new_pos
+            pos = new_pos
+
+    def configure(self, cache_size):
+        """调整最近消息缓存大小，扩容时下次读取会从文件重新填充"""
+        cache_size = max(int(cache_size), 1)
+        with self._lock:
+            if cache_size == self._cache_max_size:
+                return
+            grew = cache_size > self._cache_max_size
+            self._cache_max_size = cache_size
+            self._message_cache = deque(self._message_cache, maxlen=cache_size)
+            self._cache_ids = deque(self._cache_ids, maxlen=cache_size)
+            if grew:
+                self._cache_loaded = False
 
     def _add_to_cache(self, message):
-        """添加消息到内存缓存"""
+        """添加消息到内存缓存；缓存尚未加载时跳过，加载时会从文件读到这条消息"""
+        if not self._cache_loaded:
+            return
+        # deque 设置了 maxlen，满后追加会自动淘汰最旧的一条
         self._message_cache.append(message)
-        # 保持缓存大小
-        if len(self._message_cache) > self._cache_max_size:
-            self._message_cache = self._message_cache[-self._cache_max_size:]
+        self._cache_ids.append(message['id'])
 
     def _load_cache_from_file(self):
-        """从文件加载最近的消息到缓存"""
+        """从文件加载最近的消息到缓存（调用方持有锁）"""
         if self._cache_loaded:
             return
 
+        self._message_cache.clear()
+        self._cache_ids.clear()
         try:
             # 获取最近的消息填充缓存
-            self._message_cache = self._get_recent_messages_from_file(self._cache_max_size)
-            self._cache_loaded = True
+            for message in reversed(self._get_recent_messages_from_file(self._cache_max_size)):
+                self._message_cache.append(message)
+                self._cache_ids.append(message['id'])
         except Exception as e:
             logger.warning(f"加载缓存失败: {e}")
-            self._message_cache = []
-            self._cache_loaded = True
+            self._message_cache.clear()
+            self._cache_ids.clear()
+        self._cache_loaded = True
 
-    def _get_recent_messages_from_file(self, limit):
-        """从文件末尾获取最近的消息"""
-        if not self.chat_messages_file.exists():
-            return []
+    def _cache_holds_all(self):
+        """缓存是否包含全部历史消息"""
+        return len(self._cache_ids) == self._message_count
 
-        messages = []
+    def _get_recent_messages_from_file(self, limit):
+        """从文件末尾获取最近的消息（ID 降序）"""
         try:
-            # 采用反向读取策略
-            file_size = self.chat_messages_file.stat().st_size
-            chunk_size = min(file_size, 1024 * 1024)  # 最多读取1MB
-
-            with open(self.chat_messages_file, 'rb') as f:
-                if file_size <= chunk_size:
-                    # 小文件直接读取全部
-                    data = f.read()
-                    messages = self._parse_all_messages_from_data(data)
-                else:
-                    # 大文件从末尾开始读取
-                    f.seek(file_size - chunk_size)
-                    data = f.read()
-                    messages = self._parse_all_messages_from_data(data)
-
-            # 按时间排序并取最近的
-            messages.sort(key=lambda x: x['timestamp'], reverse=True)
-            return messages[:limit]
-
+            with self._lock:
+                count = self._offsets.count
+            return self._read_page(count - limit, count)[::-1]
         except Exception as e:
             logger.warning(f"读取最近消息失败: {e}")
             return []
 
-    def _parse_all_messages_from_data(self, data):
-        """从二进制数据解析所有消息"""
-        messages = []
-        offset = 0
+    def _read_page(self, start, stop):
+        """读取偏移索引下标 [start, stop) 的一页消息（ID 升序）
 
-        while offset < len(data):
-            message, new_offset = self._unpack_message(data, offset)
-            if message is None:
+        只访问这一页记录所在的分段：活动分段通过共享的内存映射原地解析，
+        封存分段由 ChatArchive 提供映射视图或解压后的内容，与整个历史的长度无关。
+        已整理为纯 v3 的分段直接按 v3 解析，不再逐条判断格式。
+        """
+        start = max(start, 0)
+        if start >= stop:
+            return []
+        for attempt in range(2):
+            with self._lock:
+                records = self._offsets.read_range(start, stop)
+                active = self._archive.active
+                active_format = self._archive.active_format
+                data_size = self._file_size
+                # 在锁内取活动分段的视图，避免与封存（重命名活动分段）交错
+                active_view = self._mapped.view(data_size) if records else None
+            messages = []
+            missing = False
+            for segment_no, group in itertools.groupby(records, key=lambda r: segment_of(r.offset)):
+                group = list(group)
+                base = 0
+                if segment_no == active:
+                    data, record_format = active_view, active_format
+                    if data is None:
+                        base = local_offset(group[0].offset)
+                        with open(self.chat_messages_file, 'rb') as f:
+                            f.seek(base)
+                            data = f.read(data_size - base)
+                else:
+                    data, record_format = self._archive.read(segment_no)
+                    if data is None:
+                        missing = True
+                        continue
+                unpack = self._unpack_v3 if record_format == FORMAT_V3 else self._unpack_message
+                for record in group:
+                    message, _ = unpack(data, local_offset(record.offset) - base)
+                    if message is not None:
+                        messages.append(self._uuids.fill(self._convert_to_serializable(message)))
+            # 分段恰好在取快照后被整理替换时，重新读取一次索引
+            if not missing:
                 break
-
-            # 转换为可序列化格式
-            serializable_message = {
-                'id': message['id'],
-                'player_id': message['player_id'],
-                'message': message['message'],
-                'timestamp': int(message['timestamp'].timestamp()),
-                'timestamp_ms': int(message['timestamp'].timestamp() * 1000),
-                'timestamp_str': message['timestamp_str'],
-                'is_rtext': message.get('is_rtext', False),
-                'rtext_data': message.get('rtext_data', None),
-                'is_plugin': message.get('is_plugin', False),
-                'plugin_id': message.get('plugin_id', None),
-                'uuid': message.get('uuid', None),
-                'message_source': message.get('message_source', 'game')
-            }
-            messages.append(serializable_message)
-            offset = new_offset
-
         return messages
 
-    def _get_next_message_id(self):
-        """获取下一个消息ID"""
-        index = self._read_index()
-        return index.get("next_message_id", 1)
-
     @staticmethod
     def _pack_message(message_id, player_id, message, timestamp, rtext_data=None, message_type=0, player_uuid=None):
         """打包消息数据为二进制格式
@@ -223,10 +809,68 @@ class ChatLogger:
                 struct.pack('I', len(json_bytes)) +
                 json_bytes)
 
+    @staticmethod
+    def _unpack_v3(data, offset):
+        """解包一条 v3 记录：[版本(1字节)=3][JSON长度(4字节)][JSON]，其余格式返回 (None, offset)"""
+        original_offset = offset
+        try:
+            if offset + 5 > len(data) or data[offset] != 3:
+                return None, original_offset
+            offset += 1
+            if offset + 4 > len(data):
+                return None, original_offset
+            json_len = struct.unpack_from('I', data, offset)[0]
+            offset += 4
+            if offset + json_len > len(data):
+                return None, original_offset
+            try:
+                payload = json.loads(str(data[offset:offset + json_len], 'utf-8'))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                return None, original_offset
+            offset += json_len
+            # 规范化为与 v1/v2 相同的 result 结构
+            timestamp_ms = payload.get("timestamp_ms", 0)
+            timestamp = datetime.datetime.fromtimestamp(timestamp_ms / 1000, tz=datetime.timezone.utc)
+            message_type = payload.get("message_type", 0)
+            player_uuid = payload.get("uuid")
+            rtext_data = payload.get("rtext_data")
+            result = {
+                'id': payload['id'],
+                'player_id': payload['player_id'],
+                'message': payload['message'],
+                'timestamp': timestamp,
+                'timestamp_str': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            }
+            if message_type == 2:
+                result['is_plugin'] = True
+                result['plugin_id'] = payload['player_id']
+                result['uuid'] = None
+                result['message_source'] = 'plugin'
+            elif message_type == 1:
+                result['is_plugin'] = False
+                result['plugin_id'] = None
+                result['uuid'] = player_uuid
+                result['message_source'] = 'webui'
+            else:
+                result['is_plugin'] = False
+                result['plugin_id'] = None
+                result['uuid'] = player_uuid
+                result['message_source'] = 'game'
+            result['is_rtext'] = rtext_data is not None
+            result['rtext_data'] = rtext_data
+            return result, offset
+
+        except (struct.error, UnicodeDecodeError, ValueError, KeyError) as e:
+            logger.warning(f"解析消息失败: {e}")
+            return None, original_offset
+
     @staticmethod
     def _unpack_message(data, offset):
         """从二进制数据中解包消息（支持 v1/v2/v3 格式）
 
+        data 可以是 bytes 或映射文件的 memoryview：定长字段通过 struct.unpack_from 原地读取，
+        字符串直接由缓冲区切片解码，不复制整段数据。
+
         返回: (消息字典, 新的偏移量)
         """
         try:
@@ -238,49 +882,7 @@ class ChatLogger:
 
             # v3 格式：版本号=3，随后 [JSON长度(4字节)][JSON]
             if first_byte == 3:
-                offset += 1
-                if offset + 4 > len(data):
-                    return None, original_offset
-                json_len = struct.unpack('I', data[offset:offset + 4])[0]
-                offset += 4
-                if offset + json_len > len(data):
-                    return None, original_offset
-                try:
-                    payload = json.loads(data[offset:offset + json_len].decode('utf-8'))
-                except (UnicodeDecodeError, json.JSONDecodeError):
-                    return None, original_offset
-                offset += json_len
-                # 规范化为与 v1/v2 相同的 result 结构
-                timestamp_ms = payload.get("timestamp_ms", 0)
-                timestamp = datetime.datetime.fromtimestamp(timestamp_ms / 1000, tz=datetime.timezone.utc)
-                message_type = payload.get("message_type", 0)
-                player_uuid = payload.get("uuid")
-                rtext_data = payload.get("rtext_data")
-                result = {
-                    'id': payload['id'],
-                    'player_id': payload['player_id'],
-                    'message': payload['message'],
-                    'timestamp': timestamp,
-                    'timestamp_str': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                }
-                if message_type == 2:
-                    result['is_plugin'] = True
-                    result['plugin_id'] = payload['player_id']
-                    result['uuid'] = None
-                    result['message_source'] = 'plugin'
-                elif message_type == 1:
-                    result['is_plugin'] = False
-                    result['plugin_id'] = None
-                    result['uuid'] = player_uuid
-                    result['message_source'] = 'webui'
-                else:
-                    result['is_plugin'] = False
-                    result['plugin_id'] = None
-                    result['uuid'] = player_uuid
-                    result['message_source'] = 'game'
-                result['is_rtext'] = rtext_data is not None
-                result['rtext_data'] = rtext_data
-                return result, offset
+                return ChatLogger._unpack_v3(data, offset)
 
             # 尝试检测是否为 v1/v2 格式
             # v2 第一个字节是版本号 1 或 2，v1 无版本号
@@ -288,7 +890,7 @@ class ChatLogger:
             player_uuid = None
             if first_byte in [1, 2]:
                 if offset + 9 <= len(data):
-                    potential_msg_id = struct.unpack('Q', data[offset + 1:offset + 9])[0]
+                    potential_msg_id = struct.unpack_from('Q', data, offset + 1)[0]
                     if 0 < potential_msg_id < 10 ** 10:
                         is_new_format = True
                         offset += 1
@@ -297,14 +899,14 @@ class ChatLogger:
             if offset + 8 > len(data):
                 return None, original_offset
 
-            message_id = struct.unpack('Q', data[offset:offset + 8])[0]
+            message_id = struct.unpack_from('Q', data, offset)[0]
             offset += 8
 
             # 读取时间戳 (8字节)
             if offset + 8 > len(data):
                 return None, original_offset
 
-            timestamp_ms = struct.unpack('Q', data[offset:offset + 8])[0]
+            timestamp_ms = struct.unpack_from('Q', data, offset)[0]
             offset += 8
 
             # 读取消息类型 (1字节)
@@ -312,35 +914,35 @@ class ChatLogger:
                 # 旧格式消息，默认为玩家消息
                 message_type = 0
             else:
-                message_type = struct.unpack('B', data[offset:offset + 1])[0]
+                message_type = struct.unpack_from('B', data, offset)[0]
                 offset += 1
 
             # 读取玩家ID长度 (4字节)
             if offset + 4 > len(data):
                 return None, original_offset
 
-            player_id_len = struct.unpack('I', data[offset:offset + 4])[0]
+            player_id_len = struct.unpack_from('I', data, offset)[0]
             offset += 4
 
             # 读取玩家ID
             if offset + player_id_len > len(data):
                 return None, original_offset
 
-            player_id = data[offset:offset + player_id_len].decode('utf-8')
+            player_id = str(data[offset:offset + player_id_len], 'utf-8')
             offset += player_id_len
 
             # 读取消息长度 (4字节)
             if offset + 4 > len(data):
                 return None, original_offset
 
-            message_len = struct.unpack('I', data[offset:offset + 4])[0]
+            message_len = struct.unpack_from('I', data, offset)[0]
             offset += 4
 
             # 读取消息内容
             if offset + message_len > len(data):
                 return None, original_offset
 
-            message = data[offset:offset + message_len].decode('utf-8')
+            message = str(data[offset:offset + message_len], 'utf-8')
             offset += message_len
 
             # 读取RText数据长度 (4字节)
@@ -348,7 +950,7 @@ class ChatLogger:
                 # 旧格式消息，没有RText数据
                 rtext_data = None
             else:
-                rtext_len = struct.unpack('I', data[offset:offset + 4])[0]
+                rtext_len = struct.unpack_from('I', data, offset)[0]
                 offset += 4
 
                 # 读取RText数据
@@ -357,7 +959,7 @@ class ChatLogger:
                 else:
                     if rtext_len > 0:
                         try:
-                            rtext_json = data[offset:offset + rtext_len].decode('utf-8')
+                            rtext_json = str(data[offset:offset + rtext_len], 'utf-8')
                             rtext_data = json.loads(rtext_json)
                         except (UnicodeDecodeError, json.JSONDecodeError):
                             rtext_data = None
@@ -367,14 +969,14 @@ class ChatLogger:
 
             # 读取UUID数据（仅新格式有）
             if is_new_format and offset + 4 <= len(data):
-                uuid_len = struct.unpack('I', data[offset:offset + 4])[0]
+                uuid_len = struct.unpack_from('I', data, offset)[0]
                 offset += 4
 
                 # 读取UUID
                 if offset + uuid_len <= len(data):
                     if uuid_len > 0:
                         try:
-                            player_uuid = data[offset:offset + uuid_len].decode('utf-8')
+                            player_uuid = str(data[offset:offset + uuid_len], 'utf-8')
                         except UnicodeDecodeError:
                             player_uuid = None
                     offset += uuid_len
@@ -431,8 +1033,8 @@ class ChatLogger:
             timestamp: 时间戳
             rtext_data: RText数据
             message_type: 消息类型 (0=玩家消息, 1=WebUI消息, 2=插件消息)
-            player_uuid: 玩家UUID（如果提供则直接使用，否则自动获取）
-            server: MCDR服务器接口（用于获取UUID）
+            player_uuid: 玩家UUID（如果提供则直接使用，否则在后台解析后补全）
+            server: MCDR服务器接口（用于在后台解析UUID）
         """
         if not isinstance(player_id, str) or not isinstance(message, str):
             raise ValueError("player_id 和 message 必须是字符串")
@@ -443,71 +1045,61 @@ class ChatLogger:
         if timestamp is None:
             timestamp = datetime.datetime.now(datetime.timezone.utc)
 
-        # 获取UUID（仅对玩家消息和WebUI消息）
-        if player_uuid is None and message_type in [0, 1] and server is not None:
-            try:
-                from .mc_util import get_player_uuid
-                import asyncio
+        # UUID（仅对玩家消息和WebUI消息）：只查已解析的表，未知时写入后交给后台线程解析，不阻塞写入
+        resolve_later = False
+        if player_uuid is None and message_type in [0, 1]:
+            player_uuid = self._uuids.get(player_id)
+            resolve_later = player_uuid is None and server is not None
 
-                # Run async function in sync context
-                try:
-                    loop = asyncio.get_event_loop()
-                except RuntimeError:
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-
-                if loop.is_running():
-                    # This is tricky in a running event loop, but ChatLogger.add_message
-                    # is usually called from MCDR thread which is sync.
-                    import concurrent.futures
-                    with concurrent.futures.ThreadPoolExecutor() as pool:
-                        player_uuid = pool.submit(lambda: asyncio.run(get_player_uuid(player_id, server))).result(
-                            timeout=2.0)
-                else:
-                    player_uuid = loop.run_until_complete(get_player_uuid(player_id, server))
-            except Exception:
-                player_uuid = None  # 获取失败时设为None
-
-        # 获取下一个消息ID
-        message_id = self._get_next_message_id()
-
-        # 打包消息（包含UUID）
-        packed_message = self._pack_message(message_id, player_id, message, timestamp, rtext_data, message_type,
-                                            player_uuid)
-
-        # 记录当前文件位置（追加前）
-        current_position = self.chat_messages_file.stat().st_size if self.chat_messages_file.exists() else 0
-
-        # 追加到文件
-        with open(self.chat_messages_file, 'ab') as f:
-            f.write(packed_message)
-
-        # 添加位置索引
-        self._add_position_to_index(message_id, current_position)
-
-        # 更新索引
-        index = self._read_index()
-        index["message_count"] += 1
-        index["next_message_id"] = message_id + 1
-        index["file_size"] = self.chat_messages_file.stat().st_size
-        self._write_index(index)
-
-        # 添加到内存缓存
-        self._add_to_cache({
-            'id': message_id,
-            'player_id': player_id,
-            'message': message,
-            'timestamp': int(timestamp.timestamp()),
-            'timestamp_ms': int(timestamp.timestamp() * 1000),
-            'timestamp_str': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-            'is_rtext': rtext_data is not None,
-            'rtext_data': rtext_data,
-            'is_plugin': message_type == 2,
-            'plugin_id': player_id if message_type == 2 else None,
-            'uuid': player_uuid,  # 使用获取到的UUID
-            'message_source': 'plugin' if message_type == 2 else ('webui' if message_type == 1 else 'game')
-        })
+        timestamp_ms = int(timestamp.timestamp() * 1000)
+        with self._lock:
+            if self._should_rotate(timestamp_ms):
+                self._rotate()
+            with open(self.chat_messages_file, 'ab') as f:
+                position = f.seek(0, os.SEEK_END)
+                if position != self._file_size:
+                    # 数据文件被其他实例或进程追加过，先同步索引与计数器，保证ID不重复
+                    self._recover({})
+                    self._cache_loaded = False
+                    position = self._file_size
+
+                # 获取下一个消息ID并打包消息（包含UUID）
+                message_id = self._message_counter
+                packed_message = self._pack_message(message_id, player_id, message, timestamp, rtext_data,
+                                                    message_type, player_uuid)
+                f.write(packed_message)
+
+            # 先写数据再写索引：两者之间崩溃时，启动扫描会补齐缺失的索引项
+            self._offsets.append(message_id, encode_offset(self._archive.active, position), timestamp_ms)
+            if not position:
+                self._active_first_ts_ms = timestamp_ms
+            self._search.add(message_id, message_type, timestamp_ms, player_id, message)
+            self._file_size = position + len(packed_message)
+            self._message_count += 1
+            self._message_counter = message_id + 1
+            self._maybe_checkpoint()
+
+            entry = {
+                'id': message_id,
+                'player_id': player_id,
+                'message': message,
+                'timestamp': int(timestamp.timestamp()),
+                'timestamp_ms': timestamp_ms,
+                'timestamp_str': timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+                'is_rtext': rtext_data is not None,
+                'rtext_data': rtext_data,
+                'is_plugin': message_type == 2,
+                'plugin_id': player_id if message_type == 2 else None,
+                'uuid': player_uuid,  # 使用获取到的UUID
+                'message_source': 'plugin' if message_type == 2 else ('webui' if message_type == 1 else 'game')
+            }
+            # 添加到内存缓存
+            self._add_to_cache(entry)
+            # 在锁内发布，保证推送顺序与ID顺序一致
+            self.subscribers.publish([("message", entry)])
 
+        if resolve_later:
+            self._uuids.request(player_id, server)
         return message_id
 
     def get_messages(self, limit=50, offset=0, after_id=None, before_id=None):
@@ -543,142 +1135,141 @@ class ChatLogger:
             return []
 
     def _get_new_messages_optimized(self, after_id, limit):
-        """优化的新消息获取"""
-        # 首先检查缓存
-        self._load_cache_from_file()
-
-        # 从缓存中筛选新消息
-        new_messages = [msg for msg in self._message_cache if msg['id'] > after_id]
-
-        if len(new_messages) >= limit:
-            # 缓存中有足够的新消息
-            new_messages.sort(key=lambda x: x['id'])
-            return new_messages[:limit]
+        """优化的新消息获取（ID 升序）"""
+        with self._lock:
+            self._load_cache_from_file()
+            ids = self._cache_ids
+            # 缓存覆盖了所有ID大于 after_id 的消息时，二分定位后直接切片
+            if self._cache_holds_all() or (ids and after_id >= ids[0] - 1):
+                position = bisect.bisect_right(ids, after_id)
+                return list(itertools.islice(self._message_cache, position, position + limit))
 
         # 缓存不足，需要从文件读取
         return self._get_messages_from_file_after_id(after_id, limit)
 
     def _get_recent_messages_optimized(self, limit):
-        """优化的最近消息获取"""
-        # 首先尝试从缓存获取
-        self._load_cache_from_file()
-
-        if len(self._message_cache) >= limit:
-            # 缓存中有足够的消息
-            sorted_messages = sorted(self._message_cache, key=lambda x: x['timestamp'], reverse=True)
-            return sorted_messages[:limit]
+        """优化的最近消息获取（ID 降序）"""
+        with self._lock:
+            self._load_cache_from_file()
+            cache = self._message_cache
+            if len(cache) >= limit or self._cache_holds_all():
+                # 取缓存尾部 limit 条
+                start = max(len(cache) - limit, 0)
+                return list(itertools.islice(cache, start, None))[::-1]
 
         # 缓存不足，从文件读取
         return self._get_recent_messages_from_file(limit)
 
     def _get_historical_messages_optimized(self, before_id, limit):
-        """优化的历史消息获取"""
-        # 首先检查缓存
-        self._load_cache_from_file()
-
-        # 从缓存中筛选历史消息
-        historical_messages = [msg for msg in self._message_cache if msg['id'] < before_id]
-
-        if len(historical_messages) >= limit:
-            # 缓存中有足够的历史消息
-            historical_messages.sort(key=lambda x: x['timestamp'], reverse=True)
-            return historical_messages[:limit]
-
-        # 缓存不足，使用位置索引优化文件读取
+        """优化的历史消息获取（ID 降序）"""
+        with self._lock:
+            self._load_cache_from_file()
+            position = bisect.bisect_left(self._cache_ids, before_id)
+            if position >= limit or self._cache_holds_all():
+                start = max(position - limit, 0)
+                return list(itertools.islice(self._message_cache, start, position))[::-1]
+
+        # 缓存不足，使用偏移索引读取文件
         return self._get_historical_messages_from_file(before_id, limit)
 
     def _get_messages_from_file_after_id(self, after_id, limit):
-        """从文件获取指定ID之后的消息"""
-        positions = self._load_positions_index()
-        messages = []
-
+        """从文件获取指定ID之后的消息（ID 升序），通过偏移索引二分定位"""
         try:
-            with open(self.chat_messages_file, 'rb') as f:
-                # 尝试使用位置索引快速定位
-                start_position = 0
-                if str(after_id) in positions:
-                    start_position = positions[str(after_id)]
-
-                # 找到一个合适的起始位置
-                for msg_id in sorted([int(k) for k in positions.keys()]):
-                    if msg_id > after_id:
-                        start_position = positions[str(msg_id)]
-                        break
-
-                f.seek(start_position)
-                data = f.read()
-
-                offset = 0
-                while offset < len(data) and len(messages) < limit:
-                    message, new_offset = self._unpack_message(data, offset)
-                    if message is None:
-                        break
-
-                    if message['id'] > after_id:
-                        serializable_message = self._convert_to_serializable(message)
-                        messages.append(serializable_message)
-
-                    offset = new_offset
-
+            with self._lock:
+                position = self._offsets.bisect_id(after_id)
+            return self._read_page(position, position + limit)
         except Exception as e:
             logger.warning(f"从文件读取新消息失败: {e}")
-
-        return messages
+            return []
 
     def _get_historical_messages_from_file(self, before_id, limit):
-        """从文件获取历史消息"""
-        # 为了效率，这里还是采用从末尾读取然后筛选的方式
+        """从文件获取指定ID之前的历史消息（ID 降序），可翻页至最早的消息"""
         try:
-            file_size = self.chat_messages_file.stat().st_size
-            chunk_size = min(file_size, 2 * 1024 * 1024)  # 读取最多2MB
-
-            with open(self.chat_messages_file, 'rb') as f:
-                if file_size <= chunk_size:
-                    data = f.read()
-                else:
-                    f.seek(file_size - chunk_size)
-                    data = f.read()
-
-                all_messages = self._parse_all_messages_from_data(data)
-                historical_messages = [msg for msg in all_messages if msg['id'] < before_id]
-                historical_messages.sort(key=lambda x: x['timestamp'], reverse=True)
-                return historical_messages[:limit]
-
+            with self._lock:
+                position = self._offsets.bisect_id(before_id - 1)
+            return self._read_page(position - limit, position)[::-1]
         except Exception as e:
             logger.warning(f"从文件读取历史消息失败: {e}")
             return []
 
     def _get_messages_with_offset(self, limit, offset):
-        """传统的offset方式读取消息（兼容性）"""
+        """传统的offset方式读取消息（兼容性）：跳过最早的 offset 条后取 limit 条，ID 降序"""
         try:
-            with open(self.chat_messages_file, 'rb') as f:
-                data = f.read()
-
-            messages = []
-            offset_pos = 0
-            messages_read = 0
-            max_attempts = offset + limit + 100  # 防止无限循环
-            attempt_count = 0
-
-            while offset_pos < len(data) and messages_read < (offset + limit) and attempt_count < max_attempts:
-                message, offset_pos = self._unpack_message(data, offset_pos)
-                if message is None:
-                    break
-
-                messages_read += 1
-                if messages_read > offset:
-                    serializable_message = self._convert_to_serializable(message)
-                    messages.append(serializable_message)
-
-                attempt_count += 1
-
-            messages.sort(key=lambda x: x['timestamp'], reverse=True)
-            return messages
-
+            return self._read_page(offset, offset + limit)[::-1]
         except Exception as e:
             logger.warning(f"使用offset读取消息失败: {e}")
             return []
 
+    def search_messages(self, text=None, player=None, sources=None, since=None, until=None, before_id=None,
+                        limit=50):
+        """搜索聊天记录，结果按ID降序
+
+        Args:
+            text: 消息文本，不区分大小写的子串匹配（英文、数字词按子串展开词表、中日韩文字按相邻两字走索引）
+            player: 玩家名，不区分大小写的精确匹配
+            sources: 消息来源列表（game / webui / plugin）
+            since / until: 时间范围，Unix 时间戳（秒）
+            before_id: 只返回ID小于该值的结果，用于翻页
+        """
+        with self._lock:
+            last = self._offsets.last()
+        self._search.ensure_loaded(self._iter_messages_after, last.id if last is not None else 0)
+
+        message_types = [_MESSAGE_TYPES[s] for s in (sources or []) if s in _MESSAGE_TYPES]
+        if sources and not message_types:
+            return {"messages": [], "has_more": False, "next_before_id": None}
+        candidates, truncated = self._search.candidates(
+            text=text,
+            player=player,
+            message_types=message_types,
+            since_ms=int(since * 1000) if since is not None else None,
+            until_ms=int(until * 1000) if until is not None else None,
+            before_id=before_id,
+        )
+
+        needle = text.lower() if text else None
+        messages = []
+        checked = 0
+        for message_id in candidates:
+            if len(messages) >= limit:
+                break
+            checked += 1
+            message = self._get_message_by_id(message_id)
+            if message is None:
+                continue
+            if needle and needle not in message['message'].lower():
+                continue
+            messages.append(message)
+
+        has_more = truncated or checked < len(candidates)
+        # 翻页游标取最后一个已校验的候选，跳过的候选不会在下一页重复出现
+        next_before_id = candidates[checked - 1] if has_more and checked else None
+        return {"messages": messages, "has_more": has_more, "next_before_id": next_before_id}
+
+    def get_search_stats(self):
+        return self._search.stats()
+
+    def _get_message_by_id(self, message_id):
+        with self._lock:
+            position = self._offsets.bisect_id(message_id - 1)
+        page = self._read_page(position, position + 1)
+        if page and page[0]['id'] == message_id:
+            return page[0]
+        return None
+
+    def _iter_messages_after(self, after_id):
+        """按ID升序分批读取 after_id 之后的全部消息，供搜索索引补齐"""
+        with self._lock:
+            position = self._offsets.bisect_id(after_id)
+        while True:
+            page = self._read_page(position, position + _SEARCH_BACKFILL_BATCH)
+            if not page:
+                return
+            for message in page:
+                yield (message['id'], _MESSAGE_TYPES.get(message['message_source'], 0),
+                       message['timestamp_ms'], message['player_id'], message['message'])
+            position += _SEARCH_BACKFILL_BATCH
+
     @staticmethod
     def _convert_to_serializable(message):
         """将消息转换为可序列化格式"""
@@ -697,45 +1288,79 @@ class ChatLogger:
             'message_source': message.get('message_source', 'game')
         }
 
+    def fill_uuid(self, message):
+        """用后台解析出的UUID补全消息，返回消息本身"""
+        return self._uuids.fill(message)
+
     def get_new_messages(self, after_id):
         """获取指定ID之后的新消息"""
         return self.get_messages(after_id=after_id, limit=100)
 
     def get_message_count(self):
         """获取消息总数"""
-        index = self._read_index()
-        return index.get("message_count", 0)
+        return self._message_count
 
     def get_last_message_id(self):
         """获取最后一条消息的ID"""
-        index = self._read_index()
-        return index.get("next_message_id", 1) - 1
+        return self._message_counter - 1
 
     def clear_messages(self):
         """清空所有消息"""
-        if self.chat_messages_file.exists():
-            self.chat_messages_file.unlink()
-
-        # 清理位置索引文件
-        if self.message_positions_file.exists():
-            self.message_positions_file.unlink()
-
-        # 重置索引
-        index = {
-            "message_count": 0,
-            "next_message_id": 1,
-            "file_size": 0
-        }
-        self._write_index(index)
-
-        # 清理内存缓存
-        self._message_cache = []
-        self._cache_loaded = False
-        self._positions_cache = {}
-        self._positions_loaded = False
+        with self._lock:
+            self._mapped.reset()
+            if self.chat_messages_file.exists():
+                self.chat_messages_file.unlink()
+
+            # 清空封存分段、偏移索引、搜索索引并重置计数器
+            self._archive.reset()
+            self._generation += 1
+            self._active_first_ts_ms = None
+            self._offsets.reset()
+            self._search.reset()
+            self._message_count = 0
+            self._message_counter = 1
+            self._file_size = 0
+            self._checkpoint()
+
+            # 清理内存缓存
+            self._message_cache.clear()
+            self._cache_ids.clear()
+            self._cache_loaded = False
+        self.subscribers.publish([("clear", None)])
 
     def get_file_size(self):
-        """获取消息文件大小"""
-        if self.chat_messages_file.exists():
-            return self.chat_messages_file.stat().st_size
-        return 0
+        """获取消息文件大小（活动分段与全部封存分段的磁盘占用）"""
+        with self._lock:
+            return self._file_size + self._archive.total_size()
+
+    def get_archive_stats(self):
+        with self._lock:
+            stats = self._archive.stats()
+            stats["active_bytes"] = self._file_size
+            stats["messages"] = self._message_count
+            return stats
+
+
+# 进程内共享的聊天记录器：插件消息、游戏内聊天与 WebUI 聊天页共用同一实例（同一把锁与缓存）
+_shared_logger = None
+_shared_lock = threading.Lock()
+
+
+def get_chat_logger(cache_size=None):
+    """返回进程内共享的 ChatLogger，首次调用时创建；给出 cache_size 时同时调整缓存大小"""
+    global _shared_logger
+    with _shared_lock:
+        if _shared_logger is None:
+            _shared_logger = ChatLogger(cache_size=cache_size or CHAT_CACHE_SIZE)
+        elif cache_size:
+            _shared_logger.configure(cache_size)
+        return _shared_logger
+
+
+def close_chat_logger():
+    """写入检查点、停止后台线程并释放共享实例（插件卸载时调用）"""
+    global _shared_logger
+    with _shared_lock:
+        if _shared_logger is not None:
+            _shared_logger.close()
+            _shared_logger = None
@@ -0,0 +1,333 @@
+"""
+聊天记录搜索索引
+随 ChatLogger.add_message 增量维护的内存倒排索引，支持按玩家、消息来源、时间范围与文本检索。
+
+索引以追加写入的文本文件 chat_messages.terms 持久化在 chat_messages.bin 旁，每条消息一行：
+<消息ID>\\t<消息类型>\\t<时间戳毫秒>\\t<小写玩家名>\\t<以空格分隔的词项>
+写入先进入内存缓冲，随 ChatLogger 的计数器检查点一并落盘。启动时若文件落后于数据文件
+（崩溃丢失了缓冲），在补齐之前不再追加，避免文件中出现空洞；补齐发生在第一次搜索加载索引时，
+从数据文件读取缺失的消息。索引加载到内存后随新消息实时更新。
+"""
+
+import bisect
+import re
+import threading
+from array import array
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 英文、数字按词切分；中日韩文字按相邻两字切分（单字成段时保留单字）
+_TOKEN_PATTERN = re.compile(r"[0-9a-z_]+|[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]+")
+_CJK_START = "\u3040"
+# 一个英文查询词按子串匹配时最多展开的词项数，超出时该词不走索引，只做结果校验
+SEARCH_MAX_EXPANDED_TERMS = 64
+# 英文查询词按三字片段定位候选词项；最少见的片段对应的词项仍超过该数时不走索引
+SEARCH_MAX_GRAM_TERMS = 4096
+# 单次搜索最多校验的候选消息数
+SEARCH_MAX_CANDIDATES = 5000
+
+
+def tokenize(text: str) -> List[str]:
+    """将文本切分为去重后的词项"""
+    tokens = []
+    for word in _TOKEN_PATTERN.findall(text.lower()):
+        if word[0] < _CJK_START:
+            tokens.append(word)
+        elif len(word) == 1:
+            tokens.append(word)
+        else:
+            tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+    return list(dict.fromkeys(tokens))
+
+
+def _contains(ids: array, size: int, message_id: int) -> bool:
+    i = bisect.bisect_left(ids, message_id, 0, size)
+    return i < size and ids[i] == message_id
+
+
+def _grams(term: str) -> set:
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+class ChatSearchIndex:
+    """聊天记录倒排索引；各倒排表均为按消息ID升序的 array"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._pending: List[str] = []
+        self._loaded = False
+        # 文件内容是否与数据文件连续，不连续时缓冲只保留在内存中，等待加载时补齐
+        self._synced = False
+        self._reset_memory()
+        self._file_last_id = self._open_file()
+
+    def _reset_memory(self) -> None:
+        self._ids = array("Q")
+        self._times = array("q")
+        self._types = array("B")
+        self._players: Dict[str, array] = {}
+        self._terms: Dict[str, array] = {}
+        # 英文、数字词项的三字片段 -> 含该片段的词项，用于子串展开
+        self._grams: Dict[str, List[str]] = {}
+        # 时间戳是否随消息ID单调不减；成立时时间范围可直接二分定位
+        self._monotonic = True
+        self._last_id = 0
+
+    def _open_file(self) -> int:
+        """截掉崩溃时写了一半的末行，返回文件中最后一条消息的ID"""
+        try:
+            with open(self.path, "r+b") as f:
+                size = f.seek(0, 2)
+                f.seek(max(size - 64 * 1024, 0))
+                tail = f.read()
+                if tail and not tail.endswith(b"\n"):
+                    cut = tail.rfind(b"\n") + 1
+                    size = size - len(tail) + cut
+                    f.truncate(size)
+                    tail = tail[:cut]
+        except FileNotFoundError:
+            return 0
+        lines = tail.rstrip(b"\n").rsplit(b"\n", 1)
+        try:
+            return int(lines[-1].split(b"\t", 1)[0])
+        except ValueError:
+            return 0
+
+    def attach(self, last_message_id: int) -> None:
+        """由 ChatLogger 在恢复计数器后调用：文件与数据文件一致时才允许直接追加"""
+        with self._lock:
+            self._synced = self._file_last_id == last_message_id
+
+    # ---- 写入 ----
+
+    @staticmethod
+    def _format_line(message_id: int, message_type: int, timestamp_ms: int, player_id: str, tokens) -> str:
+        return f"{message_id}\t{message_type}\t{timestamp_ms}\t{player_id.lower()}\t{' '.join(tokens)}\n"
+
+    def _apply(self, message_id: int, message_type: int, timestamp_ms: int, player: str, tokens) -> bool:
+        if message_id <= self._last_id:
+            return False
+        self._last_id = message_id
+        if self._times and timestamp_ms < self._times[-1]:
+            self._monotonic = False
+        self._ids.append(message_id)
+        self._times.append(timestamp_ms)
+        self._types.append(message_type)
+        self._players.setdefault(player, array("Q")).append(message_id)
+        for token in tokens:
+            postings = self._terms.get(token)
+            if postings is None:
+                postings = self._terms[token] = array("Q")
+                if token[0] < _CJK_START:
+                    for gram in _grams(token):
+                        self._grams.setdefault(gram, []).append(token)
+            postings.append(message_id)
+        return True
+
+    def _apply_line(self, line: str) -> bool:
+        parts = line.rstrip("\n").split("\t")
+        if len(parts) != 5:
+            return False
+        try:
+            message_id, message_type, timestamp_ms = int(parts[0]), int(parts[1]), int(parts[2])
+        except ValueError:
+            return False
+        return self._apply(message_id, message_type, timestamp_ms, parts[3], parts[4].split())
+
+    def add(self, message_id: int, message_type: int, timestamp_ms: int, player_id: str, message: str) -> None:
+        """记录一条新消息；索引未加载时只写入缓冲"""
+        tokens = tokenize(message)
+        with self._lock:
+            if self._loaded:
+                self._apply(message_id, message_type, timestamp_ms, player_id.lower(), tokens)
+            elif not self._synced and len(self._pending) >= SEARCH_MAX_CANDIDATES:
+                # 文件已落后、缓冲也写不进去：丢弃缓冲，加载时统一从数据文件补齐
+                self._pending = []
+            self._pending.append(self._format_line(message_id, message_type, timestamp_ms, player_id, tokens))
+
+    def flush(self) -> None:
+        """把缓冲中的词项行追加到文件（文件落后于数据文件时跳过）"""
+        with self._lock:
+            if not self._synced or not self._pending:
+                return
+            lines, self._pending = self._pending, []
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+
+    def reset(self) -> None:
+        """清空索引与文件（清空聊天记录时调用）"""
+        with self._lock:
+            self._pending = []
+            self._reset_memory()
+            with open(self.path, "w", encoding="utf-8"):
+                pass
+            self._file_last_id = 0
+            self._synced = True
+
+    # ---- 加载 ----
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self, read_after: Callable[[int], Iterable[Tuple[int, int, int, str, str]]],
+                      last_message_id: int) -> None:
+        """加载索引文件并从数据文件补齐其后缺失的消息
+
+        read_after(after_id) 依次产出 (消息ID, 消息类型, 时间戳毫秒, 玩家名, 消息文本)。
+        加载在锁外进行，期间新写入的消息只进缓冲、不被阻塞，最后按ID去重合并。
+        """
+        if self._loaded:
+            return
+        with self._load_lock:
+            if self._loaded:
+                return
+            self.flush()
+            with self._lock:
+                # 加载期间暂停落盘，完成后连同补齐的内容一起写入
+                self._synced = False
+            self._read_file()
+            if self._last_id > last_message_id:
+                # 索引比数据文件新（数据被替换或清空），重建
+                self._reset_memory()
+                with open(self.path, "w", encoding="utf-8"):
+                    pass
+
+            backfill = []
+            for message_id, message_type, timestamp_ms, player_id, message in read_after(self._last_id):
+                tokens = tokenize(message)
+                if self._apply(message_id, message_type, timestamp_ms, player_id.lower(), tokens):
+                    backfill.append(self._format_line(message_id, message_type, timestamp_ms, player_id, tokens))
+
+            with self._lock:
+                if backfill:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.writelines(backfill)
+                # 合并加载期间写入缓冲的消息；已由补齐覆盖的行丢弃，其余留待下次落盘
+                self._pending = [line for line in self._pending if self._apply_line(line)]
+                self._file_last_id = self._last_id
+                self._synced = True
+                self._loaded = True
+
+    def _read_file(self) -> None:
+        self._reset_memory()
+        try:
+            with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    self._apply_line(line)
+        except FileNotFoundError:
+            pass
+
+    # ---- 查询 ----
+
+    def _postings_for(self, token: str) -> Optional[array]:
+        """词项的倒排表；英文、数字词展开为包含它的全部词项，无法用索引约束时返回 None"""
+        if token[0] >= _CJK_START:
+            if len(token) == 1:
+                return None
+            return self._terms.get(token, array("Q"))
+        if len(token) < 3:
+            # 一两个字符的片段几乎出现在所有词项中，不走索引
+            return None
+        # 词中间的子串（如 sword 之于 diamond_sword、ello 之于 hello）：从最少见的三字片段出发筛选词项
+        lists = [self._grams.get(gram, ()) for gram in _grams(token)]
+        rarest = min(lists, key=len)
+        if len(rarest) > SEARCH_MAX_GRAM_TERMS:
+            return None
+        terms = [term for term in rarest if token in term]
+        if len(terms) > SEARCH_MAX_EXPANDED_TERMS:
+            return None
+        if len(terms) == 1:
+            return self._terms[terms[0]]
+        merged = set()
+        for term in terms:
+            merged.update(self._terms[term])
+        return array("Q", sorted(merged))
+
+    def candidates(
+        self,
+        text: Optional[str] = None,
+        player: Optional[str] = None,
+        message_types: Optional[List[int]] = None,
+        since_ms: Optional[int] = None,
+        until_ms: Optional[int] = None,
+        before_id: Optional[int] = None,
+        max_candidates: int = SEARCH_MAX_CANDIDATES,
+    ) -> Tuple[List[int], bool]:
+        """按ID降序返回满足索引条件的候选消息ID，以及是否因数量上限而截断
+
+        文本条件只做到词项级别，调用方还需按原文校验子串。
+        锁内只记下各数组及其当前长度，逐条筛选在锁外进行，不阻塞新消息写入；
+        数组只会追加（清空时整体替换），按记下的长度读取即为一致的快照。
+        """
+        with self._lock:
+            postings = []
+            if player:
+                players = self._players.get(player.lower())
+                if players is None:
+                    return [], False
+                postings.append((players, len(players)))
+            for token in tokenize(text or ""):
+                term_postings = self._postings_for(token)
+                if term_postings is not None:
+                    if not term_postings:
+                        return [], False
+                    postings.append((term_postings, len(term_postings)))
+            ids, times, types_array = self._ids, self._times, self._types
+            count = len(ids)
+            monotonic = self._monotonic
+
+        # 时间戳单调时二分出时间范围对应的下标区间，否则逐条比较
+        low, high = 0, count
+        check_time = since_ms is not None or until_ms is not None
+        if check_time and monotonic:
+            if since_ms is not None:
+                low = bisect.bisect_left(times, since_ms, 0, count)
+            if until_ms is not None:
+                high = bisect.bisect_right(times, until_ms, low, count)
+            if low >= high:
+                return [], False
+            check_time = False
+
+        postings.sort(key=lambda item: item[1])
+        if postings:
+            driver, size = postings[0]
+            start = bisect.bisect_left(driver, ids[low], 0, size) if low else 0
+            stop = bisect.bisect_right(driver, ids[high - 1], start, size) if high < count else size
+        else:
+            driver, start, stop = ids, low, high
+        others = postings[1:]
+        types = set(message_types) if message_types else None
+        if before_id is not None:
+            stop = min(stop, bisect.bisect_left(driver, before_id, start, stop))
+
+        results = []
+        for i in range(stop - 1, start - 1, -1):
+            message_id = driver[i]
+            if others and not all(_contains(p, n, message_id) for p, n in others):
+                continue
+            if types is not None or check_time:
+                position = i if driver is ids else bisect.bisect_left(ids, message_id, 0, count)
+                if types is not None and types_array[position] not in types:
+                    continue
+                timestamp_ms = times[position]
+                if since_ms is not None and timestamp_ms < since_ms:
+                    continue
+                if until_ms is not None and timestamp_ms > until_ms:
+                    continue
+            results.append(message_id)
+            if len(results) >= max_candidates:
+                return results, i > start
+        return results, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "loaded": self._loaded,
+                "messages": len(self._ids),
+                "terms": len(self._terms),
+                "players": len(self._players),
+                "pending": len(self._pending),
+            }
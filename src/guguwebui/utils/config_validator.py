@@ -90,7 +90,8 @@ class ConfigValidator:
         # 验证布尔值配置
         bool_configs = [
             'disable_other_admin', 'allow_temp_password', 'force_standalone',
-            'ssl_enabled', 'public_chat_enabled', 'public_chat_to_game_enabled'
+            'ssl_enabled', 'public_chat_enabled', 'public_chat_to_game_enabled',
+            'log_history_enabled'
         ]
         for key in bool_configs:
             value = config.get(key)
@@ -183,7 +184,10 @@ class ConfigValidator:
 
         # 验证整数配置
         int_configs = [
-            'chat_verification_expire_minutes', 'chat_session_expire_hours'
+            'chat_verification_expire_minutes', 'chat_session_expire_hours', 'chat_cache_size',
+            'log_buffer_size', 'log_dedup_max_entries',
+            'log_history_segment_mb', 'log_history_segment_hours', 'chat_segment_mb',
+            'audit_segment_mb', 'audit_segment_days'
         ]
         for key in int_configs:
             value = config.get(key)
@@ -194,6 +198,28 @@ class ConfigValidator:
                 self.warnings.append(f"{key} 值超出范围，期望 > 0，实际: {value}")
                 validated_config[key] = DEFALUT_CONFIG[key]
 
+        # 验证可为 0（表示不限制）的整数配置
+        non_negative_int_configs = [
+            'log_dedup_window_ms', 'log_history_max_mb', 'log_history_retention_days',
+            'chat_retention_days', 'chat_retention_mb',
+            'audit_retention_days', 'audit_retention_mb', 'audit_fsync_interval_ms', 'user_db_write_behind_ms'
+        ]
+        for key in non_negative_int_configs:
+            value = config.get(key)
+            if not isinstance(value, int):
+                self.warnings.append(f"{key} 类型错误，期望 int，实际: {type(value)}")
+                validated_config[key] = DEFALUT_CONFIG[key]
+            elif value < 0:
+                self.warnings.append(f"{key} 值超出范围，期望 >= 0，实际: {value}")
+                validated_config[key] = DEFALUT_CONFIG[key]
+
+        # 验证聊天记录与操作审计归档压缩算法
+        for key in ('chat_archive_compression', 'audit_archive_compression'):
+            compression = config.get(key)
+            if compression not in ('none', 'lzma', 'zstd'):
+                self.warnings.append(f"{key} 取值错误，期望 none / lzma / zstd，实际: {compression}")
+                validated_config[key] = DEFALUT_CONFIG[key]
+
         # 验证AI模型配置
         ai_model = config.get('ai_model')
         if ai_model and not isinstance(ai_model, str):
@@ -0,0 +1,112 @@
+"""
+推送订阅工具
+生产者可在任意线程发布数据，订阅方在 asyncio 事件循环中消费，用于 SSE 等推送接口。
+"""
+
+import asyncio
+import json
+import threading
+from collections import deque
+from typing import Any, Iterable, List, Optional, Set, Tuple
+
+
+class Subscription:
+    """单个订阅连接的有界队列。
+
+    队列写满时丢弃已积压的数据并标记 overflowed，消费方应据此从存储中按游标补齐，
+    避免慢客户端拖住生产者或无限占用内存。
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_queue: int = 1000):
+        self._loop = loop
+        self._max_queue = max(1, int(max_queue))
+        self._queue: deque = deque()
+        self._lock = threading.Lock()
+        self._event = asyncio.Event()
+        self._notified = False
+        self.overflowed = False
+        self.closed = False
+
+    def push(self, items: Iterable[Any]) -> None:
+        """由生产者线程调用，追加数据并唤醒消费方"""
+        with self._lock:
+            if self.closed:
+                return
+            for item in items:
+                if len(self._queue) >= self._max_queue:
+                    self._queue.clear()
+                    self.overflowed = True
+                self._queue.append(item)
+            if self._notified:
+                return
+            self._notified = True
+        try:
+            self._loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            # 事件循环已关闭，连接不可能再被消费
+            self.closed = True
+
+    async def get(self, timeout: float) -> Tuple[List[Any], bool]:
+        """等待新数据，返回 (数据列表, 期间是否发生溢出)；超时返回空列表"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        with self._lock:
+            items = list(self._queue)
+            self._queue.clear()
+            overflowed = self.overflowed
+            self.overflowed = False
+            self._notified = False
+            self._event.clear()
+        return items, overflowed
+
+
+class SubscriptionHub:
+    """订阅集合，publish 在无订阅者时几乎零开销"""
+
+    def __init__(self, max_queue: int = 1000):
+        self.max_queue = max_queue
+        self._subscriptions: Set[Subscription] = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, loop: Optional[asyncio.AbstractEventLoop] = None) -> Subscription:
+        sub = Subscription(loop or asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            self._subscriptions.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        sub.closed = True
+        with self._lock:
+            self._subscriptions.discard(sub)
+
+    def publish(self, items: List[Any]) -> None:
+        if not self._subscriptions or not items:
+            return
+        with self._lock:
+            subs = list(self._subscriptions)
+        for sub in subs:
+            if sub.closed:
+                self.unsubscribe(sub)
+                continue
+            sub.push(items)
+
+    def __len__(self) -> int:
+        return len(self._subscriptions)
+
+
+def format_sse(data: Any, event: Optional[str] = None, event_id: Optional[Any] = None) -> str:
+    """按 text/event-stream 格式编码一条事件，data 以 JSON 序列化"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    lines.append(f"data: {payload}")
+    return "\n".join(lines) + "\n\n"
+
+
+# SSE 注释行，用于保活与探测断开
+SSE_KEEPALIVE = ": keepalive\n\n"
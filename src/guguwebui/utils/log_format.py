@@ -0,0 +1,145 @@
+"""
+日志文本处理
+终端日志捕获热路径上使用的条目结构与纯函数，仅依赖标准库，便于基准测试单独加载。
+"""
+
+import datetime
+import re
+
+# 合并后的颜色代码模式，依次为：
+# - Minecraft 格式代码（§ 后跟一个字符）
+# - 完整的 ANSI 转义序列（ESC 开头）
+# - 丢失 ESC 后残留的 SGR 片段，如 [37m、[0m、[1;31m
+_COLOR_CODE_PATTERN = re.compile(
+    r"§[0-9a-fk-or]"
+    r"|\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])"
+    r"|\[\d+(?:;\d+)*m"
+)
+_sub_color_codes = _COLOR_CODE_PATTERN.sub
+
+
+def clean_color_codes(text):
+    """清理 Minecraft 颜色代码和 ANSI 转义序列
+
+    单次扫描完成全部替换；不含 §、ESC、[ 的行直接原样返回，不进入正则引擎。
+    """
+    if "§" not in text and "\x1b" not in text and "[" not in text:
+        return text
+    return _sub_color_codes("", text)
+
+
+# 最近一次格式化的秒级时间戳，同一秒内的日志复用结果（以元组整体替换，多线程下无需加锁）
+_last_time_str = (None, "")
+
+
+def format_timestamp(timestamp: float) -> str:
+    """格式化为本地时间，格式为 %Y-%m-%d %H:%M:%S"""
+    global _last_time_str
+    second = int(timestamp)
+    cached_second, cached = _last_time_str
+    if cached_second == second:
+        return cached
+    text = datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+    _last_time_str = (second, text)
+    return text
+
+
+class LogEntry:
+    """终端日志条目
+
+    使用 __slots__ 减少每条日志的内存占用；时间字符串与整行文本在首次读取时生成并缓存，
+    之后的分页、推送请求直接复用，且格式化发生在共享锁之外。
+    """
+
+    __slots__ = ("counter", "timestamp", "level", "source", "message", "_time_str", "_content")
+
+    def __init__(self, counter: int, timestamp: float, level: str, source: str, message: str):
+        self.counter = counter
+        self.timestamp = timestamp
+        self.level = level
+        self.source = source
+        self.message = message
+        self._time_str = None
+        self._content = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LogEntry":
+        """兼容旧版共享状态中的字典条目"""
+        return cls(
+            data["counter"], data["timestamp"], data["level"], data["source"], data["message"]
+        )
+
+    @property
+    def time_str(self) -> str:
+        if self._time_str is None:
+            self._time_str = format_timestamp(self.timestamp)
+        return self._time_str
+
+    @property
+    def content(self) -> str:
+        """类似 MCDR 标准格式的整行文本（含行尾换行）"""
+        if self._content is None:
+            self._content = (
+                f"[#{self.counter}] [{self.time_str}] [{self.source}/{self.level}] {self.message}\n"
+            )
+        return self._content
+
+    @property
+    def is_command(self) -> bool:
+        return "InfoSource.CONSOLE" in self.source and "!!" in self.message
+
+
+def encode_compact(entries, first_line=None):
+    """将日志条目编码为列式结构，供 format=compact 的日志接口返回
+
+    - counter 连续时只给出 counter_start，否则额外给出相邻差值 counter_deltas
+    - 时间字符串与 "来源/等级" 标签按字典去重，各行只保存下标
+    - 行号为 first_line 起连续递增（来自磁盘历史时为 None）
+    - commands 为 is_command 为真的行下标
+    客户端按 "[#counter] [time] [tag] message\\n" 即可还原与 content 字段相同的文本。
+    """
+    times, time_index = [], {}
+    tags, tag_index = [], {}
+    time_col, tag_col, messages, commands, deltas = [], [], [], [], []
+    contiguous = True
+    previous = None
+    for i, entry in enumerate(entries):
+        time_str = entry.time_str
+        idx = time_index.get(time_str)
+        if idx is None:
+            idx = time_index[time_str] = len(times)
+            times.append(time_str)
+        time_col.append(idx)
+
+        tag = f"{entry.source}/{entry.level}"
+        idx = tag_index.get(tag)
+        if idx is None:
+            idx = tag_index[tag] = len(tags)
+            tags.append(tag)
+        tag_col.append(idx)
+
+        messages.append(entry.message)
+        if entry.is_command:
+            commands.append(i)
+        if previous is not None:
+            delta = entry.counter - previous
+            deltas.append(delta)
+            if delta != 1:
+                contiguous = False
+        previous = entry.counter
+
+    result = {
+        "format": "compact",
+        "count": len(messages),
+        "first_line": first_line,
+        "counter_start": entries[0].counter if entries else None,
+        "times": times,
+        "time": time_col,
+        "tags": tags,
+        "tag": tag_col,
+        "message": messages,
+        "commands": commands,
+    }
+    if not contiguous:
+        result["counter_deltas"] = deltas
+    return result
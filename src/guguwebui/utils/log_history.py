@@ -0,0 +1,343 @@
+"""
+终端日志历史
+内存环形缓冲区淘汰的日志追加写入磁盘分段文件，按大小/时间轮转并按保留策略清理。
+
+每个分段由两个文件组成（文件名为分段内第一条日志的 counter）：
+- <first_counter>.bin：帧序列，每帧为 [长度(4字节, 大端)][UTF-8 JSON 数组 [counter, timestamp, level, source, message]]
+- <first_counter>.idx：稀疏索引，每 INDEX_STRIDE 条记录一项 [counter(8)][offset(8)][timestamp(8, double)]
+"""
+
+import bisect
+import json
+import logging
+import struct
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from guguwebui.utils.log_format import LogEntry
+
+logger = logging.getLogger(__name__)
+
+_FRAME_HEADER = struct.Struct(">I")
+_INDEX_ENTRY = struct.Struct(">QQd")
+# 每隔多少条记录写一项稀疏索引
+INDEX_STRIDE = 64
+# 单帧上限，超出视为损坏
+_MAX_FRAME = 1024 * 1024
+
+
+def _encode_entry(entry: LogEntry) -> bytes:
+    payload = json.dumps(
+        [entry.counter, entry.timestamp, entry.level, entry.source, entry.message],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    return _FRAME_HEADER.pack(len(payload)) + payload
+
+
+def _decode_entry(payload: bytes) -> Optional[LogEntry]:
+    try:
+        counter, timestamp, level, source, message = json.loads(payload.decode("utf-8"))
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return LogEntry(counter, timestamp, level, source, message)
+
+
+class _Segment:
+    """单个分段的元数据与稀疏索引"""
+
+    def __init__(self, directory: Path, first_counter: int):
+        self.first_counter = first_counter
+        self.path = directory / f"{first_counter:012d}.bin"
+        self.index_path = directory / f"{first_counter:012d}.idx"
+        self.index_counters: List[int] = []
+        self.index_offsets: List[int] = []
+        self.index_timestamps: List[float] = []
+        self.size = 0
+        self.count = 0
+        self.last_counter = first_counter - 1
+        self.first_timestamp = 0.0
+        self.last_timestamp = 0.0
+
+    def load(self) -> None:
+        """加载稀疏索引并扫描索引之后的尾部，丢弃崩溃留下的半截帧"""
+        if self.index_path.is_file():
+            data = self.index_path.read_bytes()
+            usable = len(data) - len(data) % _INDEX_ENTRY.size
+            for pos in range(0, usable, _INDEX_ENTRY.size):
+                counter, offset, ts = _INDEX_ENTRY.unpack_from(data, pos)
+                self.index_counters.append(counter)
+                self.index_offsets.append(offset)
+                self.index_timestamps.append(ts)
+        file_size = self.path.stat().st_size if self.path.is_file() else 0
+        # 索引项指向文件之外说明数据文件被截断，丢弃这些索引项
+        while self.index_offsets and self.index_offsets[-1] >= file_size:
+            self.index_counters.pop()
+            self.index_offsets.pop()
+            self.index_timestamps.pop()
+        if self.index_timestamps:
+            self.first_timestamp = self.index_timestamps[0]
+
+        start = self.index_offsets[-1] if self.index_offsets else 0
+        self.count = (len(self.index_offsets) - 1) * INDEX_STRIDE if self.index_offsets else 0
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read()
+        pos = 0
+        while pos + _FRAME_HEADER.size <= len(data):
+            (length,) = _FRAME_HEADER.unpack_from(data, pos)
+            if length > _MAX_FRAME or pos + _FRAME_HEADER.size + length > len(data):
+                break
+            entry = _decode_entry(data[pos + _FRAME_HEADER.size:pos + _FRAME_HEADER.size + length])
+            if entry is None:
+                break
+            if self.count % INDEX_STRIDE == 0 and (
+                not self.index_offsets or start + pos > self.index_offsets[-1]
+            ):
+                self._add_index(entry, start + pos, write=False)
+            if not self.first_timestamp:
+                self.first_timestamp = entry.timestamp
+            self.count += 1
+            self.last_counter = entry.counter
+            self.last_timestamp = entry.timestamp
+            pos += _FRAME_HEADER.size + length
+        valid_end = start + pos
+        if valid_end < file_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_end)
+        self.size = valid_end
+        self._rewrite_index()
+
+    def _add_index(self, entry: LogEntry, offset: int, write: bool = True) -> None:
+        self.index_counters.append(entry.counter)
+        self.index_offsets.append(offset)
+        self.index_timestamps.append(entry.timestamp)
+        if write:
+            with open(self.index_path, "ab") as f:
+                f.write(_INDEX_ENTRY.pack(entry.counter, offset, entry.timestamp))
+
+    def _rewrite_index(self) -> None:
+        with open(self.index_path, "wb") as f:
+            for counter, offset, ts in zip(self.index_counters, self.index_offsets, self.index_timestamps):
+                f.write(_INDEX_ENTRY.pack(counter, offset, ts))
+
+    def append(self, f, entries: List[LogEntry], max_bytes: int) -> int:
+        """将条目写入已打开的数据文件句柄 f，写满 max_bytes 即停止，返回写入条数（至少 1）"""
+        chunks = []
+        offset = self.size
+        written = 0
+        for entry in entries:
+            if written and offset >= max_bytes:
+                break
+            written += 1
+            frame = _encode_entry(entry)
+            if self.count % INDEX_STRIDE == 0:
+                self._add_index(entry, offset)
+            if not self.first_timestamp:
+                self.first_timestamp = entry.timestamp
+            chunks.append(frame)
+            offset += len(frame)
+            self.count += 1
+            self.last_counter = entry.counter
+            self.last_timestamp = entry.timestamp
+        f.write(b"".join(chunks))
+        self.size = offset
+        return written
+
+    def read_range(self, low: int, high: int) -> List[LogEntry]:
+        """读取 counter 位于 [low, high) 的条目，借助稀疏索引定位起点"""
+        if high <= low or not self.path.is_file():
+            return []
+        pos = bisect.bisect_right(self.index_counters, low) - 1
+        start = self.index_offsets[pos] if pos >= 0 else 0
+        end = self.size
+        stop = bisect.bisect_left(self.index_counters, high)
+        if stop < len(self.index_offsets):
+            end = self.index_offsets[stop]
+        out = []
+        with open(self.path, "rb") as f:
+            f.seek(start)
+            data = f.read(max(0, end - start))
+        offset = 0
+        while offset + _FRAME_HEADER.size <= len(data):
+            (length,) = _FRAME_HEADER.unpack_from(data, offset)
+            offset += _FRAME_HEADER.size
+            if length > _MAX_FRAME or offset + length > len(data):
+                break
+            entry = _decode_entry(data[offset:offset + length])
+            offset += length
+            if entry is None:
+                continue
+            if entry.counter >= high:
+                break
+            if entry.counter >= low:
+                out.append(entry)
+        return out
+
+    def delete(self) -> None:
+        for path in (self.path, self.index_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class LogHistory:
+    """磁盘日志历史：后台线程批量写入，读取时按 counter 倒序翻页"""
+
+    def __init__(
+        self,
+        directory: Path,
+        segment_max_bytes: int = 8 * 1024 * 1024,
+        segment_max_seconds: float = 24 * 3600,
+        max_total_bytes: int = 256 * 1024 * 1024,
+        retention_seconds: float = 7 * 24 * 3600,
+        flush_interval: float = 1.0,
+    ):
+        self.directory = Path(directory)
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_seconds = segment_max_seconds
+        self.max_total_bytes = max_total_bytes
+        self.retention_seconds = retention_seconds
+        self.flush_interval = flush_interval
+
+        self._pending: deque = deque()
+        self._lock = threading.Lock()  # 保护分段列表与文件写入
+        self._segments: List[_Segment] = []
+        self._active_opened_at = 0.0
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load_segments()
+
+    def _load_segments(self) -> None:
+        for path in sorted(self.directory.glob("*.bin")):
+            try:
+                first_counter = int(path.stem)
+            except ValueError:
+                continue
+            segment = _Segment(self.directory, first_counter)
+            try:
+                segment.load()
+            except OSError as e:
+                logger.warning(f"加载日志历史分段失败 {path}: {e}")
+                continue
+            if segment.count == 0:
+                segment.delete()
+                continue
+            self._segments.append(segment)
+        if self._segments:
+            self._active_opened_at = self._segments[-1].path.stat().st_mtime
+
+    @property
+    def last_counter(self) -> int:
+        return self._segments[-1].last_counter if self._segments else 0
+
+    def append(self, entry: LogEntry) -> None:
+        """登记待写入条目（可在持有其他锁时调用，不做 I/O）"""
+        self._pending.append(entry)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="Log-History-Writer", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"写入日志历史失败: {e}")
+
+    def flush(self) -> None:
+        """将待写入条目落盘，必要时轮转分段并执行保留策略"""
+        with self._lock:
+            batch = []
+            while self._pending:
+                batch.append(self._pending.popleft())
+            if not batch:
+                return
+            last = self.last_counter
+            batch = [entry for entry in batch if entry.counter > last]
+            while batch:
+                segment = self._writable_segment(batch[0])
+                with open(segment.path, "ab") as f:
+                    written = segment.append(f, batch, self.segment_max_bytes)
+                batch = batch[written:]
+            self._apply_retention()
+
+    def _writable_segment(self, next_entry: LogEntry) -> _Segment:
+        now = time.time()
+        if self._segments:
+            active = self._segments[-1]
+            if (
+                active.size < self.segment_max_bytes
+                and now - self._active_opened_at < self.segment_max_seconds
+            ):
+                return active
+        segment = _Segment(self.directory, next_entry.counter)
+        self._segments.append(segment)
+        self._active_opened_at = now
+        return segment
+
+    def _apply_retention(self) -> None:
+        now = time.time()
+        total = sum(segment.size for segment in self._segments)
+        # 始终保留正在写入的分段
+        while len(self._segments) > 1:
+            oldest = self._segments[0]
+            expired = self.retention_seconds > 0 and now - oldest.last_timestamp > self.retention_seconds
+            oversize = self.max_total_bytes > 0 and total > self.max_total_bytes
+            if not (expired or oversize):
+                break
+            oldest.delete()
+            total -= oldest.size
+            self._segments.pop(0)
+
+    def read_before(self, before_counter: int, limit: int) -> List[LogEntry]:
+        """返回 counter 小于 before_counter 的最近 limit 条（按 counter 升序）"""
+        self.flush()
+        with self._lock:
+            segments = [s for s in self._segments if s.first_counter < before_counter]
+        result: List[LogEntry] = []
+        need = limit
+        upper = before_counter
+        for segment in reversed(segments):
+            while need > 0:
+                low = max(segment.first_counter, upper - need)
+                chunk = segment.read_range(low, upper)
+                result = chunk + result
+                need -= len(chunk)
+                if low <= segment.first_counter:
+                    break
+                upper = low
+            if need <= 0:
+                break
+            upper = segment.first_counter
+        return result[-limit:] if limit > 0 else []
+
+    def has_before(self, counter: int) -> bool:
+        """是否存在 counter 更小的历史记录"""
+        return bool(self._segments) and self._segments[0].first_counter < counter
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "segments": len(self._segments),
+                "bytes": sum(segment.size for segment in self._segments),
+                "first_counter": self._segments[0].first_counter if self._segments else 0,
+                "last_counter": self.last_counter,
+                "pending": len(self._pending),
+            }
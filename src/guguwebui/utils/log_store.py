@@ -0,0 +1,228 @@
+"""
+日志存储结构
+供 LogWatcher 使用的内存环形缓冲区（条目以单调递增的 counter 编号）与去重窗口。
+"""
+
+from collections import deque
+from typing import Any, Dict, Hashable, Iterable, Iterator, List, Optional, Tuple
+
+
+class LogRingBuffer:
+    """定长环形缓冲区
+
+    追加与淘汰均为 O(1)。缓冲区内条目的 counter 连续递增，
+    因此按 counter 定位只需一次下标换算，无需遍历。
+    """
+
+    def __init__(self, capacity: int = 5000):
+        self.capacity = max(1, int(capacity))
+        self._items: List[Any] = [None] * self.capacity
+        self._start = 0  # 最旧条目所在槽位
+        self._size = 0
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Any], capacity: int = 5000) -> "LogRingBuffer":
+        """从旧结构（列表或旧版缓冲区）迁移，超出容量时只保留最新部分"""
+        buffer = cls(capacity)
+        for entry in entries:
+            buffer.append(entry)
+        return buffer
+
+    def append(self, entry: Any) -> Any:
+        """追加条目，缓冲区已满时返回被淘汰的最旧条目，否则返回 None"""
+        if self._size < self.capacity:
+            self._items[(self._start + self._size) % self.capacity] = entry
+            self._size += 1
+            return None
+        evicted = self._items[self._start]
+        self._items[self._start] = entry
+        self._start = (self._start + 1) % self.capacity
+        return evicted
+
+    def clear(self) -> None:
+        self._items = [None] * self.capacity
+        self._start = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self) -> Iterator[Any]:
+        for i in range(self._size):
+            yield self._items[(self._start + i) % self.capacity]
+
+    def __getitem__(self, index: int) -> Any:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("LogRingBuffer index out of range")
+        return self._items[(self._start + index) % self.capacity]
+
+    def slice(self, start: int, stop: int) -> List[Any]:
+        """按逻辑下标 [start, stop) 取出条目副本（0 为最旧）"""
+        start = max(0, start)
+        stop = min(self._size, stop)
+        if start >= stop:
+            return []
+        begin = (self._start + start) % self.capacity
+        end = begin + (stop - start)
+        if end <= self.capacity:
+            return self._items[begin:end]
+        return self._items[begin:] + self._items[: end - self.capacity]
+
+    @property
+    def first_counter(self) -> int:
+        return self[0].counter if self._size else 0
+
+    @property
+    def last_counter(self) -> int:
+        return self[-1].counter if self._size else 0
+
+    def index_of_counter(self, counter: int) -> int:
+        """返回 counter 对应的逻辑下标（可能越界，由调用方截断）"""
+        return counter - self.first_counter
+
+    def since_counter(self, last_counter: int, limit: int) -> Tuple[int, List[Any]]:
+        """取 counter 大于 last_counter 的最多 limit 条，返回 (起始逻辑下标, 条目列表)"""
+        if not self._size:
+            return 0, []
+        start = max(0, self.index_of_counter(last_counter + 1))
+        return start, self.slice(start, start + max(0, limit))
+
+
+class DedupWindow:
+    """按时间窗口去重
+
+    同一 key 在 window_seconds 内再次出现视为重复。记录按到达顺序保存在队列中，
+    随时间推进逐条过期；条目数超过 max_entries 时提前淘汰最旧记录，
+    因此内存与单次检查开销都有上界，也不会出现整体清空后去重失效的空窗。
+    """
+
+    def __init__(self, window_seconds: float = 1.0, max_entries: int = 20000):
+        self.window_seconds = float(window_seconds)
+        self.max_entries = max(1, int(max_entries))
+        self._seen: Dict[Hashable, float] = {}  # key -> 首次出现时间
+        self._order: deque = deque()  # (时间, key)，按到达顺序
+        self._clock = 0.0  # 已见到的最大时间戳，各来源时间戳不保证单调
+        self.checks = 0
+        self.hits = 0
+
+    def configure(self, window_seconds: float, max_entries: int) -> None:
+        self.window_seconds = float(window_seconds)
+        self.max_entries = max(1, int(max_entries))
+        if self.window_seconds <= 0:
+            self._seen.clear()
+            self._order.clear()
+        while len(self._order) > self.max_entries:
+            self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        ts, key = self._order.popleft()
+        if self._seen.get(key) == ts:
+            del self._seen[key]
+
+    def seen(self, key: Hashable, timestamp: float) -> bool:
+        """检查并登记 key，窗口内已出现过时返回 True；窗口为 0 时关闭去重"""
+        self.checks += 1
+        if self.window_seconds <= 0:
+            return False
+        if timestamp > self._clock:
+            self._clock = timestamp
+        cutoff = self._clock - self.window_seconds
+        order = self._order
+        while order and order[0][0] < cutoff:
+            self._evict_oldest()
+
+        first = self._seen.get(key)
+        if first is not None and abs(timestamp - first) <= self.window_seconds:
+            # 不刷新首次时间，持续重复的消息每个窗口仍会保留一条
+            self.hits += 1
+            return True
+
+        self._seen[key] = timestamp
+        order.append((timestamp, key))
+        if len(order) > self.max_entries:
+            self._evict_oldest()
+        return False
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": int(self.window_seconds * 1000),
+            "max_entries": self.max_entries,
+            "size": len(self._seen),
+            "checks": self.checks,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.checks, 4) if self.checks else 0.0,
+        }
+
+
+class LogIndex:
+    """按等级与来源建立的倒排索引
+
+    每个等级/来源对应一个按 counter 升序的队列。条目写入缓冲区时追加到队尾，
+    被淘汰时从队首移除，因此维护开销为 O(1)，查询只需合并少量有序队列。
+    """
+
+    def __init__(self):
+        self.by_level: Dict[str, deque] = {}
+        self.by_source: Dict[str, deque] = {}
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Any]) -> "LogIndex":
+        index = cls()
+        for entry in entries:
+            index.add(entry)
+        return index
+
+    def add(self, entry: Any) -> None:
+        self._postings(self.by_level, entry.level).append(entry.counter)
+        self._postings(self.by_source, entry.source).append(entry.counter)
+
+    def remove(self, entry: Any) -> None:
+        """移除被淘汰的条目（必然是各自队列中最旧的一条）"""
+        for table, key in ((self.by_level, entry.level), (self.by_source, entry.source)):
+            postings = table.get(key)
+            if postings and postings[0] == entry.counter:
+                postings.popleft()
+                if not postings:
+                    del table[key]
+
+    @staticmethod
+    def _postings(table: Dict[str, deque], key: str) -> deque:
+        postings = table.get(key)
+        if postings is None:
+            postings = table[key] = deque()
+        return postings
+
+    def counters(
+        self, levels: Iterable[str] = (), sources: Iterable[str] = ()
+    ) -> Optional[List[int]]:
+        """返回满足等级、来源条件的 counter（升序）
+
+        同一维度内取并集，不同维度取交集；两个维度都未指定时返回 None，表示不过滤。
+        """
+        result = None
+        for table, wanted in ((self.by_level, levels), (self.by_source, sources)):
+            wanted = list(wanted)
+            if not wanted:
+                continue
+            keys = [key for key in wanted if key in table]
+            if len(keys) == 1:
+                merged = list(table[keys[0]])
+            else:
+                merged = sorted(counter for key in keys for counter in table[key])
+            if result is None:
+                result = merged
+            else:
+                allowed = set(merged)
+                result = [counter for counter in result if counter in allowed]
+        return result
+
+    def facets(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "levels": {key: len(value) for key, value in self.by_level.items()},
+            "sources": {key: len(value) for key, value in self.by_source.items()},
+        }
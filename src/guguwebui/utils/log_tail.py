@@ -0,0 +1,203 @@
+"""
+日志文件追踪
+兼容模式下持续读取日志文件新增内容：保持文件句柄打开，只读取追加的字节，
+通过 inode 变化识别轮转；Linux 上使用 inotify 等待文件变化，其他平台回退为定时轮询。
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Iterator, List
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_EVENT_HEADER = struct.Struct("iIII")
+# 单次从日志文件读取的最大字节数
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class FileTailer:
+    """单个日志文件的增量读取器"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = None
+        self._identity = None  # (st_dev, st_ino)
+        self._partial = b""
+        self.position = 0
+        self.rotations = 0
+
+    def _open(self) -> bool:
+        try:
+            self._file = open(self.path, "rb")
+            st = os.fstat(self._file.fileno())
+        except OSError:
+            self._file = None
+            return False
+        self._identity = (st.st_dev, st.st_ino)
+        self.position = 0
+        self._partial = b""
+        return True
+
+    def close(self) -> None:
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+        self._file = None
+        self._identity = None
+
+    def _drain(self, final: bool = False) -> Iterator[str]:
+        """按块读取到文件末尾并逐行产出；final 为 True 时末尾没有换行的半行也输出"""
+        while True:
+            data = self._file.read(READ_CHUNK_SIZE)
+            if not data:
+                break
+            self.position += len(data)
+            parts = (self._partial + data).split(b"\n")
+            self._partial = parts.pop()
+            for part in parts:
+                yield self._decode(part)
+        if final and self._partial:
+            # 旧文件已不会再写入
+            yield self._decode(self._partial)
+            self._partial = b""
+
+    @staticmethod
+    def _decode(part: bytes) -> str:
+        return part.decode("utf-8", errors="ignore").rstrip("\r")
+
+    def read_lines(self) -> Iterator[str]:
+        """逐行产出自上次读取以来新增的完整行，末尾未写完的半行留到下次
+
+        每次最多读入 READ_CHUNK_SIZE 字节，首次打开较大的日志文件或短时间大量写入时内存占用仍有上限。
+        """
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            st = None
+
+        if self._file is not None and st is not None and (st.st_dev, st.st_ino) != self._identity:
+            # 文件被轮转：读完旧句柄剩余内容后切换到新文件
+            yield from self._drain(final=True)
+            self.close()
+            self.rotations += 1
+
+        if self._file is None:
+            if st is None or not self._open():
+                return
+        elif st is not None and st.st_size < self.position:
+            # 同一文件被截断，从头读取
+            self._file.seek(0)
+            self.position = 0
+            self._partial = b""
+
+        yield from self._drain()
+
+
+class _InotifyLib:
+    _libc = None
+
+    @classmethod
+    def load(cls):
+        if cls._libc is None:
+            libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+            cls._libc = libc
+        return cls._libc
+
+
+class InotifyWaiter:
+    """基于 inotify 的文件变化等待器，监听日志所在目录以便感知文件重建与轮转"""
+
+    backend = "inotify"
+
+    def __init__(self, paths: List[Path]):
+        libc = _InotifyLib.load()
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._fd = fd
+        self._names = {Path(p).name for p in paths}
+        watched = 0
+        for directory in {Path(p).resolve().parent for p in paths}:
+            if not directory.is_dir():
+                continue
+            wd = libc.inotify_add_watch(fd, os.fsencode(str(directory)), _WATCH_MASK)
+            if wd >= 0:
+                watched += 1
+        if not watched:
+            os.close(fd)
+            raise OSError(errno.ENOENT, "no log directory to watch")
+
+    def wait(self, timeout: float) -> bool:
+        """阻塞直到相关文件发生变化或超时，返回是否有相关事件"""
+        try:
+            readable, _, _ = select.select([self._fd], [], [], timeout)
+        except (OSError, ValueError):
+            return False
+        if not readable:
+            return False
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except OSError:
+            return False
+        pos = 0
+        relevant = False
+        while pos + _EVENT_HEADER.size <= len(data):
+            _, _, _, name_len = _EVENT_HEADER.unpack_from(data, pos)
+            pos += _EVENT_HEADER.size
+            name = data[pos:pos + name_len].split(b"\0", 1)[0]
+            pos += name_len
+            if os.fsdecode(name) in self._names:
+                relevant = True
+        return relevant
+
+    def close(self) -> None:
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+
+class PollingWaiter:
+    """回退方案：固定间隔轮询"""
+
+    backend = "polling"
+
+    def __init__(self, interval: float):
+        self.interval = interval
+
+    def wait(self, timeout: float) -> bool:
+        time.sleep(min(timeout, self.interval))
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+def create_waiter(paths: List[Path], interval: float):
+    """优先创建 inotify 等待器，不可用时回退为轮询"""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWaiter(paths)
+        except (OSError, AttributeError):
+            pass
+    return PollingWaiter(interval)
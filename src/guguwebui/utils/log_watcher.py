@@ -4,9 +4,15 @@ import re
 import sys
 import threading
 import time
+from collections import deque
 from pathlib import Path
 
-from guguwebui.constant import DEFALUT_CONFIG, SERVER_PATH
+from guguwebui.constant import DEFALUT_CONFIG, LOG_HISTORY_PATH, SERVER_PATH
+from guguwebui.utils.event_stream import SubscriptionHub
+from guguwebui.utils.log_format import LogEntry, clean_color_codes, encode_compact
+from guguwebui.utils.log_history import LogHistory
+from guguwebui.utils.log_store import DedupWindow, LogIndex, LogRingBuffer
+from guguwebui.utils.log_tail import FileTailer, create_waiter
 from guguwebui.utils.types import StateType
 
 MCDR_FILE_LOG_PATTERN = re.compile(
@@ -16,24 +22,19 @@ MC_FILE_LOG_PATTERN = re.compile(
     r"^\[(?P<time>\d{2}:\d{2}:\d{2})\]\s+\[(?P<context>[^\]]+)\]:\s*(?P<message>.*)$"
 )
 
-
-def clean_color_codes(text):
-    """清理 Minecraft 颜色代码和 ANSI 转义序列"""
-    # 清理 Minecraft 颜色代码（§ 后面跟着一个字符）
-    text = re.sub(r"§[0-9a-fk-or]", "", text)
-
-    # 清理 ANSI 颜色代码
-    ansi_escape = re.compile(r"\x1B(?:[@-Z\\-_]|\[[0-?]*[ -/]*[@-~])")
-    text = ansi_escape.sub("", text)
-
-    # 清理类似 [37m, [2m, [0m 等形式的 ANSI 代码
-    text = re.sub(r"\[\d+m", "", text)
-
-    # 清理其他形式的ANSI代码，包括组合形式如[37m[2m
-    text = re.sub(r"\[\d+(?:;\d+)*m", "", text)
-    text = re.sub(r"\[0m", "", text)
-
-    return text
+# 内存中保留的日志条数（默认值，可通过 log_buffer_size 配置）
+LOG_BUFFER_CAPACITY = 5000
+# 批量写入暂存队列上限，超出时丢弃新日志并计数
+LOG_INGEST_MAX_PENDING = 50000
+# 日志搜索：单次最多扫描的磁盘历史条数、正则长度上限
+LOG_SEARCH_HISTORY_SCAN = 50000
+LOG_SEARCH_MAX_PATTERN = 256
+_LEVEL_ALIASES = {"WARN": "WARNING", "WARNING": "WARN", "FATAL": "CRITICAL", "CRITICAL": "FATAL"}
+# 去重窗口默认值（可通过 log_dedup_window_ms / log_dedup_max_entries 配置）
+LOG_DEDUP_WINDOW_MS = 1000
+LOG_DEDUP_MAX_ENTRIES = 20000
+# 共享状态结构版本；结构变化时递增，插件重载后据此迁移旧状态
+_STATE_VERSION = 5
 
 
 class LogHandler(logging.Handler):
@@ -68,8 +69,10 @@ class MCServerLogCapture(threading.Thread):
         self.log_watcher = log_watcher
 
     def stop(self):
-        """停止捕获线程"""
+        """停止捕获线程并等待其退出"""
         self.running = False
+        if self.is_alive() and self is not threading.current_thread():
+            self.join(timeout=1)
 
     def on_info(self, server, info):
         """处理新收到的服务器信息"""
@@ -128,6 +131,11 @@ class StdoutInterceptor:
         self.enabled = False
         sys.stdout = self.original_stdout
         sys.stderr = self.original_stderr
+        # 把未以换行结尾的残留输出也登记下来，避免停止时丢失最后一行
+        with self.lock:
+            rest, self.buffer = self.buffer, ""
+        if rest.strip():
+            self.log_watcher._add_raw_log(message=rest, level="INFO", source="STDOUT")
 
     def process_output(self, message):
         with self.lock:
@@ -142,9 +150,106 @@ class StdoutInterceptor:
                 self.buffer = lines[-1]
 
 
+class LogIngestor(threading.Thread):
+    """批量写入线程
+
+    各捕获来源只向暂存队列追加（deque.append 无需加锁），由本线程成批取出，
+    每批只获取一次共享锁完成去重、编号和写入，避免启动时的日志洪峰让
+    MCDR 自身的日志线程排队等待 WebUI。
+    """
+
+    BATCH_SIZE = 512
+
+    def __init__(self, log_watcher, max_pending: int = LOG_INGEST_MAX_PENDING):
+        super().__init__(name="Log-Ingest")
+        self.daemon = True
+        self.running = True
+        self.log_watcher = log_watcher
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._wakeup = threading.Event()
+        # 指标（仅供诊断，允许轻微的并发计数误差）
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.batches = 0
+        self.max_batch = 0
+        self.peak_depth = 0
+
+    def submit(self, item) -> bool:
+        """由生产者调用，队列满时丢弃并计数，从不阻塞
+
+        写入线程停止后仍有迟到的生产者（如 MCDR 日志处理器）时改为同步写入，
+        保证这些日志不会滞留在无人消费的队列里。
+        """
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return False
+        self._pending.append(item)
+        self.enqueued += 1
+        if not self.running:
+            # 先入队再检查状态：与 stop() 的最终排空交错时也不会漏掉
+            self.drain()
+        elif not self._wakeup.is_set():
+            self._wakeup.set()
+        return True
+
+    def stop(self):
+        """停止写入线程并排空暂存队列；应在各生产者停止之后调用"""
+        self.running = False
+        self._wakeup.set()
+        if self.is_alive():
+            self.join(timeout=2)
+        self.drain()
+
+    def drain(self):
+        pending = self._pending
+        depth = len(pending)
+        if depth > self.peak_depth:
+            self.peak_depth = depth
+        while pending:
+            batch = []
+            try:
+                while len(batch) < self.BATCH_SIZE:
+                    batch.append(pending.popleft())
+            except IndexError:
+                pass
+            # 先求值再累加，避免与停止后的同步写入交错时覆盖对方的计数
+            written = self.log_watcher._ingest_batch(batch)
+            self.written += written
+            self.batches += 1
+            if len(batch) > self.max_batch:
+                self.max_batch = len(batch)
+
+    def get_stats(self):
+        return {
+            "depth": len(self._pending),
+            "max_pending": self.max_pending,
+            "peak_depth": self.peak_depth,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "max_batch": self.max_batch,
+        }
+
+    def run(self):
+        while self.running:
+            self._wakeup.wait(0.5)
+            self._wakeup.clear()
+            try:
+                self.drain()
+            except Exception:
+                # 单批写入失败不应终止整个日志捕获
+                pass
+
+
 class FileLogCapture(threading.Thread):
     """兼容模式：通过读取日志文件捕获日志。"""
 
+    # inotify 模式下无事件时的兜底复查间隔（覆盖日志目录稍后才创建等情况）
+    RESCAN_INTERVAL = 5.0
+
     def __init__(self, log_watcher, mcdr_log_path: Path, mc_log_path: Path, interval: float = 1.0):
         super().__init__(name="File-Log-Capture")
         self.daemon = True
@@ -153,34 +258,44 @@ class FileLogCapture(threading.Thread):
         self.mcdr_log_path = mcdr_log_path
         self.mc_log_path = mc_log_path
         self.interval = interval
-        self._positions = {"mcdr": 0, "mc": 0}
+        self._tailers = {
+            "MCDR": FileTailer(mcdr_log_path),
+            "Server": FileTailer(mc_log_path),
+        }
+        self._waiter = create_waiter([mcdr_log_path, mc_log_path], interval)
+        self.backend = self._waiter.backend
 
     def stop(self):
+        """停止读取并等待线程退出，确保之后不会再有新的日志提交"""
         self.running = False
+        if self.is_alive() and self is not threading.current_thread():
+            # 等待器单次最多阻塞 interval 秒，多留一点余量给正在进行的读取
+            self.join(timeout=self.interval + 1)
 
-    def _read_new_lines(self, file_path: Path, source: str):
-        if not file_path.exists() or not file_path.is_file():
-            return
-
-        file_key = "mcdr" if source == "MCDR" else "mc"
-        last_position = self._positions[file_key]
+    def _read_new_lines(self, source: str):
         try:
-            file_size = file_path.stat().st_size
-            if file_size < last_position:
-                # 文件轮转或截断后，从头读取
-                last_position = 0
-
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
-                file.seek(last_position)
-                for raw_line in file:
-                    line = raw_line.rstrip("\r\n")
-                    if line.strip():
-                        self._parse_and_add_line(line, source)
-                self._positions[file_key] = file.tell()
+            for line in self._tailers[source].read_lines():
+                if not self.running:
+                    break
+                if line.strip():
+                    self._parse_and_add_line(line, source)
         except Exception:
             # 兼容模式是降级路径，不应因读取异常影响主流程
             return
 
+    def get_status(self):
+        return {
+            "backend": self.backend,
+            "files": {
+                source: {
+                    "path": str(tailer.path),
+                    "position": tailer.position,
+                    "rotations": tailer.rotations,
+                }
+                for source, tailer in self._tailers.items()
+            },
+        }
+
     def _parse_and_add_line(self, line: str, source: str):
         if source == "MCDR":
             parsed = self._parse_mcdr_line(line)
@@ -299,10 +414,19 @@ class FileLogCapture(threading.Thread):
         }
 
     def run(self):
-        while self.running:
-            self._read_new_lines(self.mcdr_log_path, "MCDR")
-            self._read_new_lines(self.mc_log_path, "Server")
-            time.sleep(self.interval)
+        last_scan = 0.0
+        try:
+            while self.running:
+                changed = self._waiter.wait(self.interval)
+                now = time.monotonic()
+                if changed or now - last_scan >= self.RESCAN_INTERVAL:
+                    last_scan = now
+                    self._read_new_lines("MCDR")
+                    self._read_new_lines("Server")
+        finally:
+            self._waiter.close()
+            for tailer in self._tailers.values():
+                tailer.close()
 
 
 class LogWatcher:
@@ -311,14 +435,35 @@ class LogWatcher:
     def _get_shared_state() -> StateType:
         if not hasattr(sys, "_guguwebui_log_state"):
             sys._guguwebui_log_state = {
-                "logs": [],  # 存储原始字典: {timestamp, level, source, message, counter}
+                "version": _STATE_VERSION,
+                "logs": LogRingBuffer(LOG_BUFFER_CAPACITY),  # 存储 LogEntry
                 "counter": 0,
-                "hashes": set(),  # 存储 message 的哈希，用于简单去重
+                "dedup": DedupWindow(LOG_DEDUP_WINDOW_MS / 1000, LOG_DEDUP_MAX_ENTRIES),
+                "index": LogIndex(),  # 按等级/来源的倒排索引，供日志搜索使用
                 "lock": threading.Lock(),
                 "intercepted": False,
                 "original_emit": None,
             }
-        return sys._guguwebui_log_state
+        state = sys._guguwebui_log_state
+        if state.get("version") != _STATE_VERSION:
+            # 旧版本插件留下的状态（列表或旧缓冲区类、字典条目），按新结构重建，保留已有日志
+            with state["lock"]:
+                if state.get("version") != _STATE_VERSION:
+                    state["logs"] = LogRingBuffer.from_entries(
+                        (
+                            LogEntry.from_dict(entry) if isinstance(entry, dict) else entry
+                            for entry in state["logs"]
+                        ),
+                        LOG_BUFFER_CAPACITY,
+                    )
+                    if "dedup" not in state:
+                        state["dedup"] = DedupWindow(
+                            LOG_DEDUP_WINDOW_MS / 1000, LOG_DEDUP_MAX_ENTRIES
+                        )
+                    state["index"] = LogIndex.from_entries(state["logs"])
+                    state.pop("hashes", None)
+                    state["version"] = _STATE_VERSION
+        return state
 
     def __init__(self, server_interface=None, compat_mode=False):
         self.server_interface = server_interface
@@ -326,10 +471,21 @@ class LogWatcher:
         self._patterns = []
         self._result = {}
         self._watching = False
+        # 推送订阅（/api/server_logs/stream），每个连接一个有界队列
+        self.subscribers = SubscriptionHub(max_queue=1000)
 
         state = self._get_shared_state()
         self._shared_lock = state["lock"]
 
+        config = self._load_config()
+        self.history = self._create_history(config)
+        self._apply_buffer_capacity(config.get("log_buffer_size", LOG_BUFFER_CAPACITY))
+        self._apply_dedup_config(config)
+
+        # 所有捕获来源经由暂存队列批量写入共享存储
+        self.ingestor = LogIngestor(self)
+        self.ingestor.start()
+
         # 实例专用的处理器
         self.mcdr_log_handler = LogHandler(self)
         self.mc_log_capture = MCServerLogCapture(self)
@@ -337,7 +493,7 @@ class LogWatcher:
         self.file_log_capture = None
 
         if self.compat_mode:
-            mcdr_log_path, mc_log_path = self._resolve_log_paths()
+            mcdr_log_path, mc_log_path = self._resolve_log_paths(config)
             self.file_log_capture = FileLogCapture(self, mcdr_log_path, mc_log_path)
             self.file_log_capture.start()
         else:
@@ -346,7 +502,69 @@ class LogWatcher:
             self.stdout_interceptor.start_interception()
             self.mc_log_capture.start()
 
-    def _resolve_log_paths(self) -> tuple[Path, Path]:
+    def _load_config(self) -> dict:
+        if self.server_interface:
+            try:
+                return self.server_interface.load_config_simple(
+                    "config.json", DEFALUT_CONFIG, echo_in_console=False
+                )
+            except Exception:
+                pass
+        return dict(DEFALUT_CONFIG)
+
+    @staticmethod
+    def _create_history(config: dict):
+        """按配置创建磁盘日志历史，未启用时返回 None"""
+        if not config.get("log_history_enabled", False):
+            return None
+        try:
+            history = LogHistory(
+                LOG_HISTORY_PATH,
+                segment_max_bytes=int(config.get("log_history_segment_mb", 8)) * 1024 * 1024,
+                segment_max_seconds=int(config.get("log_history_segment_hours", 24)) * 3600,
+                max_total_bytes=int(config.get("log_history_max_mb", 256)) * 1024 * 1024,
+                retention_seconds=int(config.get("log_history_retention_days", 7)) * 86400,
+            )
+        except Exception:
+            return None
+
+        state = LogWatcher._get_shared_state()
+        with state["lock"]:
+            # 进程重启后内存为空，counter 从磁盘历史末尾继续，保证跨重启单调递增
+            if not len(state["logs"]) and state["counter"] < history.last_counter:
+                state["counter"] = history.last_counter
+        history.start()
+        return history
+
+    def _apply_buffer_capacity(self, capacity):
+        """按配置调整内存缓冲区容量，缩容时被挤出的条目转入磁盘历史"""
+        try:
+            capacity = max(100, int(capacity))
+        except (TypeError, ValueError):
+            capacity = LOG_BUFFER_CAPACITY
+        state = self._get_shared_state()
+        with state["lock"]:
+            if state["logs"].capacity == capacity:
+                return
+            resized = LogRingBuffer(capacity)
+            for entry in state["logs"]:
+                evicted = resized.append(entry)
+                if evicted is not None and self.history is not None:
+                    self.history.append(evicted)
+            state["logs"] = resized
+            state["index"] = LogIndex.from_entries(resized)
+
+    def _apply_dedup_config(self, config: dict):
+        try:
+            window_ms = max(0, int(config.get("log_dedup_window_ms", LOG_DEDUP_WINDOW_MS)))
+            max_entries = max(1, int(config.get("log_dedup_max_entries", LOG_DEDUP_MAX_ENTRIES)))
+        except (TypeError, ValueError):
+            window_ms, max_entries = LOG_DEDUP_WINDOW_MS, LOG_DEDUP_MAX_ENTRIES
+        state = self._get_shared_state()
+        with state["lock"]:
+            state["dedup"].configure(window_ms / 1000, max_entries)
+
+    def _resolve_log_paths(self, config: dict) -> tuple[Path, Path]:
         mcdr_candidates = [
             Path("./logs/MCDR.log"),
             Path("./MCDR.log"),
@@ -355,16 +573,9 @@ class LogWatcher:
             SERVER_PATH / "logs" / "latest.log",
             Path("./server/logs/latest.log"),
         ]
-        if self.server_interface:
-            try:
-                config = self.server_interface.load_config_simple(
-                    "config.json", DEFALUT_CONFIG, echo_in_console=False
-                )
-                server_logs_path = config.get("server_logs_path", "")
-                if isinstance(server_logs_path, str) and server_logs_path.strip():
-                    mc_candidates.insert(0, Path(server_logs_path.strip()))
-            except Exception:
-                pass
+        server_logs_path = config.get("server_logs_path", "")
+        if isinstance(server_logs_path, str) and server_logs_path.strip():
+            mc_candidates.insert(0, Path(server_logs_path.strip()))
 
         mcdr_log_path = next((path for path in mcdr_candidates if path.exists()), mcdr_candidates[0])
         mc_log_path = next((path for path in mc_candidates if path.exists()), mc_candidates[0])
@@ -405,107 +616,262 @@ class LogWatcher:
         logging.StreamHandler.emit = intercepted_emit
 
     def _add_raw_log(self, message, level="INFO", source="Unknown", timestamp=None):
-        """添加原始日志数据，带去重和容量限制"""
+        """登记一条原始日志；去重和写入由 LogIngestor 批量完成，调用方不会等待共享锁"""
         if not message or not message.strip():
             return False
+        return self.ingestor.submit((message, level, source, timestamp or time.time()))
 
-        message = clean_color_codes(message)
-        # 简单的基于内容和时间的去重（1秒内相同的消息视为重复）
-        now = timestamp or time.time()
-        log_hash = hash((message, int(now)))
+    def _ingest_batch(self, batch):
+        """将一批原始日志写入共享存储，带去重和容量限制，返回实际写入条数"""
+        prepared = []
+        for message, level, source, now in batch:
+            message = clean_color_codes(message)
+            prepared.append((hash(message), message, level, str(source), now))
 
+        published = []
         state = self._get_shared_state()
         with state["lock"]:
-            if log_hash in state["hashes"]:
-                return False
-
-            state["hashes"].add(log_hash)
-            if len(state["hashes"]) > 10000:
-                state["hashes"].clear()
+            # 同一行可能同时经由 MCDR 事件、logging 与标准输出拦截到达，按内容在时间窗口内去重
+            seen = state["dedup"].seen
+            logs = state["logs"]
+            index = state["index"]
+            for log_hash, message, level, source, now in prepared:
+                if seen(log_hash, now):
+                    continue
+
+                state["counter"] += 1
+                log_entry = LogEntry(state["counter"], now, level, source, message)
+                evicted = logs.append(log_entry)
+                index.add(log_entry)
+                if evicted is not None:
+                    index.remove(evicted)
+                    if self.history is not None:
+                        self.history.append(evicted)
+                published.append((len(logs), log_entry))
+
+        # 在锁外推送给订阅者，格式化交由消费方完成
+        self.subscribers.publish(published)
+        return len(published)
 
-            state["counter"] += 1
-            log_entry = {
-                "counter": state["counter"],
-                "timestamp": now,
-                "level": level,
-                "source": str(source),
-                "message": message,
-            }
-            state["logs"].append(log_entry)
+    @staticmethod
+    def to_api_entry(entry, line_number):
+        """转换为接口返回的单条日志结构（文本在首次读取时生成并缓存于条目上）"""
+        return {
+            "line_number": line_number,
+            "counter": entry.counter,
+            "timestamp": entry.time_str,
+            "content": entry.content,
+            "source": "all",
+            "is_command": entry.is_command,
+        }
 
-            if len(state["logs"]) > 5000:
-                state["logs"].pop(0)
-            return True
+    def _encode_logs(self, entries, first_line, compact):
+        """按请求的格式编码日志列表：默认为逐条字典，compact 为列式结构"""
+        if compact:
+            return encode_compact(entries, first_line)
+        return [
+            self.to_api_entry(entry, first_line + i if first_line is not None else None)
+            for i, entry in enumerate(entries)
+        ]
 
-    @staticmethod
-    def _format_log_entry(entry):
-        """在返回时动态格式化日志"""
-        dt = datetime.datetime.fromtimestamp(entry["timestamp"])
-        ts_str = dt.strftime("%Y-%m-%d %H:%M:%S")
-        # 构建类似 MCDR 的标准格式
-        return f"[#{entry['counter']}] [{ts_str}] [{entry['source']}/{entry['level']}] {entry['message']}"
-
-    def get_merged_logs(self, max_lines=500):
+    def get_merged_logs(self, max_lines=500, compact=False):
         state = self._get_shared_state()
+        # 锁内只取切片，格式化在锁外完成
         with state["lock"]:
             total_lines = len(state["logs"])
             start_idx = max(0, total_lines - max_lines)
+            entries = state["logs"].slice(start_idx, total_lines)
 
-            log_entries = []
-            for i in range(start_idx, total_lines):
-                entry = state["logs"][i]
-                formatted_content = self._format_log_entry(entry)
-
-                log_entries.append(
-                    {
-                        "line_number": i + 1,
-                        "counter": entry["counter"],
-                        "timestamp": datetime.datetime.fromtimestamp(
-                            entry["timestamp"]
-                        ).strftime("%Y-%m-%d %H:%M:%S"),
-                        "content": formatted_content + "\n",
-                        "source": "all",
-                        "is_command": "InfoSource.CONSOLE" in entry["source"]
-                        and "!!" in entry["message"],
-                    }
-                )
+        return {
+            "logs": self._encode_logs(entries, start_idx + 1, compact),
+            "total_lines": total_lines,
+            "start_line": start_idx,
+            "end_line": total_lines,
+        }
 
-            return {
-                "logs": log_entries,
-                "total_lines": total_lines,
-                "start_line": start_idx,
-                "end_line": total_lines,
-            }
+    def get_logs_since_counter(self, last_counter=0, max_lines=100, compact=False):
+        state = self._get_shared_state()
+        with state["lock"]:
+            # counter 在缓冲区内连续，起始位置直接由下标换算得到
+            start_idx, entries = state["logs"].since_counter(last_counter, max_lines)
+            total_lines = len(state["logs"])
+
+        return {
+            "logs": self._encode_logs(entries, start_idx + 1, compact),
+            "total_lines": total_lines,
+            "last_counter": entries[-1].counter if entries else last_counter,
+            "new_logs_count": len(entries),
+        }
 
-    def get_logs_since_counter(self, last_counter=0, max_lines=100):
+    def get_logs_before_counter(self, before_counter, max_lines=100, compact=False):
+        """向前翻页：返回 counter 小于 before_counter 的最近 max_lines 条，内存不足部分从磁盘历史补齐"""
         state = self._get_shared_state()
         with state["lock"]:
-            new_logs = []
-            for i, entry in enumerate(state["logs"]):
-                if entry["counter"] > last_counter:
-                    formatted_content = self._format_log_entry(entry)
-                    new_logs.append(
-                        {
-                            "line_number": i + 1,
-                            "counter": entry["counter"],
-                            "timestamp": datetime.datetime.fromtimestamp(
-                                entry["timestamp"]
-                            ).strftime("%Y-%m-%d %H:%M:%S"),
-                            "content": formatted_content + "\n",
-                            "source": "all",
-                            "is_command": "InfoSource.CONSOLE" in entry["source"]
-                            and "!!" in entry["message"],
-                        }
-                    )
-                    if len(new_logs) >= max_lines:
-                        break
+            logs = state["logs"]
+            stop = min(len(logs), max(0, logs.index_of_counter(before_counter)))
+            start = max(0, stop - max_lines)
+            entries = logs.slice(start, stop)
+            total_lines = len(logs)
+            first_in_memory = logs.first_counter if len(logs) else before_counter
+
+        upper = entries[0].counter if entries else min(before_counter, first_in_memory)
+        older = []
+        remaining = max_lines - len(entries)
+        if remaining > 0 and self.history is not None:
+            older = self.history.read_before(upper, remaining)
+            if older:
+                upper = older[0].counter
+
+        # 磁盘历史中的条目没有缓冲区行号
+        if compact:
+            encoded = encode_compact(older + entries, None if older else start + 1)
+        else:
+            encoded = [self.to_api_entry(entry, None) for entry in older]
+            encoded += self._encode_logs(entries, start + 1, False)
+        return {
+            "logs": encoded,
+            "total_lines": total_lines,
+            "has_more": self.history is not None and self.history.has_before(upper),
+        }
 
-            return {
-                "logs": new_logs,
-                "total_lines": len(state["logs"]),
-                "last_counter": new_logs[-1]["counter"] if new_logs else last_counter,
-                "new_logs_count": len(new_logs),
+    def search_logs(
+        self,
+        levels=None,
+        sources=None,
+        query=None,
+        use_regex=False,
+        since=None,
+        until=None,
+        before_counter=None,
+        limit=200,
+    ):
+        """按等级、来源、文本与时间范围搜索日志，结果按 counter 升序
+
+        等级与来源先经由倒排索引缩小候选范围；内存中不足 limit 条时继续向前扫描磁盘历史，
+        单次最多扫描 LOG_SEARCH_HISTORY_SCAN 条。正则无效时抛出 re.error。
+        """
+        matcher = self._build_matcher(query, use_regex)
+        wanted_levels = self._normalize_levels(levels or [])
+        wanted_sources = {source.lower() for source in sources or []}
+
+        state = self._get_shared_state()
+        with state["lock"]:
+            logs = state["logs"]
+            index = state["index"]
+            level_keys = [key for key in index.by_level if key.upper() in wanted_levels]
+            source_keys = [key for key in index.by_source if key.lower() in wanted_sources]
+            if (wanted_levels and not level_keys) or (wanted_sources and not source_keys):
+                candidates = []
+            else:
+                candidates = index.counters(level_keys, source_keys)
+            entries = logs.slice(0, len(logs))
+            first_counter = logs.first_counter if entries else state["counter"] + 1
+            facets = index.facets()
+
+        upper = before_counter if before_counter is not None else float("inf")
+
+        def accept(entry):
+            if since is not None and entry.timestamp < since:
+                return False
+            if until is not None and entry.timestamp > until:
+                return False
+            return matcher is None or bool(matcher(entry.message))
+
+        # 倒序收集，便于 limit 截断时保留最新的结果
+        results = []
+        if candidates is None:
+            ordered = (entry for entry in reversed(entries) if entry.counter < upper)
+        else:
+            ordered = (
+                entries[counter - first_counter]
+                for counter in reversed(candidates)
+                if counter < upper and 0 <= counter - first_counter < len(entries)
+            )
+        for entry in ordered:
+            if accept(entry):
+                results.append((entry, entry.counter - first_counter + 1))
+                if len(results) >= limit:
+                    break
+
+        has_more = len(results) >= limit
+        cursor = min(upper, first_counter)
+        if not has_more and self.history is not None:
+            has_more = self._search_history(
+                results, cursor, limit, wanted_levels, wanted_sources, accept, since
+            )
+
+        results.reverse()
+        return {
+            "logs": [self.to_api_entry(entry, line_number) for entry, line_number in results],
+            "next_before": results[0][0].counter if results and has_more else None,
+            "has_more": has_more,
+            "facets": facets,
+        }
+
+    def _search_history(self, results, cursor, limit, wanted_levels, wanted_sources, accept, since):
+        """向前扫描磁盘历史补足结果，返回是否还有未扫描的更早日志"""
+        scanned = 0
+        while self.history.has_before(cursor):
+            if scanned >= LOG_SEARCH_HISTORY_SCAN:
+                return True
+            chunk = self.history.read_before(cursor, 1000)
+            if not chunk:
+                return False
+            scanned += len(chunk)
+            for entry in reversed(chunk):
+                if wanted_levels and entry.level.upper() not in wanted_levels:
+                    continue
+                if wanted_sources and entry.source.lower() not in wanted_sources:
+                    continue
+                if accept(entry):
+                    results.append((entry, None))
+                    if len(results) >= limit:
+                        return True
+            cursor = chunk[0].counter
+            if since is not None and chunk[-1].timestamp < since:
+                # 更早的分段只会更旧
+                return False
+        return False
+
+    @staticmethod
+    def _normalize_levels(levels):
+        wanted = {level.upper() for level in levels if level}
+        return wanted | {_LEVEL_ALIASES[level] for level in wanted if level in _LEVEL_ALIASES}
+
+    @staticmethod
+    def _build_matcher(query, use_regex):
+        if not query:
+            return None
+        if use_regex:
+            if len(query) > LOG_SEARCH_MAX_PATTERN:
+                raise re.error("pattern too long")
+            return re.compile(query, re.IGNORECASE).search
+        needle = query.lower()
+        return lambda text: needle in text.lower()
+
+    def get_capture_status(self):
+        """日志捕获诊断信息：捕获方式、文件追踪后端、写入队列、去重、缓冲区与磁盘历史状态"""
+        state = self._get_shared_state()
+        with state["lock"]:
+            buffer = {
+                "size": len(state["logs"]),
+                "capacity": state["logs"].capacity,
+                "last_counter": state["counter"],
             }
+            dedup = state["dedup"].stats()
+        status = {
+            "mode": "compat" if self.compat_mode else "intercept",
+            "tail": self.file_log_capture.get_status() if self.file_log_capture else None,
+            "buffer": buffer,
+            "ingest": self.ingestor.get_stats(),
+            "dedup": dedup,
+            "history": self.history.stats() if self.history is not None else None,
+        }
+        return status
+
+    def get_last_counter(self):
+        """当前最新日志的计数器"""
+        return self._get_shared_state()["counter"]
 
     def on_mcdr_info(self, server, info):
         if self.compat_mode:
@@ -534,6 +900,20 @@ class LogWatcher:
         source = getattr(info, "source", "Server")
         self._add_raw_log(message=str(content), level="INFO", source=str(source))
 
+    def _stop_history(self):
+        """停止磁盘历史写入，并把仍在内存中的日志一并落盘（重复部分按 counter 自动跳过）"""
+        if self.history is None:
+            return
+        state = self._get_shared_state()
+        with state["lock"]:
+            for entry in state["logs"]:
+                self.history.append(entry)
+        try:
+            self.history.stop()
+        except Exception:
+            pass
+        self.history = None
+
     def _setup_log_capture(self):
         """手动触发 MCDR 日志钩子"""
         if self.compat_mode:
@@ -552,8 +932,13 @@ class LogWatcher:
         if self.compat_mode:
             if self.file_log_capture:
                 self.file_log_capture.stop()
-            return
+        else:
+            self._stop_interception()
+        # 生产者全部停止后再排空暂存队列，最后把内存日志落盘
+        self.ingestor.stop()
+        self._stop_history()
 
+    def _stop_interception(self):
         self.stdout_interceptor.stop_interception()
         self.mc_log_capture.stop()
         state = self._get_shared_state()
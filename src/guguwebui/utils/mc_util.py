@@ -1,6 +1,9 @@
 import asyncio
 import json
 import os
+import threading
+import time
+import weakref
 from pathlib import Path
 
 import aiohttp
@@ -458,8 +461,8 @@ def send_message_to_webui(server_interface, source: str, message, message_type:
         server_interface.broadcast(rtext_message)
 
         try:
-            from .chat_logger import ChatLogger
-            chat_logger = ChatLogger()
+            from .chat_logger import get_chat_logger
+            chat_logger = get_chat_logger()
             final_rtext_data = rtext_data if rtext_data else (
                 rtext_message.to_json_object() if hasattr(rtext_message, 'to_json_object') else None)
             chat_logger.add_message(source, processed_message, rtext_data=final_rtext_data, message_type=2,
@@ -513,32 +516,124 @@ async def get_minecraft_path_async(server_interface=None, path_type="working_dir
         return "server"
 
 
+# --- Player UUID Lookup ---
+
+# Mojang API 查询结果缓存时间（秒）：查到的UUID、查无此人、请求失败
+MOJANG_UUID_TTL = 6 * 3600
+MOJANG_NOT_FOUND_TTL = 600
+MOJANG_ERROR_TTL = 60
+_MOJANG_CACHE_MAX = 1024
+
+
+class _UserCacheIndex:
+    """usercache.json 的 玩家名→条目 索引
+
+    只在文件路径、mtime 或大小变化时重新解析；其余调用只做一次 stat 和字典查找。
+    """
+
+    def __init__(self):
+        self._stamp = None
+        self._entries = {}
+
+    async def lookup(self, usercache_path: Path, player_name):
+        try:
+            st = await anyio.Path(usercache_path).stat()
+        except OSError:
+            self._stamp = None
+            self._entries = {}
+            return None
+        stamp = (str(usercache_path), st.st_mtime_ns, st.st_size)
+        if stamp != self._stamp:
+            async with await anyio.open_file(usercache_path, mode='r', encoding='utf-8') as f:
+                usercache_data = json.loads(await f.read())
+            entries = {}
+            for entry in usercache_data:
+                name = entry.get('name')
+                if name:
+                    # 与逐条扫描一致：同名时以文件中第一条为准
+                    entries.setdefault(name, entry)
+            # 整体替换，UUID 解析线程与事件循环并发读取时无需加锁
+            self._entries = entries
+            self._stamp = stamp
+        return self._entries.get(player_name)
+
+
+_usercache_index = _UserCacheIndex()
+# Mojang API 查询缓存：{玩家名: (UUID 或 None, 过期时间)}；Web 事件循环与 UUID 解析线程的事件循环都会写入，修改须持锁
+_mojang_cache = {}
+_mojang_cache_lock = threading.Lock()
+# 按事件循环复用的 Mojang API 会话（aiohttp 会话不能跨事件循环使用）
+_mojang_sessions = weakref.WeakKeyDictionary()
+
+
+def _get_mojang_session():
+    loop = asyncio.get_running_loop()
+    session = _mojang_sessions.get(loop)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=10))
+        _mojang_sessions[loop] = session
+    return session
+
+
+async def close_mojang_session():
+    """关闭当前事件循环上的 Mojang API 会话（事件循环结束前调用）"""
+    session = _mojang_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def _cache_mojang_result(player_name, uuid, ttl):
+    now = time.monotonic()
+    with _mojang_cache_lock:
+        if len(_mojang_cache) >= _MOJANG_CACHE_MAX:
+            for name in [n for n, (_, expires) in _mojang_cache.items() if expires <= now]:
+                _mojang_cache.pop(name, None)
+            if len(_mojang_cache) >= _MOJANG_CACHE_MAX:
+                _mojang_cache.pop(next(iter(_mojang_cache)), None)
+        _mojang_cache[player_name] = (uuid, now + ttl)
+
+
+async def _query_mojang_uuid(player_name, server_interface=None):
+    cached = _mojang_cache.get(player_name)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+
+    api_url = f"https://api.mojang.com/users/profiles/minecraft/{player_name}"
+    try:
+        async with _get_mojang_session().get(api_url) as response:
+            if response.status == 200:
+                data = await response.json()
+                uuid = data.get('id')
+                uuid = format_uuid(uuid) if uuid else None
+                _cache_mojang_result(player_name, uuid, MOJANG_UUID_TTL if uuid else MOJANG_NOT_FOUND_TTL)
+                return uuid
+            if response.status in (204, 404):
+                _cache_mojang_result(player_name, None, MOJANG_NOT_FOUND_TTL)
+                return None
+            _cache_mojang_result(player_name, None, MOJANG_ERROR_TTL)
+    except Exception as e:
+        _cache_mojang_result(player_name, None, MOJANG_ERROR_TTL)
+        if server_interface: server_interface.logger.debug(f"Mojang API查询失败: {e}")
+    return None
+
+
 async def get_player_uuid(player_name, server_interface=None, use_api=True):
-    """异步获取玩家UUID"""
+    """异步获取玩家UUID
+
+    先查 usercache.json 索引，未命中再查询 Mojang API（结果按 TTL 缓存，查无此人同样缓存）。
+    """
     try:
         try:
             usercache_path = Path(await get_minecraft_path_async(server_interface, "usercache"))
-            if await anyio.Path(usercache_path).exists():
-                async with await anyio.open_file(usercache_path, mode='r', encoding='utf-8') as f:
-                    usercache_data = json.loads(await f.read())
-                for entry in usercache_data:
-                    if entry.get('name') == player_name:
-                        uuid = entry.get('uuid')
-                        if uuid: return format_uuid(uuid)
+            entry = await _usercache_index.lookup(usercache_path, player_name)
+            if entry:
+                uuid = entry.get('uuid')
+                if uuid: return format_uuid(uuid)
         except Exception as e:
             if server_interface: server_interface.logger.debug(f"从usercache.json获取UUID失败: {e}")
 
         if use_api:
-            try:
-                api_url = f"https://api.mojang.com/users/profiles/minecraft/{player_name}"
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(api_url, timeout=10) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            uuid = data.get('id')
-                            if uuid: return format_uuid(uuid)
-            except Exception as e:
-                if server_interface: server_interface.logger.debug(f"Mojang API查询失败: {e}")
+            return await _query_mojang_uuid(player_name, server_interface)
         return None
     except Exception as e:
         if server_interface: server_interface.logger.error(f"获取玩家UUID时发生错误: {e}")
@@ -559,13 +654,9 @@ async def get_player_info(player_name, server_interface=None, include_uuid=True)
                 pass
         try:
             usercache_path = Path(await get_minecraft_path_async(server_interface, "usercache"))
-            if await anyio.Path(usercache_path).exists():
-                async with await anyio.open_file(usercache_path, mode='r', encoding='utf-8') as f:
-                    usercache_data = json.loads(await f.read())
-                for entry in usercache_data:
-                    if entry.get('name') == player_name:
-                        player_info['last_seen'] = entry.get('expiresOn')
-                        break
+            entry = await _usercache_index.lookup(usercache_path, player_name)
+            if entry:
+                player_info['last_seen'] = entry.get('expiresOn')
         except:
             pass
         return player_info
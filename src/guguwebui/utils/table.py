@@ -1,32 +1,44 @@
 # -*- coding: utf-8 -*-
 import asyncio
+import io
 import json
+import logging
 import os
+import threading
 from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
-import anyio
 from ruamel.yaml import YAML
 
 yaml = YAML()
 yaml.preserve_quotes = True
 
+logger = logging.getLogger(__name__)
+
 
 class Table:
     """A json/yml file reader with save function.
     It also can auto-save when first level for dict changes.
 
+    Files are written atomically (temp file + rename). In write-behind mode
+    ``save()`` serializes a snapshot on the calling thread and only marks the
+    table dirty; a timer writes the latest snapshot (with fsync) at most
+    ``write_behind_delay`` seconds later, so bursts of mutations cost one write.
+    Call ``close()`` on shutdown to flush pending changes.
+
     Args:
         path (str, Path): path for the config, will generate one if not exist
         default_content (Optional[dict]): default value when generating
         use_yaml (Optional[bool]): store it as yaml file
+        write_behind_delay (Optional[float]): seconds to defer writes, 0 writes synchronously
     """
 
     def __init__(
             self,
             path: str = "./default.json",
             default_content: dict = None,
-            use_yaml: bool = False
+            use_yaml: bool = False,
+            write_behind_delay: float = 0
     ) -> None:
         self.data: Any = None
         self.use_yaml = use_yaml
@@ -34,7 +46,18 @@ class Table:
         self.path = Path(self.path)
         self.default_content = default_content
         self._lock = asyncio.Lock()
+        # _state_lock guards the pending snapshot and timer, _write_lock serializes file writes
+        self._state_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending: Optional[str] = None
+        # a snapshot is kept only if it was started after the last one kept (pending or already written)
+        self._snapshot_seq = 0
+        self._pending_seq = 0
+        self._timer: Optional[threading.Timer] = None
+        self.write_behind_delay = 0.0
+        self.flush_count = 0
         self.load()
+        self.set_write_behind(write_behind_delay)
 
     def load(self) -> None:  # loading
         if os.path.isfile(self.path) and os.path.getsize(self.path) != 0:
@@ -47,29 +70,113 @@ class Table:
             self.data = self.default_content if self.default_content else {}
             self.save()
 
+    def set_write_behind(self, delay: float) -> None:
+        """Enable write-behind with the given delay in seconds, or disable it with 0 (flushes first)"""
+        delay = max(float(delay or 0), 0.0)
+        if not delay:
+            self.flush()
+        self.write_behind_delay = delay
+
+    @property
+    def dirty(self) -> bool:
+        return self._pending is not None
+
     def save(self) -> None:  # synchronous saving for compatibility
-        self.path.parents[0].mkdir(parents=True, exist_ok=True)
+        if self.write_behind_delay:
+            self.mark_dirty()
+            return
+        self._write_now(self._serialize())
+
+    def mark_dirty(self) -> None:
+        """Snapshot the data on the calling thread; schedule a flush unless one is already pending"""
+        with self._state_lock:
+            self._snapshot_seq += 1
+            seq = self._snapshot_seq
+        content = self._serialize()
+        with self._state_lock:
+            if seq > self._pending_seq:
+                self._pending, self._pending_seq = content, seq
+            self._arm_timer()
+
+    def _arm_timer(self) -> None:
+        # caller holds _state_lock
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(self.write_behind_delay, self._timer_flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _timer_flush(self) -> None:
+        with self._state_lock:
+            self._timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            # flush() keeps the snapshot pending; re-arm the timer so the write is retried
+            logger.warning(f"Failed to write {self.path}, retrying later: {e}")
+            with self._state_lock:
+                if self._pending is not None and self.write_behind_delay:
+                    self._arm_timer()
+
+    def flush(self) -> None:
+        """Write the pending snapshot now (no-op when clean)"""
+        with self._write_lock:
+            with self._state_lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                content, self._pending = self._pending, None
+            if content is None:
+                return
+            try:
+                self._write(content, fsync=True)
+            except Exception:
+                with self._state_lock:
+                    if self._pending is None:
+                        self._pending = content
+                raise
+
+    def close(self) -> None:
+        """Flush pending changes and fall back to synchronous saving (plugin unload)"""
+        self.set_write_behind(0)
+
+    def _serialize(self) -> str:
         if self.use_yaml:
-            with open(self.path, 'w', encoding='UTF-8') as f:
-                yaml.dump(self.data, f)
-        else:
-            with open(self.path, 'w', encoding='UTF-8') as f:
-                json.dump(self.data, f, ensure_ascii=False)
+            buf = io.StringIO()
+            yaml.dump(self.data, buf)
+            return buf.getvalue()
+        return json.dumps(self.data, ensure_ascii=False)
+
+    def _write_now(self, content: str) -> None:
+        """Synchronous save: supersedes any pending snapshot and writes without fsync, like before write-behind"""
+        with self._write_lock:
+            with self._state_lock:
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+                self._pending = None
+                self._pending_seq = self._snapshot_seq
+            self._write(content, fsync=False)
+
+    def _write(self, content: str, fsync: bool) -> None:
+        # caller holds _write_lock
+        self.path.parents[0].mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp, 'w', encoding='UTF-8') as f:
+            f.write(content)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self.flush_count += 1
 
     async def save_async(self) -> None:  # asynchronous saving
+        if self.write_behind_delay:
+            self.mark_dirty()
+            return
+        content = self._serialize()
         async with self._lock:
-            await anyio.Path(self.path.parent).mkdir(parents=True, exist_ok=True)
-            if self.use_yaml:
-                # ruamel.yaml doesn't support async dump directly, use run_in_executor
-                def dump_yaml():
-                    with open(self.path, 'w', encoding='UTF-8') as file:
-                        yaml.dump(self.data, file)
-
-                await asyncio.get_event_loop().run_in_executor(None, dump_yaml)
-            else:
-                content = json.dumps(self.data, ensure_ascii=False)
-                async with await anyio.open_file(self.path, mode='w', encoding='UTF-8') as f:
-                    await f.write(content)
+            await asyncio.get_event_loop().run_in_executor(None, self._write_now, content)
 
     def __getitem__(self, key: str):  # get item like dict[key]
         return self.data[key]
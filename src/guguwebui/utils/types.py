@@ -2,11 +2,15 @@ import logging
 import threading
 from typing import TypedDict
 
+from guguwebui.utils.log_store import DedupWindow, LogIndex, LogRingBuffer
+
 
 class StateType(TypedDict):
-    logs: list  # 存储原始字典: {timestamp, level, source, message, counter}
+    version: int  # 共享状态结构版本，插件重载时用于迁移
+    logs: LogRingBuffer  # 存储 LogEntry
     counter: int
-    hashes: set  # 存储 message 的哈希，用于简单去重
+    dedup: DedupWindow  # 按时间窗口对 message 去重
+    index: LogIndex  # 按等级/来源的倒排索引
     lock: threading.Lock
     intercepted: bool
     original_emit: type[logging.StreamHandler.emit] | None
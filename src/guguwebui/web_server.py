@@ -18,13 +18,14 @@ from mcdreforged.api.types import PluginServerInterface
 from starlette.datastructures import UploadFile
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.responses import Response
 
 import guguwebui.state as gugu_state
 from guguwebui.constant import *
 from guguwebui.dependencies.auth import get_current_admin, get_current_user
-from guguwebui.panel_merge.proxy import ApiProxyDispatchMiddleware
+from guguwebui.panel_merge.proxy import STREAM_API_PATHS, ApiProxyDispatchMiddleware
 from guguwebui.panel_merge.routes import router as panel_merge_router
 from guguwebui.PIM import initialize_pim
 from guguwebui.routers.audit_router import router as audit_router
@@ -53,7 +54,7 @@ from guguwebui.structures import (BusinessException, ConfigData, DeepseekQuery,
                                   SaveContent, ServerControl, ToggleConfig)
 from guguwebui.utils.auth_util import migrate_old_config
 from guguwebui.utils.log_watcher import LogWatcher
-from guguwebui.utils.mc_util import get_plugin_version
+from guguwebui.utils.mc_util import close_mojang_session, get_plugin_version
 from guguwebui.utils.server_util import *
 
 # 获取插件真实版本号
@@ -125,6 +126,10 @@ async def _shutdown_http_session():
         except Exception:
             pass
         app.state.http_session = None
+    try:
+        await close_mojang_session()
+    except Exception:
+        pass
 
 
 # Multi-server panel merge logic has been moved to guguwebui.panel_merge.*
@@ -254,10 +259,18 @@ def init_app(server_instance):
 
 
 # 事件处理函数
+def _notify_chat_online_changed():
+    """通知聊天页推送连接刷新在线列表"""
+    chat_service = getattr(app.state, "chat_service", None)
+    if chat_service is not None:
+        chat_service.notify_online_changed()
+
+
 def on_player_joined(_server, _player: str, _info=None):
     """处理玩家加入事件"""
     try:
         RCON_ONLINE_CACHE["dirty"] = True
+        _notify_chat_online_changed()
     except Exception:
         pass
 
@@ -266,6 +279,7 @@ def on_player_left(_server, _player: str):
     """处理玩家离开事件"""
     try:
         RCON_ONLINE_CACHE["dirty"] = True
+        _notify_chat_online_changed()
     except Exception:
         pass
 
@@ -462,9 +476,27 @@ class SessionTokenSyncMiddleware(BaseHTTPMiddleware):
         return await call_next(request)
 
 
+class CompressionMiddleware:
+    """按 Accept-Encoding 协商 gzip 压缩响应（小于 1KB 的响应不压缩）。
+
+    SSE 推送接口跳过压缩：压缩器会攒满缓冲区才输出，导致事件无法及时送达。
+    """
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.gzip = GZipMiddleware(app, minimum_size=minimum_size)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope.get("path") not in STREAM_API_PATHS:
+            await self.gzip(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+
 app.add_middleware(SessionTokenSyncMiddleware)
 app.add_middleware(ApiProxyDispatchMiddleware)
 app.add_middleware(SessionMiddleware, secret_key=SECRET_KEY)
+app.add_middleware(CompressionMiddleware)
 app.include_router(panel_merge_router, prefix="/api") # 合并面板
 app.include_router(plugin_management_router, prefix="/api") # 插件管理
 app.include_router(config_router, prefix="/api") # 配置